@@ -14,7 +14,7 @@ class UserAdmin(BaseUserAdmin):
         (None, {'fields': ('email', 'password')}),
         ('Личные данные', {'fields': ('first_name', 'last_name', 'bio', 'avatar')}),
         ('Подписка', {'fields': ('is_premium', 'subscription_end_date', 'stripe_customer_id')}),
-        ('Paywall', {'fields': ('articles_read_count', 'articles_read_reset_date')}),
+        ('Paywall', {'fields': ('articles_read_count', 'articles_read_posts', 'articles_read_reset_date')}),
         ('Уведомления', {'fields': ('newsletter_subscribed', 'comments_notify')}),
         ('Права доступа', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Даты', {'fields': ('last_login', 'date_joined')}),
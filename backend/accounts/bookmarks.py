@@ -0,0 +1,93 @@
+"""Закладки пользователя.
+
+* Добавление — ``INSERT ... ON CONFLICT DO NOTHING`` (bulk_create с
+  ignore_conflicts), удаление — ``DELETE`` по (user, post): ни то, ни другое
+  не читает Bookmark перед записью, повторный запрос ничего не меняет.
+  Добавить в закладки можно только опубликованную статью.
+* Множество id статей в закладках хранится в кэше целиком — одно чтение
+  кэша на запрос, дальше проверка ``post.pk in bookmarked_post_ids`` в
+  шаблоне стоит O(1). Запись в закладки после коммита сбрасывает
+  множество, следующее чтение загружает его одним запросом.
+* «Мои закладки» — курсорная пагинация по ``(-created_at, -id)``, статьи и
+  рубрики с переводами загружаются пакетно.
+"""
+from functools import partial
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils.functional import SimpleLazyObject
+
+from blog.models import Post
+from blog.pagination import KeysetPaginator
+from blog.translations import populate_translations, translation_languages
+
+from .models import Bookmark
+
+BOOKMARKS_KEY = 'bookmarks:{}'
+BOOKMARKS_TIMEOUT = 60 * 60 * 24
+BOOKMARKS_PER_PAGE = 20
+
+
+class UnknownPost(Exception):
+    pass
+
+
+def _invalidate(user_id):
+    cache.delete(BOOKMARKS_KEY.format(user_id))
+
+
+def get_bookmarked_ids(user_id):
+    """frozenset id статей в закладках пользователя"""
+    key = BOOKMARKS_KEY.format(user_id)
+    post_ids = cache.get(key)
+    if post_ids is None:
+        post_ids = frozenset(
+            Bookmark.objects.filter(user_id=user_id).values_list('post_id', flat=True)
+        )
+        cache.set(key, post_ids, BOOKMARKS_TIMEOUT)
+    return post_ids
+
+
+def add_bookmark(user_id, post_id):
+    # Черновик или запланированная статья: в закладках она всё равно не видна
+    if not Post.objects.published().filter(pk=post_id).exists():
+        raise UnknownPost(post_id)
+    try:
+        with transaction.atomic():
+            Bookmark.objects.bulk_create(
+                [Bookmark(user_id=user_id, post_id=post_id)], ignore_conflicts=True
+            )
+    except IntegrityError:
+        # Внешний ключ: статьи с таким id нет
+        raise UnknownPost(post_id)
+    transaction.on_commit(partial(_invalidate, user_id))
+
+
+def remove_bookmark(user_id, post_id):
+    Bookmark.objects.filter(user_id=user_id, post_id=post_id).delete()
+    transaction.on_commit(partial(_invalidate, user_id))
+
+
+def get_bookmarks_page(user_id, cursor=None, per_page=BOOKMARKS_PER_PAGE):
+    """Страница закладок (новые сверху) на опубликованные статьи с переводами"""
+    bookmarks = (
+        Bookmark.objects.filter(user_id=user_id, post__in=Post.objects.published())
+        .select_related('post__author', 'post__category')
+    )
+    page = KeysetPaginator(bookmarks, per_page, ordering=('-created_at', '-id')).page(cursor)
+    posts = [bookmark.post for bookmark in page]
+    languages = translation_languages()
+    populate_translations(posts, languages)
+    populate_translations([post.category for post in posts if post.category], languages)
+    return page
+
+
+def bookmarks(request):
+    """Context processor: ``bookmarked_post_ids`` — читается из кэша при первом обращении"""
+    def load():
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return frozenset()
+        return get_bookmarked_ids(user.pk)
+
+    return {'bookmarked_post_ids': SimpleLazyObject(load)}
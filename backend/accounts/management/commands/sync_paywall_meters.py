@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts.paywall import sync_paywall_meters
+
+
+class Command(BaseCommand):
+    help = 'Переносит счётчики прочитанных премиум-статей из кэша в профили пользователей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, синхронизируя раз в --interval секунд',
+        )
+        parser.add_argument('--interval', type=int, default=settings.PAYWALL_SYNC_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            synced = sync_paywall_meters()
+            self.stdout.write(f'Синхронизировано пользователей: {synced}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:12
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="avatar",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=core.storage.get_media_storage,
+                upload_to="avatars/",
+                verbose_name="Аватар",
+            ),
+        ),
+    ]
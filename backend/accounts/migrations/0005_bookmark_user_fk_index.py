@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:51
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0004_bookmark_feed_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bookmark",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="bookmarks",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
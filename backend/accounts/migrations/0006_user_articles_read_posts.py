@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0005_bookmark_user_fk_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="articles_read_posts",
+            field=models.JSONField(
+                blank=True, default=list, verbose_name="Прочитанные статьи"
+            ),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.db import models
 from django.utils import timezone
 
+from core.storage import get_media_storage
+
 
 class UserManager(BaseUserManager):
     """Менеджер для User без username"""
@@ -28,7 +30,9 @@ class User(AbstractUser):
     email = models.EmailField('Email', unique=True)
     
     bio = models.TextField('О себе', blank=True)
-    avatar = models.ImageField('Аватар', upload_to='avatars/', blank=True, null=True)
+    avatar = models.ImageField(
+        'Аватар', upload_to='avatars/', storage=get_media_storage, blank=True, null=True
+    )
     
     # Подписка
     is_premium = models.BooleanField('Премиум', default=False)
@@ -38,6 +42,8 @@ class User(AbstractUser):
     # Paywall
     articles_read_count = models.PositiveIntegerField('Прочитано статей', default=0)
     articles_read_reset_date = models.DateField('Дата сброса счётчика', blank=True, null=True)
+    # id уже открытых статей: повторное чтение после вытеснения счётчика из кэша бесплатно
+    articles_read_posts = models.JSONField('Прочитанные статьи', default=list, blank=True)
     
     # Уведомления
     newsletter_subscribed = models.BooleanField('Подписка на рассылку', default=True)
@@ -52,6 +58,13 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД: миниатюры аватара ставятся в очередь только при его смене
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     def __str__(self):
         return self.email
     
@@ -65,11 +78,16 @@ class User(AbstractUser):
 class Bookmark(models.Model):
     """Избранные статьи"""
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookmarks')
+    # Индекс по user_id покрывают unique_together и accounts_bookmark_feed_idx
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookmarks', db_index=False)
     post = models.ForeignKey('blog.Post', on_delete=models.CASCADE, related_name='bookmarked_by')
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name = 'Закладка'
         verbose_name_plural = 'Закладки'
-        unique_together = ['user', 'post']
\ No newline at end of file
+        unique_together = ['user', 'post']
+        # Ключ курсорной пагинации «Моих закладок» (accounts.bookmarks)
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='accounts_bookmark_feed_idx'),
+        ]
\ No newline at end of file
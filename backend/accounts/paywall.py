@@ -0,0 +1,254 @@
+"""Счётчик бесплатных статей (metered paywall).
+
+Чтение премиум-статьи не пишет в БД. Для пользователя решение принимается
+по двум записям кэша, которые читаются одним ``get_many``:
+
+* право доступа (entitlement) — срок подписки, сбрасывается при
+  сохранении пользователя;
+* счётчик месяца — какие статьи уже открыты в текущем месяце.
+
+Новая статья записывает только счётчик в кэш и помечает пользователя
+«грязным». Запись идёт под короткой блокировкой (``cache.add``): две вкладки,
+открытые одновременно, иначе потеряли бы одно из увеличений. Команда
+``sync_paywall_meters`` пачкой переносит счётчики в
+User.articles_read_count / articles_read_posts / articles_read_reset_date и
+снимает пометку только после коммита пачки.
+Если счётчик вытеснен из кэша, он восстанавливается из этих полей вместе со
+списком открытых статей — повторное чтение не тратит бесплатную статью.
+
+Для анонимов счётчик хранится в подписанной cookie.
+"""
+import json
+import time
+from contextlib import contextmanager
+from datetime import date
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from core.cache import add_to_set, remove_from_set, set_members
+
+from .models import User
+
+ENTITLEMENT_KEY = 'paywall:entitlement:{}'
+METER_KEY = 'paywall:meter:{}'
+METER_LOCK_KEY = 'paywall:meter-lock:{}'
+DIRTY_USERS_KEY = 'paywall:dirty'
+COOKIE_SALT = 'paywall'
+METER_TIMEOUT = 60 * 60 * 24 * 40
+METER_LOCK_TIMEOUT = 5
+METER_LOCK_ATTEMPTS = 20
+METER_LOCK_DELAY = 0.05
+SYNC_BATCH_SIZE = 500
+
+
+def _current_month():
+    return timezone.localdate().strftime('%Y-%m')
+
+
+def _next_reset_date():
+    today = timezone.localdate()
+    if today.month == 12:
+        return date(today.year + 1, 1, 1)
+    return date(today.year, today.month + 1, 1)
+
+
+@contextmanager
+def _meter_lock(user_id):
+    """Блокировка счётчика пользователя на время чтения-изменения-записи"""
+    key = METER_LOCK_KEY.format(user_id)
+    locked = False
+    for _ in range(METER_LOCK_ATTEMPTS):
+        locked = cache.add(key, 1, METER_LOCK_TIMEOUT)
+        if locked:
+            break
+        time.sleep(METER_LOCK_DELAY)
+    # Не дождались (зависший запрос) — пишем без блокировки, статью не закрываем
+    try:
+        yield
+    finally:
+        if locked:
+            cache.delete(key)
+
+
+def _user_meter(meter, user, month):
+    """Счётчик месяца из кэша; вытеснен — восстанавливается из профиля"""
+    if meter is not None and meter['month'] == month:
+        return meter
+    meter = {'month': month, 'count': 0, 'posts': []}
+    reset_date = user.articles_read_reset_date
+    if reset_date and reset_date > timezone.localdate():
+        # Счётчик вытеснен из кэша — продолжаем с сохранённого значения
+        meter['count'] = user.articles_read_count
+        meter['posts'] = list(user.articles_read_posts)
+    return meter
+
+
+def build_entitlement(user):
+    """Запись о доступе: до какого момента (timestamp) действует подписка"""
+    until = None
+    if user.is_premium and user.subscription_end_date:
+        until = user.subscription_end_date.timestamp()
+    return {'active_until': until}
+
+
+def invalidate_entitlement(user_id):
+    cache.delete(ENTITLEMENT_KEY.format(user_id))
+
+
+def has_active_subscription(entitlement):
+    until = entitlement.get('active_until')
+    return until is not None and until > timezone.now().timestamp()
+
+
+class PaywallDecision:
+    """Результат проверки доступа к статье"""
+
+    def __init__(self, allowed, remaining=None, subscribed=False):
+        self.allowed = allowed
+        self.remaining = remaining
+        self.subscribed = subscribed
+
+    def __bool__(self):
+        return self.allowed
+
+
+class Paywall:
+    """Проверка доступа в рамках одного запроса"""
+
+    def __init__(self, request):
+        self.request = request
+        self.free_articles = settings.PAYWALL_FREE_ARTICLES
+        self._cookie_meter = None
+
+    def check(self, post):
+        if not post.is_premium:
+            return PaywallDecision(True)
+        user = self.request.user
+        if user.is_authenticated:
+            return self._check_user(user, post)
+        return self._check_anonymous(post)
+
+    def _check_user(self, user, post):
+        entitlement_key = ENTITLEMENT_KEY.format(user.pk)
+        meter_key = METER_KEY.format(user.pk)
+        found = cache.get_many([entitlement_key, meter_key])
+
+        entitlement = found.get(entitlement_key)
+        if entitlement is None:
+            # Пользователь уже загружен middleware — запроса к БД нет
+            entitlement = build_entitlement(user)
+            cache.set(entitlement_key, entitlement)
+        if has_active_subscription(entitlement):
+            return PaywallDecision(True, subscribed=True)
+
+        month = _current_month()
+        meter = _user_meter(found.get(meter_key), user, month)
+        decision = self._apply_meter(meter, post)
+        if not meter.pop('changed', False):
+            return decision
+        # Новая статья: пересчитываем по свежему счётчику под блокировкой
+        with _meter_lock(user.pk):
+            meter = _user_meter(cache.get(meter_key), user, month)
+            decision = self._apply_meter(meter, post)
+            if meter.pop('changed', False):
+                cache.set(meter_key, meter, METER_TIMEOUT)
+                add_to_set(DIRTY_USERS_KEY, user.pk)
+        return decision
+
+    def _check_anonymous(self, post):
+        month = _current_month()
+        try:
+            meter = json.loads(self.request.get_signed_cookie(
+                settings.PAYWALL_COOKIE_NAME, salt=COOKIE_SALT
+            ))
+        except (KeyError, ValueError, signing.BadSignature):
+            meter = None
+        if not meter or meter.get('month') != month:
+            meter = {'month': month, 'count': 0, 'posts': []}
+
+        decision = self._apply_meter(meter, post)
+        if meter.pop('changed', False):
+            self._cookie_meter = meter
+        return decision
+
+    def _apply_meter(self, meter, post):
+        if post.pk in meter['posts']:
+            return PaywallDecision(True, remaining=self.free_articles - meter['count'])
+        if meter['count'] >= self.free_articles:
+            return PaywallDecision(False, remaining=0)
+        meter['posts'].append(post.pk)
+        meter['count'] += 1
+        meter['changed'] = True
+        return PaywallDecision(True, remaining=self.free_articles - meter['count'])
+
+    def update_response(self, response):
+        if self._cookie_meter is not None:
+            response.set_signed_cookie(
+                settings.PAYWALL_COOKIE_NAME,
+                json.dumps(self._cookie_meter),
+                salt=COOKIE_SALT,
+                max_age=METER_TIMEOUT,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+def metered_paywall(view_func):
+    """
+    Декоратор view: кладёт в request.paywall объект Paywall.
+
+    View вызывает ``request.paywall.check(post)`` и получает PaywallDecision;
+    cookie анонимного счётчика выставляется автоматически.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        request.paywall = Paywall(request)
+        response = view_func(request, *args, **kwargs)
+        return request.paywall.update_response(response)
+    return wrapper
+
+
+class MeteredPaywallMixin:
+    """То же, что metered_paywall, для class-based views"""
+
+    def dispatch(self, request, *args, **kwargs):
+        request.paywall = Paywall(request)
+        response = super().dispatch(request, *args, **kwargs)
+        return request.paywall.update_response(response)
+
+
+def sync_paywall_meters():
+    """Переносит изменённые счётчики из кэша в User, возвращает число пользователей"""
+    # Пометка снимается после коммита пачки: при ошибке записи пользователи
+    # останутся в множестве и попадут в следующий запуск
+    user_ids = sorted(int(user_id) for user_id in set_members(DIRTY_USERS_KEY))
+    month = _current_month()
+    reset_date = _next_reset_date()
+    synced = 0
+    for start in range(0, len(user_ids), SYNC_BATCH_SIZE):
+        chunk = user_ids[start:start + SYNC_BATCH_SIZE]
+        meters = cache.get_many([METER_KEY.format(user_id) for user_id in chunk])
+        users = []
+        for user_id in chunk:
+            meter = meters.get(METER_KEY.format(user_id))
+            if meter is None or meter['month'] != month:
+                continue
+            users.append(User(
+                pk=user_id,
+                articles_read_count=meter['count'],
+                articles_read_posts=meter['posts'],
+                articles_read_reset_date=reset_date,
+            ))
+        with transaction.atomic():
+            User.objects.bulk_update(
+                users, ['articles_read_count', 'articles_read_posts', 'articles_read_reset_date']
+            )
+            transaction.on_commit(partial(remove_from_set, DIRTY_USERS_KEY, *chunk))
+        synced += len(users)
+    return synced
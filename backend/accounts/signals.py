@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from core.thumbnails import queue_thumbnails
+
+from .models import User
+from .paywall import invalidate_entitlement
+
+
+@receiver(post_save, sender=User)
+def reset_paywall_entitlement(sender, instance, **kwargs):
+    invalidate_entitlement(instance.pk)
+
+
+@receiver(post_save, sender=User)
+def pregenerate_avatar_thumbnails(sender, instance, created, raw=False, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if not raw and (created or loaded.get('avatar') != instance.avatar.name):
+        queue_thumbnails(instance, 'avatar')
@@ -0,0 +1,129 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from blog.models import Post
+from core.cache import pop_set, set_members
+from core.tests import create_archive, record_tasks
+from core.thumbnails import generate_thumbnails_for
+
+from .models import User
+from .paywall import DIRTY_USERS_KEY, METER_KEY, Paywall, sync_paywall_meters
+
+
+@override_settings(PAYWALL_FREE_ARTICLES=2)
+class PaywallTests(TestCase):
+    """Счётчик бесплатных премиум-статей: подписчики, лимит, повторы, cookie и вытеснение"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_archive(1, 4)
+        Post.objects.update(is_premium=True)
+        cls.posts = list(Post.objects.order_by('pk'))
+
+    def setUp(self):
+        cache.clear()
+        pop_set(DIRTY_USERS_KEY)
+        self.user = User.objects.create_user('reader@example.com')
+
+    def check(self, post, user=None, cookies=None):
+        request = RequestFactory().get('/')
+        request.user = user or self.user
+        request.COOKIES.update(cookies or {})
+        paywall = Paywall(request)
+        return paywall.check(post), paywall.update_response(HttpResponse())
+
+    def read(self, *posts):
+        return [self.check(post)[0].allowed for post in posts]
+
+    def test_subscriber(self):
+        self.user.is_premium = True
+        self.user.subscription_end_date = timezone.now() + timedelta(days=30)
+        self.user.save()
+        decision, _ = self.check(self.posts[0])
+        self.assertTrue(decision.subscribed)
+        self.assertEqual(self.read(*self.posts), [True] * 4)
+        self.assertEqual(pop_set(DIRTY_USERS_KEY), set())
+
+    def test_limit_and_repeat_read(self):
+        self.assertEqual(self.read(self.posts[0], self.posts[1], self.posts[2]), [True, True, False])
+        # Уже открытая статья не тратит бесплатную
+        decision, _ = self.check(self.posts[0])
+        self.assertTrue(decision.allowed)
+        self.assertEqual(decision.remaining, 0)
+
+    def test_no_database_writes(self):
+        with self.assertNumQueries(0):
+            self.read(self.posts[0])
+
+    def test_anonymous_cookie(self):
+        anonymous = AnonymousUser()
+        cookies = {}
+        for post in self.posts[:2]:
+            decision, response = self.check(post, anonymous, cookies)
+            self.assertTrue(decision.allowed)
+            cookies[settings.PAYWALL_COOKIE_NAME] = response.cookies[settings.PAYWALL_COOKIE_NAME].value
+        decision, _ = self.check(self.posts[2], anonymous, cookies)
+        self.assertFalse(decision.allowed)
+        decision, _ = self.check(self.posts[1], anonymous, cookies)
+        self.assertTrue(decision.allowed)
+        # Подделанная cookie — счётчик с нуля, а не ошибка
+        decision, _ = self.check(self.posts[2], anonymous, {settings.PAYWALL_COOKIE_NAME: 'x'})
+        self.assertTrue(decision.allowed)
+
+    def test_eviction_restore(self):
+        self.read(self.posts[0])
+        self.assertEqual(sync_paywall_meters(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.articles_read_count, 1)
+        self.assertEqual(self.user.articles_read_posts, [self.posts[0].pk])
+
+        cache.clear()
+        # Повтор не тратит бесплатную статью, новая — последняя, дальше закрыто
+        self.assertEqual(self.read(self.posts[0], self.posts[1], self.posts[2]), [True, True, False])
+
+    def test_concurrent_tabs(self):
+        self.read(self.posts[0])
+        # Вторая вкладка прочитала счётчик до записи первой
+        with mock.patch.object(cache, 'get_many', return_value={}):
+            self.assertEqual(self.read(self.posts[1]), [True])
+        meter = cache.get(METER_KEY.format(self.user.pk))
+        self.assertEqual((meter['count'], meter['posts']), (2, [self.posts[0].pk, self.posts[1].pk]))
+
+    def test_failed_sync_keeps_dirty_users(self):
+        self.read(self.posts[0])
+        with mock.patch.object(User.objects, 'bulk_update', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                sync_paywall_meters()
+        self.assertEqual(set_members(DIRTY_USERS_KEY), {str(self.user.pk)})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sync_paywall_meters(), 1)
+        self.assertEqual(set_members(DIRTY_USERS_KEY), set())
+
+
+class AvatarThumbnailTests(TestCase):
+    """Миниатюры аватара ставятся в очередь только при его смене"""
+
+    def save(self, user):
+        with record_tasks() as recorder, self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        return recorder.calls(generate_thumbnails_for)
+
+    def test_queued_on_change_only(self):
+        user = User.objects.create_user('reader@example.com')
+        user.avatar = 'avatars/first.jpg'
+        self.assertEqual(self.save(user), [('accounts.User', user.pk, 'avatar')])
+
+        user = User.objects.get(pk=user.pk)
+        user.first_name = 'Анна'
+        self.assertEqual(self.save(user), [])
+        user.avatar = 'avatars/second.jpg'
+        self.assertEqual(len(self.save(user)), 1)
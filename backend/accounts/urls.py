@@ -1,7 +1,11 @@
 from django.urls import path
 
+from . import views
+
 app_name = 'accounts'
 
 urlpatterns = [
-    # TODO: добавить views позже
-]
\ No newline at end of file
+    path('bookmarks/', views.bookmark_list, name='bookmarks'),
+    path('bookmarks/<int:post_id>/add/', views.bookmark_add, name='bookmark_add'),
+    path('bookmarks/<int:post_id>/remove/', views.bookmark_remove, name='bookmark_remove'),
+]
@@ -1,3 +1,39 @@
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET, require_POST
 
-# Create your views here.
+from .bookmarks import UnknownPost, add_bookmark, get_bookmarks_page, remove_bookmark
+
+
+def _bookmark_response(request, post_id, bookmarked):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Требуется вход'}, status=401)
+    try:
+        if bookmarked:
+            add_bookmark(request.user.pk, post_id)
+        else:
+            remove_bookmark(request.user.pk, post_id)
+    except UnknownPost:
+        raise Http404
+    return JsonResponse({'post': post_id, 'bookmarked': bookmarked})
+
+
+@require_POST
+def bookmark_add(request, post_id):
+    return _bookmark_response(request, post_id, True)
+
+
+@require_POST
+def bookmark_remove(request, post_id):
+    return _bookmark_response(request, post_id, False)
+
+
+@require_GET
+@login_required
+def bookmark_list(request):
+    page = get_bookmarks_page(request.user.pk, request.GET.get('cursor'))
+    return render(request, 'accounts/bookmarks.html', {
+        'posts': [bookmark.post for bookmark in page],
+        'page_obj': page,
+    })
@@ -1,3 +1,20 @@
 from django.contrib import admin
 
-# Register your models here.
+from .comments import set_approved
+from .models import Comment
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('author', 'post', 'created_at', 'is_approved')
+    list_filter = ('is_approved', 'created_at')
+    raw_id_fields = ('author', 'post')
+    actions = ('approve', 'unapprove')
+
+    @admin.action(description='Одобрить выбранные комментарии')
+    def approve(self, request, queryset):
+        self.message_user(request, f'Одобрено комментариев: {set_approved(queryset, True)}')
+
+    @admin.action(description='Скрыть выбранные комментарии')
+    def unapprove(self, request, queryset):
+        self.message_user(request, f'Скрыто комментариев: {set_approved(queryset, False)}')
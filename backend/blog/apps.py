@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class BlogConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "blog"
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from . import signals  # noqa: F401
+        from .translation_cache import install, sync_on_request
+
+        install()
+        request_started.connect(sync_on_request, dispatch_uid='blog.translation_cache')
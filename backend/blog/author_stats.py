@@ -0,0 +1,136 @@
+"""Показатели автора: статьи, просмотры, статьи по рубрикам, активность.
+
+Страница автора читает одну строку AuthorStats вместе с пользователем, а
+не считает агрегаты по Post на каждый запрос. Строка поддерживается
+инкрементально:
+
+* сохранение и удаление опубликованной статьи (blog.signals) после коммита
+  пересчитывает строки её авторов — старого и нового — сгруппированными
+  запросами по индексу ``(author, -published_at, -id)``;
+* сброс просмотров (blog.counters) в той же транзакции прибавляет пачку к
+  ``views_count`` авторов одним ``UPDATE ... CASE``.
+
+Пересчёт блокирует строки авторов, поэтому не теряет просмотры сброса,
+идущего параллельно. Строки нет — её создаёт первый пересчёт (сброс
+просмотров или команда ``rebuild_author_stats``); страница автора до этого
+считает показатели без записи.
+"""
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Max, Sum, Value, When
+
+from .models import AuthorStats, Category, Post
+
+REBUILD_CHUNK_SIZE = 500
+
+
+def _collect_author_stats(author_ids):
+    """Несохранённые строки AuthorStats авторов по их опубликованным статьям"""
+    published = Post.objects.published().filter(author_id__in=author_ids).order_by()
+    totals = {
+        row['author_id']: row
+        for row in published.values('author_id').annotate(
+            posts=Count('pk'), views=Sum('views_count'),
+            last_published=Max('published_at'), last_updated=Max('updated_at'),
+        )
+    }
+    categories = defaultdict(dict)
+    rows = (
+        published.filter(category__isnull=False).values('author_id', 'category_id')
+        .annotate(count=Count('pk')).values_list('author_id', 'category_id', 'count')
+    )
+    for author_id, category_id, count in rows:
+        categories[author_id][str(category_id)] = count
+
+    stats = []
+    for author_id in author_ids:
+        row = totals.get(author_id, {})
+        activity = [value for value in (row.get('last_published'), row.get('last_updated')) if value]
+        stats.append(AuthorStats(
+            author_id=author_id,
+            posts_count=row.get('posts', 0),
+            views_count=row.get('views') or 0,
+            category_counts=categories.get(author_id, {}),
+            last_published_at=row.get('last_published'),
+            last_activity_at=max(activity, default=None),
+        ))
+    return stats
+
+
+def refresh_author_stats(author_ids):
+    """Пересчитывает строки авторов по их опубликованным статьям, возвращает число строк"""
+    author_ids = sorted(
+        get_user_model().objects.filter(pk__in={pk for pk in author_ids if pk})
+        .values_list('pk', flat=True)
+    )
+    if not author_ids:
+        return 0
+    with transaction.atomic():
+        # Сброс просмотров ждёт пересчёта, а пересчёт видит уже применённые пачки
+        list(AuthorStats.objects.select_for_update().filter(pk__in=author_ids).values_list('pk'))
+        stats = _collect_author_stats(author_ids)
+        AuthorStats.objects.bulk_create(
+            stats, update_conflicts=True, unique_fields=['author'],
+            update_fields=[
+                'posts_count', 'views_count', 'category_counts',
+                'last_published_at', 'last_activity_at', 'updated_at',
+            ],
+        )
+    return len(stats)
+
+
+def add_author_views(counts):
+    """Прибавляет пачку просмотров {post_id: count} к views_count авторов статей"""
+    views = Counter()
+    posts = Post.objects.published().filter(pk__in=counts, author__isnull=False)
+    for post_id, author_id in posts.order_by().values_list('pk', 'author_id'):
+        views[author_id] += counts[post_id]
+    if not views:
+        return
+    increment = Case(
+        *[When(pk=author_id, then=Value(count)) for author_id, count in views.items()],
+        default=Value(0),
+        output_field=models.PositiveBigIntegerField(),
+    )
+    AuthorStats.objects.filter(pk__in=views).update(views_count=F('views_count') + increment)
+    # Просмотры статьи уже в Post.views_count — пересчёт их учтёт
+    known = set(AuthorStats.objects.filter(pk__in=views).values_list('pk', flat=True))
+    refresh_author_stats(set(views) - known)
+
+
+def rebuild_author_stats():
+    """Пересчитывает строки всех авторов, возвращает их число"""
+    author_ids = set(
+        Post.objects.filter(author__isnull=False).order_by()
+        .values_list('author_id', flat=True).distinct()
+    )
+    author_ids.update(AuthorStats.objects.values_list('pk', flat=True))
+    author_ids = sorted(author_ids)
+    for start in range(0, len(author_ids), REBUILD_CHUNK_SIZE):
+        refresh_author_stats(author_ids[start:start + REBUILD_CHUNK_SIZE])
+    return len(author_ids)
+
+
+def get_author_stats(author):
+    """AuthorStats автора или None, если у него нет опубликованных статей.
+
+    author загружен с select_related('author_stats') — строка есть, и запроса
+    нет. Строки нет — показатели считаются без записи: GET по id любого
+    пользователя не должен создавать строки.
+    """
+    try:
+        stats = author.author_stats
+    except AuthorStats.DoesNotExist:
+        stats = _collect_author_stats([author.pk])[0]
+    return stats if stats.posts_count else None
+
+
+def get_author_categories(stats):
+    """Активные рубрики автора с переводами и ``posts_count``, больше статей — выше"""
+    counts = {int(pk): count for pk, count in stats.category_counts.items()}
+    categories = list(Category.objects.filter(pk__in=counts, is_active=True).with_translations())
+    for category in categories:
+        category.posts_count = counts[category.pk]
+    return sorted(categories, key=lambda category: (-category.posts_count, category.order))
@@ -0,0 +1,119 @@
+"""Комментарии: счётчик одобренных и постраничное чтение.
+
+* ``Post.comments_count`` — число одобренных комментариев. Его меняют в
+  той же транзакции, что и сам комментарий: сохранение и удаление
+  (blog.signals) и массовое одобрение set_approved(). Страницу статьи
+  после коммита сбрасывают из кэшей — своего и прокси.
+  ``reconcile_comments_count`` пересчитывает все счётчики одним
+  сгруппированным запросом и исправляет только расхождения.
+* Комментарии статьи читаются курсорной пагинацией по ``(created_at, id)``
+  через индекс ``(post, is_approved, created_at, id)``. Авторы страницы
+  загружаются одним запросом in_bulk — без JOIN на каждую строку.
+"""
+from collections import Counter
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.urls import reverse
+from easy_thumbnails.templatetags.thumbnail import thumbnail_url
+
+from core.cache import bump_generation
+from core.edge import purge_keys
+from core.pagecache import purge_paths
+from core.tasks import enqueue
+
+from .models import Comment, Post
+from .notifications import fan_out_comments
+from .pagination import KeysetPaginator
+
+COMMENTS_PER_PAGE = 30
+RECONCILE_CHUNK_SIZE = 1000
+
+
+def refresh_comment_pages(post_ids):
+    """Сбрасывает кэши страниц статей с изменившимися комментариями"""
+    posts = Post.objects.filter(pk__in=post_ids).values_list('pk', 'slug')
+    bump_generation(*[f'post:{post_id}' for post_id in post_ids])
+    purge_paths(*[reverse('blog:post_detail', kwargs={'slug': slug}) for _, slug in posts])
+    purge_keys(*[f'post-{post_id}' for post_id in post_ids])
+
+
+def change_comments_count(deltas):
+    """Применяет {post_id: delta} и после коммита сбрасывает страницы статей"""
+    post_ids = Post.objects.change_comments_count(deltas)
+    if post_ids:
+        transaction.on_commit(partial(refresh_comment_pages, sorted(post_ids)))
+    return post_ids
+
+
+def set_approved(queryset, approved):
+    """Одобряет или скрывает комментарии вместе со счётчиками, возвращает число изменённых"""
+    with transaction.atomic():
+        rows = list(
+            queryset.exclude(is_approved=approved).select_for_update()
+            .order_by().values_list('pk', 'post_id')
+        )
+        if not rows:
+            return 0
+        Comment.objects.filter(pk__in=[pk for pk, _ in rows]).update(is_approved=approved)
+        sign = 1 if approved else -1
+        counts = Counter(post_id for _, post_id in rows)
+        change_comments_count({post_id: sign * count for post_id, count in counts.items()})
+        if approved:
+            transaction.on_commit(partial(enqueue, fan_out_comments, [pk for pk, _ in rows]))
+    return len(rows)
+
+
+def reconcile_comments_count():
+    """Пересчитывает comments_count всех статей, возвращает число исправленных"""
+    actual = dict(
+        Comment.objects.approved().order_by().values('post')
+        .annotate(count=Count('pk')).values_list('post', 'count')
+    )
+    wrong = {
+        post_id: actual.get(post_id, 0)
+        for post_id, stored in Post.objects.order_by().values_list('pk', 'comments_count').iterator()
+        if stored != actual.get(post_id, 0)
+    }
+    post_ids = sorted(wrong)
+    for start in range(0, len(post_ids), RECONCILE_CHUNK_SIZE):
+        chunk = post_ids[start:start + RECONCILE_CHUNK_SIZE]
+        Post.objects.filter(pk__in=chunk).update(comments_count=Case(
+            *[When(pk=post_id, then=Value(wrong[post_id])) for post_id in chunk],
+            output_field=IntegerField(),
+        ))
+    if post_ids:
+        refresh_comment_pages(post_ids)
+    return len(post_ids)
+
+
+def get_comments_page(post_id, cursor=None, per_page=COMMENTS_PER_PAGE):
+    """Страница одобренных комментариев, от старых к новым, с загруженными авторами"""
+    comments = (
+        Comment.objects.approved().filter(post_id=post_id)
+        .only('pk', 'post_id', 'author_id', 'content', 'created_at')
+    )
+    page = KeysetPaginator(comments, per_page, ordering=('created_at', 'id')).page(cursor)
+    authors = (
+        get_user_model().objects.only('pk', 'email', 'first_name', 'last_name', 'avatar')
+        .in_bulk({comment.author_id for comment in page})
+    )
+    for comment in page:
+        comment.author = authors[comment.author_id]
+    return page
+
+
+def serialize_comment(comment):
+    author = comment.author
+    return {
+        'id': comment.pk,
+        'author': {
+            'id': author.pk,
+            'name': author.get_full_name() or author.email,
+            'avatar': thumbnail_url(author.avatar, 'small') if author.avatar else None,
+        },
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+    }
@@ -0,0 +1,149 @@
+"""Отложенный (write-behind) счётчик просмотров статей.
+
+Просмотр не пишет в БД: инкремент копится в буфере, а сброс раз в
+VIEW_COUNT_FLUSH_INTERVAL секунд применяет все накопленные значения одним
+``UPDATE ... SET views_count = views_count + CASE id WHEN ... END``; в той
+же транзакции пачка прибавляется к просмотрам авторов (blog.author_stats).
+
+* Redis (django_redis): ``HINCRBY`` в общий хэш. Сброс атомарно
+  переименовывает хэш в «пачку» и применяет её в транзакции вместе с записью
+  ViewCountFlush; повторный сброс той же пачки (после падения между коммитом
+  и удалением ключа) ничего не меняет. Сбрасывает команда
+  ``flush_view_counts``.
+* LocMemCache: буфер в памяти процесса, сбрасывается фоновым таймером в
+  этом же процессе или командой ``flush_view_counts``. При остановке
+  процесса теряется не больше одного интервала: сброс при выходе
+  (atexit) писал бы в ту БД, что настроена на момент выхода, — после
+  ``manage.py test`` это уже не тестовая база, а настоящая.
+"""
+import logging
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Value, When
+from redis.exceptions import ResponseError
+
+from core.cache import get_redis
+
+from .author_stats import add_author_views
+from .models import Post, ViewCountFlush
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'views:pending'
+FLUSHING_KEY = 'views:flushing'
+BATCH_FIELD = '__batch__'
+UPDATE_CHUNK_SIZE = 1000
+
+
+def apply_view_counts(counts):
+    """Прибавляет просмотры к статьям одним UPDATE ... CASE на пачку и к их авторам"""
+    post_ids = sorted(counts)
+    with transaction.atomic():
+        for start in range(0, len(post_ids), UPDATE_CHUNK_SIZE):
+            chunk = post_ids[start:start + UPDATE_CHUNK_SIZE]
+            increment = Case(
+                *[When(pk=post_id, then=Value(counts[post_id])) for post_id in chunk],
+                default=Value(0),
+                output_field=models.PositiveIntegerField(),
+            )
+            Post.objects.filter(pk__in=chunk).update(views_count=F('views_count') + increment)
+            add_author_views({post_id: counts[post_id] for post_id in chunk})
+
+
+class LocalViewBuffer:
+    """Буфер в памяти процесса с периодическим сбросом"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def record(self, post_id, count=1):
+        with self._lock:
+            self._counts[post_id] += count
+            if self._timer is None:
+                self._timer = threading.Timer(self.interval, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('Не удалось сбросить просмотры')
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = None
+        if counts:
+            apply_view_counts(counts)
+        return sum(counts.values())
+
+
+class RedisViewBuffer:
+    """Общий для всех процессов буфер в хэше Redis"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def record(self, post_id, count=1):
+        self.client.hincrby(PENDING_KEY, post_id, count)
+
+    def flush(self):
+        # Незавершённая пачка от упавшего сброса применяется первой
+        if not self.client.exists(FLUSHING_KEY):
+            try:
+                self.client.rename(PENDING_KEY, FLUSHING_KEY)
+            except ResponseError:
+                # Нет накопленных просмотров
+                return 0
+        self.client.hsetnx(FLUSHING_KEY, BATCH_FIELD, uuid.uuid4().hex)
+
+        raw = self.client.hgetall(FLUSHING_KEY)
+        batch_id = raw.pop(BATCH_FIELD.encode()).decode()
+        counts = {int(post_id): int(count) for post_id, count in raw.items()}
+        total = sum(counts.values())
+        try:
+            with transaction.atomic():
+                ViewCountFlush.objects.create(
+                    batch_id=batch_id, posts_count=len(counts), views_count=total
+                )
+                apply_view_counts(counts)
+        except IntegrityError:
+            logger.info('Пачка просмотров %s уже применена', batch_id)
+            total = 0
+        self.client.delete(FLUSHING_KEY)
+        return total
+
+
+_local_buffer = None
+_local_buffer_lock = threading.Lock()
+
+
+def get_view_buffer():
+    client = get_redis()
+    if client is not None:
+        return RedisViewBuffer(client)
+
+    global _local_buffer
+    with _local_buffer_lock:
+        if _local_buffer is None:
+            _local_buffer = LocalViewBuffer(settings.VIEW_COUNT_FLUSH_INTERVAL)
+    return _local_buffer
+
+
+def record_view(post_id):
+    get_view_buffer().record(post_id)
+
+
+def flush_view_counts():
+    """Сбрасывает накопленные просмотры в БД, возвращает их количество"""
+    return get_view_buffer().flush()
@@ -0,0 +1,147 @@
+"""RSS и Atom: последние статьи, статьи рубрики и тега.
+
+Язык ленты — активный язык запроса (``?lang=en``, core.middleware).
+
+Опрос агрегатором обходится без БД:
+
+* метка ленты — max(updated_at) её опубликованных статей — хранится в кэше
+  под ключом с поколениями областей ``posts`` и ``categories``
+  (core.cache). Публикация, правка статьи или рубрики меняет поколение,
+  и метка пересчитывается одним запросом по индексу;
+* ETag строится из метки и поколений, Last-Modified — из метки. При
+  совпадении отдаётся 304 без тела;
+* тело ленты кэшируется под ключом с тем же ETag.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.core.cache import cache
+from django.db.models import Max
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.translation import get_language, gettext
+from taggit.models import Tag, TaggedItem
+
+from core.cache import SCOPE_CATEGORIES, SCOPE_POSTS, get_generations
+from core.middleware import language_url
+
+from .models import Category, Post
+
+FEED_ITEMS_COUNT = 20
+FEED_TIMEOUT = 60 * 60 * 24
+FEED_FORMATS = {
+    'rss': Rss201rev2Feed,
+    'atom': Atom1Feed,
+}
+FEED_SCOPES = (SCOPE_POSTS, SCOPE_CATEGORIES)
+STAMP_KEY = 'feeds:stamp:{}:{}'
+BODY_KEY = 'feeds:body:{}'
+# Метка «ленты нет» (неизвестная рубрика или тег), чтобы не спрашивать БД снова
+NOT_FOUND = 'not-found'
+EMPTY = 'empty'
+
+
+class FeedSource:
+    """Лента: статьи и описание; key — часть ключей кэша"""
+
+    def __init__(self, kind, slug=None):
+        self.kind = kind
+        self.slug = slug
+        self.key = f'{kind}:{slug}' if slug else kind
+
+    def posts(self):
+        posts = Post.objects.published()
+        if self.kind == 'category':
+            return posts.filter(category__slug=self.slug, category__is_active=True)
+        if self.kind == 'tag':
+            return posts.filter(pk__in=TaggedItem.objects.filter(
+                content_type=ContentType.objects.get_for_model(Post), tag__slug=self.slug,
+            ).values('object_id'))
+        return posts
+
+    def exists(self):
+        if self.kind == 'category':
+            return Category.objects.filter(slug=self.slug, is_active=True).exists()
+        if self.kind == 'tag':
+            return Tag.objects.filter(slug=self.slug).exists()
+        return True
+
+    def stamp(self):
+        """max(updated_at) статей ленты (None — статей нет); NOT_FOUND — ленты нет"""
+        if not self.exists():
+            return NOT_FOUND
+        return self.posts().aggregate(stamp=Max('updated_at'))['stamp']
+
+    def describe(self):
+        """(заголовок, путь страницы) на активном языке"""
+        if self.kind == 'category':
+            category = Category.objects.with_translations().get(slug=self.slug)
+            return f'MilanWeek — {category}', category.get_absolute_url()
+        if self.kind == 'tag':
+            tag = Tag.objects.get(slug=self.slug)
+            return f'MilanWeek — #{tag.name}', reverse('blog:tag', kwargs={'slug': tag.slug})
+        return f'MilanWeek — {gettext("Статьи")}', reverse('blog:post_list')
+
+
+def get_feed_state(source):
+    """(ETag, метка) ленты на активном языке или None, если ленты нет — только кэш"""
+    generations = get_generations(FEED_SCOPES)
+    version = '-'.join(str(generations[scope]) for scope in FEED_SCOPES)
+    stamp_key = STAMP_KEY.format(source.key, version)
+    stamp = cache.get(stamp_key)
+    if stamp is None:
+        stamp = source.stamp() or EMPTY
+        cache.set(stamp_key, stamp, FEED_TIMEOUT)
+    if stamp == NOT_FOUND:
+        return None
+    if stamp == EMPTY:
+        stamp = None
+    etag = hashlib.md5(
+        f'{source.key}:{get_language()}:{version}:{stamp.isoformat() if stamp else EMPTY}'.encode()
+    ).hexdigest()
+    return etag, stamp
+
+
+def render_feed(source, feed_format):
+    """Тело ленты на активном языке"""
+    language = get_language()
+    base_url = f'{settings.ACCOUNT_DEFAULT_HTTP_PROTOCOL}://{Site.objects.get_current().domain}'
+    title, path = source.describe()
+    feed_path = reverse(f'blog:{source.kind}_feed', kwargs={
+        'feed_format': feed_format, **({'slug': source.slug} if source.slug else {}),
+    })
+    feed = FEED_FORMATS[feed_format](
+        title=title,
+        link=language_url(base_url + path, language),
+        description=title,
+        language=language,
+        feed_url=language_url(base_url + feed_path, language),
+    )
+    posts = (
+        source.posts().select_related('author').with_translations(language)
+        .order_by('-published_at', '-id')[:FEED_ITEMS_COUNT]
+    )
+    for post in posts:
+        author = post.author.get_full_name() if post.author else ''
+        feed.add_item(
+            title=post.safe_translation_getter('title', default=post.slug),
+            link=language_url(base_url + post.get_absolute_url(), language),
+            description=post.safe_translation_getter('excerpt', default=''),
+            unique_id=base_url + post.get_absolute_url(),
+            pubdate=post.published_at,
+            updateddate=post.updated_at,
+            author_name=author or None,
+            categories=[str(post.category)] if post.category else None,
+        )
+    return feed.writeString('utf-8'), feed.content_type
+
+
+def get_feed_body(source, feed_format, etag):
+    key = BODY_KEY.format(hashlib.md5(f'{etag}:{feed_format}'.encode()).hexdigest())
+    body = cache.get(key)
+    if body is None:
+        body = render_feed(source, feed_format)
+        cache.set(key, body, FEED_TIMEOUT)
+    return body
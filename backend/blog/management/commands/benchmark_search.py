@@ -0,0 +1,124 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from blog.models import Post
+from blog.search import (
+    InvertedIndexSearchBackend,
+    PostgresSearchBackend,
+    build_search_vector,
+)
+
+PostTranslation = Post._parler_meta.root_model
+
+VOCABULARY_SIZE = 5000
+CONTENT_WORDS = 150
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержки поиска на синтетических статьях. '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--pages', type=int, default=3, help='Сколько страниц листать курсором')
+        parser.add_argument('--language', default=settings.LANGUAGE_CODE)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.vocabulary = [f'слово{index}' for index in range(VOCABULARY_SIZE)]
+        for size in options['sizes']:
+            with transaction.atomic():
+                self.seed_posts(size, options['language'])
+                self.run(size, options)
+                transaction.set_rollback(True)
+
+    def words(self, count):
+        # Распределение Ципфа: несколько частых слов и длинный хвост
+        return ' '.join(
+            self.vocabulary[min(int(self.random.paretovariate(1.1)) - 1, VOCABULARY_SIZE - 1)]
+            for _ in range(count)
+        )
+
+    def seed_posts(self, size, language):
+        started = time.perf_counter()
+        now = timezone.now()
+        prefix = f'bench-{size}-{int(now.timestamp())}'
+        for start in range(0, size, BATCH_SIZE):
+            posts = Post.objects.bulk_create([
+                Post(
+                    slug=f'{prefix}-{index}',
+                    status=Post.STATUS_PUBLISHED,
+                    published_at=now,
+                )
+                for index in range(start, min(start + BATCH_SIZE, size))
+            ])
+            PostTranslation.objects.bulk_create([
+                PostTranslation(
+                    master_id=post.pk,
+                    language_code=language,
+                    title=self.words(6),
+                    excerpt=self.words(20),
+                    content=self.words(CONTENT_WORDS),
+                )
+                for post in posts
+            ])
+        if connection.vendor == 'postgresql':
+            config = settings.SEARCH_CONFIGS.get(language, 'simple')
+            PostTranslation.objects.filter(master__slug__startswith=prefix).update(
+                search_vector=build_search_vector(config)
+            )
+        self.stdout.write(f'[{size}] подготовка данных: {time.perf_counter() - started:.1f} с')
+
+    def run(self, size, options):
+        language = options['language']
+        if connection.vendor == 'postgresql':
+            backend = PostgresSearchBackend()
+        else:
+            backend = InvertedIndexSearchBackend()
+            started = time.perf_counter()
+            index = backend.build(language)
+            backend.get_index = lambda language: index
+            self.stdout.write(
+                f'[{size}] построение индекса: {time.perf_counter() - started:.2f} с'
+            )
+
+        queries = [
+            ' '.join(self.random.sample(self.vocabulary[:200], self.random.choice([1, 2])))
+            for _ in range(options['queries'])
+        ]
+        first_page, deep_pages = [], []
+        for query in queries:
+            after = None
+            for page in range(options['pages']):
+                started = time.perf_counter()
+                hits = backend.search(query, language, after=after, limit=settings.PAGINATE_BY + 1)
+                elapsed = (time.perf_counter() - started) * 1000
+                (first_page if page == 0 else deep_pages).append(elapsed)
+                if len(hits) <= settings.PAGINATE_BY:
+                    break
+                after = hits[settings.PAGINATE_BY - 1]
+
+        self.report(size, backend, 'первая страница', first_page)
+        self.report(size, backend, 'следующие страницы', deep_pages)
+
+    def report(self, size, backend, label, timings):
+        if not timings:
+            return
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'[{size}] {type(backend).__name__}, {label}: '
+            f'p50={statistics.median(timings):.1f} мс, p95={p95:.1f} мс, '
+            f'max={timings[-1]:.1f} мс, запросов={len(timings)}'
+        )
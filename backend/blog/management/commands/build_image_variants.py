@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from core.images import generate_image_variants, manifest_is_current
+
+
+class Command(BaseCommand):
+    help = 'Создаёт адаптивные варианты (srcset) для изображений статей без актуального манифеста'
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by('pk').only('pk', 'image', 'image_variants')
+        )
+        built = 0
+        for post in posts.iterator(chunk_size=200):
+            if manifest_is_current(post.image_variants, post.image):
+                continue
+            generate_image_variants('blog.Post', post.pk, 'image', 'image_variants', ['posts'])
+            built += 1
+        self.stdout.write(f'Варианты созданы для {built} статей')
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.sitemaps import build_all, build_pending_shards
+
+
+class Command(BaseCommand):
+    help = 'Собирает gzip-файлы sitemap и индекс'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Пересобрать только шарды, помеченные после изменений статей',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['pending']:
+            shards = build_pending_shards()
+            self.stdout.write(f'Пересобрано шардов: {shards} за {time.perf_counter() - started:.1f} с')
+            return
+        shards = build_all()
+        self.stdout.write(f'Sitemap собран: {shards} шардов за {time.perf_counter() - started:.1f} с')
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.counters import flush_view_counts
+from blog.models import ViewCountFlush
+
+FLUSH_LOG_RETENTION = timedelta(days=7)
+
+
+class Command(BaseCommand):
+    help = 'Сбрасывает накопленные в кэше просмотры статей в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, сбрасывая просмотры раз в --interval секунд',
+        )
+        parser.add_argument(
+            '--interval', type=int, default=settings.VIEW_COUNT_FLUSH_INTERVAL,
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            views = flush_view_counts()
+            ViewCountFlush.objects.filter(
+                created_at__lt=timezone.now() - FLUSH_LOG_RETENTION
+            ).delete()
+            self.stdout.write(f'Сброшено просмотров: {views}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.scheduler import next_due_at, publish_due_posts
+
+
+class Command(BaseCommand):
+    help = 'Публикует запланированные статьи, срок публикации которых наступил'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно: просыпаться к ближайшей публикации, но не реже --interval секунд',
+        )
+        parser.add_argument('--interval', type=int, default=settings.SCHEDULED_PUBLISH_INTERVAL)
+        parser.add_argument('--batch-size', type=int, default=settings.SCHEDULED_PUBLISH_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            published = publish_due_posts(batch_size=options['batch_size'])
+            if published or not options['loop']:
+                self.stdout.write(f'Опубликовано статей: {published}')
+            if not options['loop']:
+                break
+            time.sleep(self.sleep_for(options['interval']))
+
+    def sleep_for(self, interval):
+        # Статью могут запланировать в любой момент — дольше interval не спим
+        due = next_due_at()
+        if due is None:
+            return interval
+        return min(interval, max((due - timezone.now()).total_seconds(), 0) + 0.1)
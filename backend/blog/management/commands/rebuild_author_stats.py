@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.author_stats import rebuild_author_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает показатели всех авторов (AuthorStats)'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        authors = rebuild_author_stats()
+        self.stdout.write(
+            f'Показатели авторов пересчитаны: {authors} авторов за {time.perf_counter() - started:.1f} с'
+        )
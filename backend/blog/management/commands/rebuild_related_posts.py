@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.related import rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает индекс похожих статей для всех опубликованных статей'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        posts = rebuild_related_posts()
+        self.stdout.write(
+            f'Похожие статьи пересчитаны: {posts} статей за {time.perf_counter() - started:.1f} с'
+        )
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.comments import reconcile_comments_count
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики одобренных комментариев статей и исправляет расхождения'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_comments_count()
+        self.stdout.write(f'Исправлено счётчиков: {fixed}')
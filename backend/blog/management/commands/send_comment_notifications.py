@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.notifications import queue_stats, send_due_notifications
+
+
+class Command(BaseCommand):
+    help = 'Отправляет накопленные уведомления о комментариях — одно письмо получателю за окно'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, проверяя очередь раз в --interval секунд',
+        )
+        parser.add_argument('--interval', type=int, default=settings.COMMENT_NOTIFY_INTERVAL)
+        parser.add_argument(
+            '--window', type=int, default=None,
+            help='Окно накопления, секунд (по умолчанию COMMENT_NOTIFY_WINDOW)',
+        )
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Только показать глубину очереди и задержку',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.report()
+            return
+        while True:
+            stats = send_due_notifications(options['window'])
+            self.stdout.write(
+                f'Писем: {stats.recipients} (комментариев: {stats.comments}), '
+                f'с ошибкой: {stats.failed}, макс. задержка: {stats.max_lag:.0f} с'
+            )
+            self.report()
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def report(self):
+        depth, lag = queue_stats()
+        self.stdout.write(f'В очереди получателей: {depth}, самое старое событие: {lag:.0f} с')
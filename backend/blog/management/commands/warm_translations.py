@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from blog.models import Category, Post
+from blog.translation_cache import (
+    STATS_TIERS,
+    get_hit_ratios,
+    invalidate_translations,
+    reset_hit_ratios,
+    warm_translations,
+)
+
+TIER_LABELS = {'l1': 'L1 (память процесса)', 'l2': 'L2 (общий кэш)', 'miss': 'промахи'}
+
+
+class Command(BaseCommand):
+    help = 'Заполняет кэш переводов опубликованных статей и активных рубрик на всех языках'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--stats', action='store_true',
+            help='Только показать доли попаданий по уровням кэша',
+        )
+        parser.add_argument(
+            '--reset-stats', action='store_true',
+            help='Обнулить счётчики попаданий после вывода',
+        )
+
+    def handle(self, *args, **options):
+        if not options['stats']:
+            self.warm(options['chunk_size'])
+        self.report()
+        if options['reset_stats']:
+            reset_hit_ratios()
+
+    def warm(self, chunk_size):
+        languages = [code for code, _ in settings.LANGUAGES]
+        started = time.perf_counter()
+        posts = warm_translations(Post.objects.published(), languages, chunk_size)
+        categories = warm_translations(Category.objects.filter(is_active=True), languages, chunk_size)
+        # Новые записи L2 должны вытеснить старые L1 во всех воркерах
+        invalidate_translations()
+        self.stdout.write(
+            f'Кэш переводов заполнен ({", ".join(languages)}): статьи — {posts} ключей, '
+            f'рубрики — {categories} ключей за {time.perf_counter() - started:.1f} с'
+        )
+
+    def report(self):
+        counts, ratios = get_hit_ratios()
+        total = sum(counts.values())
+        self.stdout.write(f'Обращений к кэшу переводов: {total}')
+        for tier in STATS_TIERS:
+            self.stdout.write(f'  {TIER_LABELS[tier]}: {counts[tier]} ({ratios[tier]:.1%})')
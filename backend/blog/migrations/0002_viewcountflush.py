@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ViewCountFlush",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "batch_id",
+                    models.CharField(max_length=32, unique=True, verbose_name="Пачка"),
+                ),
+                (
+                    "posts_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Статей"),
+                ),
+                (
+                    "views_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Просмотров"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Создано"),
+                ),
+            ],
+            options={
+                "verbose_name": "Сброс просмотров",
+                "verbose_name_plural": "Сбросы просмотров",
+            },
+        ),
+    ]
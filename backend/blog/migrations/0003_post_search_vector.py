@@ -0,0 +1,63 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+GIN_INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=["search_vector"], name="blog_post_tr_search_gin"
+)
+
+
+def create_gin_index(apps, schema_editor):
+    # GIN есть только в PostgreSQL; на SQLite поиск работает через blog.search
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    PostTranslation = apps.get_model("blog", "PostTranslation")
+    schema_editor.add_index(PostTranslation, GIN_INDEX)
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    PostTranslation = apps.get_model("blog", "PostTranslation")
+    schema_editor.remove_index(PostTranslation, GIN_INDEX)
+
+
+def fill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    from blog.search import build_search_vector
+
+    PostTranslation = apps.get_model("blog", "PostTranslation")
+    for language, config in settings.SEARCH_CONFIGS.items():
+        PostTranslation.objects.filter(language_code=language).update(
+            search_vector=build_search_vector(config)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0002_viewcountflush"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="posttranslation",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(model_name="posttranslation", index=GIN_INDEX),
+            ],
+            database_operations=[
+                migrations.RunPython(create_gin_index, drop_gin_index),
+            ],
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
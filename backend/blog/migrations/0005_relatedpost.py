@@ -0,0 +1,59 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0004_post_feed_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RelatedPost",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("position", models.PositiveSmallIntegerField(verbose_name="Позиция")),
+                ("score", models.FloatField(verbose_name="Оценка")),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_index",
+                        to="blog.post",
+                        verbose_name="Статья",
+                    ),
+                ),
+                (
+                    "related",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="related_in",
+                        to="blog.post",
+                        verbose_name="Похожая статья",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Похожая статья",
+                "verbose_name_plural": "Похожие статьи",
+                "ordering": ["post", "position"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="relatedpost",
+            constraint=models.UniqueConstraint(
+                fields=("post", "position"), name="blog_related_post_position_uniq"
+            ),
+        ),
+    ]
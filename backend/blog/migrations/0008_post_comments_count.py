@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:31
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_comments_count(apps, schema_editor):
+    Comment = apps.get_model("blog", "Comment")
+    Post = apps.get_model("blog", "Post")
+    approved = (
+        Comment.objects.filter(post=OuterRef("pk"), is_approved=True)
+        .order_by().values("post").annotate(count=Count("pk")).values("count")
+    )
+    Post.objects.update(comments_count=Coalesce(Subquery(approved), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0007_alter_post_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comments_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="Комментарии"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "is_approved", "created_at", "id"],
+                name="blog_comment_post_feed_idx",
+            ),
+        ),
+        migrations.RunPython(fill_comments_count, migrations.RunPython.noop),
+    ]
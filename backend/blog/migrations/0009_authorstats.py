@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("blog", "0008_post_comments_count"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuthorStats",
+            fields=[
+                (
+                    "author",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="author_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Автор",
+                    ),
+                ),
+                (
+                    "posts_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Статей"),
+                ),
+                (
+                    "views_count",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="Просмотров"
+                    ),
+                ),
+                (
+                    "category_counts",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Статей по рубрикам"
+                    ),
+                ),
+                (
+                    "last_published_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Последняя публикация"
+                    ),
+                ),
+                (
+                    "last_activity_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Последняя активность"
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Пересчитано"),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика автора",
+                "verbose_name_plural": "Статистика авторов",
+            },
+        ),
+    ]
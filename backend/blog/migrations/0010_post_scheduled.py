@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:38
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+
+def schedule_future_posts(apps, schema_editor):
+    # published() больше не сравнивает published_at с текущим временем:
+    # будущие «опубликованные» статьи становятся запланированными, а
+    # опубликованные без даты получают дату создания
+    Post = apps.get_model("blog", "Post")
+    Post.objects.filter(status="published", published_at__gt=timezone.now()).update(
+        status="scheduled"
+    )
+    Post.objects.filter(status="published", published_at__isnull=True).update(
+        published_at=F("created_at")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0009_authorstats"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="post",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("draft", "Черновик"),
+                    ("scheduled", "Запланировано"),
+                    ("published", "Опубликовано"),
+                ],
+                default="draft",
+                max_length=10,
+                verbose_name="Статус",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "scheduled")),
+                fields=["published_at"],
+                name="blog_post_scheduled_idx",
+            ),
+        ),
+        migrations.RunPython(schedule_future_posts, migrations.RunPython.noop),
+    ]
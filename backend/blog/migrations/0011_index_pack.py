@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("blog", "0010_post_scheduled"),
+    ]
+
+    # Новые индексы строятся до удаления старых — ленты не остаются без индекса
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["-published_at", "-id"],
+                name="blog_post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["category", "-published_at", "-id"],
+                name="blog_post_category_pub_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", "published")),
+                fields=["author", "-published_at", "-id"],
+                name="blog_post_author_pub_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_featured", True), ("status", "published")),
+                fields=["-published_at", "-id"],
+                name="blog_post_featured_idx",
+            ),
+        ),
+        migrations.RemoveIndex(
+            model_name="post",
+            name="blog_post_feed_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="post",
+            name="blog_post_category_feed_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="post",
+            name="blog_post_author_feed_idx",
+        ),
+    ]
@@ -1,10 +1,27 @@
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.text import slugify
+from parler.managers import TranslatableManager
 from parler.models import TranslatableModel, TranslatedFields
 from taggit.managers import TaggableManager
 
+from core.storage import get_media_storage
+
+from .translations import TranslationPrefetchQuerySet
+
+
+class CategoryQuerySet(TranslationPrefetchQuerySet):
+    """QuerySet рубрик"""
+    
+    def with_translations(self, language=None):
+        return self.prefetch_translations(language)
+
 
 class Category(TranslatableModel):
     """Категория статей"""
@@ -17,6 +34,8 @@ class Category(TranslatableModel):
     order = models.PositiveIntegerField('Порядок', default=0)
     is_active = models.BooleanField('Активна', default=True)
     
+    objects = TranslatableManager.from_queryset(CategoryQuerySet)()
+    
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
@@ -29,13 +48,47 @@ class Category(TranslatableModel):
         return reverse('blog:category', kwargs={'slug': self.slug})
 
 
+class PostQuerySet(TranslationPrefetchQuerySet):
+    """QuerySet статей"""
+    
+    def published(self):
+        # Без условия на текущее время: статью с будущей датой save() делает
+        # запланированной, в срок её публикует blog.scheduler. Запрос не
+        # зависит от часов, и кэши списков живут до инвалидации, а не до TTL.
+        return self.filter(status=Post.STATUS_PUBLISHED)
+    
+    def due(self, now=None):
+        """Запланированные статьи, срок публикации которых наступил"""
+        return self.filter(status=Post.STATUS_SCHEDULED, published_at__lte=now or timezone.now())
+    
+    def with_translations(self, language=None):
+        """Переводы статей и их рубрик на язык language (и запасные) — два запроса"""
+        return self.prefetch_translations(language, related=['category'])
+    
+    def change_comments_count(self, deltas):
+        """Прибавляет к comments_count {post_id: delta} одним UPDATE ... CASE, возвращает id статей"""
+        deltas = {post_id: delta for post_id, delta in deltas.items() if post_id and delta}
+        if deltas:
+            increment = Case(
+                *[When(pk=post_id, then=Value(delta)) for post_id, delta in deltas.items()],
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+            self.filter(pk__in=deltas).update(
+                comments_count=Greatest(F('comments_count') + increment, Value(0))
+            )
+        return set(deltas)
+
+
 class Post(TranslatableModel):
     """Статья блога"""
     
     STATUS_DRAFT = 'draft'
+    STATUS_SCHEDULED = 'scheduled'
     STATUS_PUBLISHED = 'published'
     STATUS_CHOICES = [
         (STATUS_DRAFT, 'Черновик'),
+        (STATUS_SCHEDULED, 'Запланировано'),
         (STATUS_PUBLISHED, 'Опубликовано'),
     ]
     
@@ -43,6 +96,11 @@ class Post(TranslatableModel):
         title=models.CharField('Заголовок', max_length=255),
         excerpt=models.TextField('Краткое описание', blank=True),
         content=models.TextField('Содержимое'),
+        # Полнотекстовый индекс перевода (PostgreSQL), обновляется в blog.search
+        search_vector=SearchVectorField(null=True, editable=False),
+        meta={
+            'indexes': [GinIndex(fields=['search_vector'], name='blog_post_tr_search_gin')],
+        },
     )
     
     slug = models.SlugField('Slug', unique=True, max_length=255)
@@ -62,7 +120,11 @@ class Post(TranslatableModel):
         verbose_name='Категория'
     )
     
-    image = models.ImageField('Изображение', upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(
+        'Изображение', upload_to='posts/', storage=get_media_storage, blank=True, null=True
+    )
+    # Манифест адаптивных вариантов image (core.images)
+    image_variants = models.JSONField('Варианты изображения', default=dict, blank=True, editable=False)
     
     status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default=STATUS_DRAFT)
     is_featured = models.BooleanField('Избранное', default=False)
@@ -70,6 +132,8 @@ class Post(TranslatableModel):
     
     reading_time = models.PositiveIntegerField('Время чтения (мин)', default=5)
     views_count = models.PositiveIntegerField('Просмотры', default=0)
+    # Одобренные комментарии; поддерживается blog.signals и blog.comments
+    comments_count = models.PositiveIntegerField('Комментарии', default=0, editable=False)
     
     tags = TaggableManager(blank=True)
     
@@ -77,10 +141,38 @@ class Post(TranslatableModel):
     updated_at = models.DateTimeField('Обновлено', auto_now=True)
     published_at = models.DateTimeField('Опубликовано', blank=True, null=True)
     
+    objects = TranslatableManager.from_queryset(PostQuerySet)()
+    
     class Meta:
         verbose_name = 'Статья'
         verbose_name_plural = 'Статьи'
         ordering = ['-published_at']
+        # Ключи курсорной пагинации лент (blog.pagination). Ленты читают только
+        # опубликованные статьи — индексы частичные, черновики в них не попадают.
+        # Планы запросов проверяет blog.tests.QueryPlanTests.
+        indexes = [
+            models.Index(
+                fields=['-published_at', '-id'], condition=Q(status='published'),
+                name='blog_post_published_idx',
+            ),
+            models.Index(
+                fields=['category', '-published_at', '-id'], condition=Q(status='published'),
+                name='blog_post_category_pub_idx',
+            ),
+            models.Index(
+                fields=['author', '-published_at', '-id'], condition=Q(status='published'),
+                name='blog_post_author_pub_idx',
+            ),
+            # Избранное на главной (core.homepage)
+            models.Index(
+                fields=['-published_at', '-id'], condition=Q(status='published', is_featured=True),
+                name='blog_post_featured_idx',
+            ),
+            # Очередь отложенной публикации (blog.scheduler) — только запланированные
+            models.Index(
+                fields=['published_at'], condition=Q(status='scheduled'), name='blog_post_scheduled_idx'
+            ),
+        ]
     
     def __str__(self):
         return self.safe_translation_getter('title', default=self.slug)
@@ -88,16 +180,37 @@ class Post(TranslatableModel):
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Значения из БД: сигналам нужно знать, что изменилось при сохранении
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.safe_translation_getter('title', default='post'))
+        if self.status == self.STATUS_PUBLISHED:
+            now = timezone.now()
+            if self.published_at is None:
+                self.published_at = now
+            elif self.published_at > now:
+                self.status = self.STATUS_SCHEDULED
         super().save(*args, **kwargs)
 
 
+class CommentQuerySet(models.QuerySet):
+    """QuerySet комментариев"""
+    
+    def approved(self):
+        return self.filter(is_approved=True)
+
+
 class Comment(models.Model):
     """Комментарий к статье"""
     
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    # Отдельный индекс по post_id не нужен: его покрывает blog_comment_post_feed_idx
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments', db_index=False)
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -107,10 +220,102 @@ class Comment(models.Model):
     is_approved = models.BooleanField('Одобрен', default=True)
     created_at = models.DateTimeField('Создано', auto_now_add=True)
     
+    objects = CommentQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
         ordering = ['-created_at']
+        # Ключ курсорной пагинации комментариев статьи (blog.comments)
+        indexes = [
+            models.Index(
+                fields=['post', 'is_approved', 'created_at', 'id'], name='blog_comment_post_feed_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f'{self.author} - {self.post}'
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Счётчику статьи нужно знать, был ли комментарий одобрен и где
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # comments_count статьи меняется в blog.signals в той же транзакции
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
+class ViewCountFlush(models.Model):
+    """Применённая пачка просмотров — защита от повторного сброса"""
+    
+    batch_id = models.CharField('Пачка', max_length=32, unique=True)
+    posts_count = models.PositiveIntegerField('Статей', default=0)
+    views_count = models.PositiveIntegerField('Просмотров', default=0)
+    created_at = models.DateTimeField('Создано', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Сброс просмотров'
+        verbose_name_plural = 'Сбросы просмотров'
+    
+    def __str__(self):
+        return self.batch_id
+
+
+class RelatedPost(models.Model):
+    """Предрассчитанная похожая статья (см. blog.related)"""
+    
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_index',
+        verbose_name='Статья'
+    )
+    related = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='related_in',
+        verbose_name='Похожая статья'
+    )
+    position = models.PositiveSmallIntegerField('Позиция')
+    score = models.FloatField('Оценка')
+    
+    class Meta:
+        verbose_name = 'Похожая статья'
+        verbose_name_plural = 'Похожие статьи'
+        ordering = ['post', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'position'], name='blog_related_post_position_uniq'),
+        ]
+    
+    def __str__(self):
+        return f'{self.post_id} → {self.related_id}'
+
+
+class AuthorStats(models.Model):
+    """Показатели автора для его страницы; поддерживаются blog.author_stats"""
+    
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='author_stats',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField('Статей', default=0)
+    views_count = models.PositiveBigIntegerField('Просмотров', default=0)
+    # {id рубрики: число опубликованных статей автора в ней}
+    category_counts = models.JSONField('Статей по рубрикам', default=dict, blank=True)
+    last_published_at = models.DateTimeField('Последняя публикация', blank=True, null=True)
+    last_activity_at = models.DateTimeField('Последняя активность', blank=True, null=True)
+    updated_at = models.DateTimeField('Пересчитано', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
     
     def __str__(self):
-        return f'{self.author} - {self.post}'
\ No newline at end of file
+        return f'{self.author_id}: {self.posts_count}'
@@ -0,0 +1,196 @@
+"""Уведомления о новых комментариях.
+
+Запрос, создавший комментарий, ничего не отправляет: после коммита он
+ставит фоновую задачу fan_out_comments (core.tasks). Задача находит
+получателей — автора статьи и тех, кто уже комментировал её, с
+``User.comments_notify`` и кроме автора комментария — и добавляет
+комментарий в очередь каждого:
+
+* ``notifications:pending:<user_id>`` — множество id комментариев;
+* ``notifications:since:<user_id>`` — время первого события окна;
+* ``notifications:recipients`` — получатели с непустой очередью.
+
+send_due_notifications() (команда ``send_comment_notifications``) берёт
+получателей, у которых окно COMMENT_NOTIFY_WINDOW истекло, и отправляет
+каждому одно письмо со всеми комментариями окна. Все письма прохода идут
+через одно открытое соединение COMMENT_NOTIFY_EMAIL_BACKEND (EMAIL_* из
+настроек; для тестов — locmem). Не отправленные письма возвращаются в
+очередь.
+
+queue_stats() — глубина очереди и задержка самого старого события.
+"""
+import logging
+import smtplib
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import translation
+
+from core.cache import add_to_set, get_queue_cache, pop_set, set_members
+
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+RECIPIENTS_KEY = 'notifications:recipients'
+PENDING_KEY = 'notifications:pending:{}'
+SINCE_KEY = 'notifications:since:{}'
+
+
+@dataclass
+class NotificationStats:
+    recipients: int = 0
+    comments: int = 0
+    failed: int = 0
+    max_lag: float = 0.0
+
+
+def comment_recipients(comment):
+    """id пользователей, которым нужно сообщить о комментарии"""
+    commenters = Comment.objects.approved().filter(post_id=comment.post_id).values('author_id')
+    return list(
+        get_user_model().objects
+        .filter(Q(pk=comment.post.author_id) | Q(pk__in=commenters))
+        .filter(comments_notify=True, is_active=True)
+        .exclude(pk=comment.author_id)
+        .values_list('pk', flat=True)
+    )
+
+
+def _queue(user_id, comment_ids, since):
+    add_to_set(PENDING_KEY.format(user_id), *comment_ids)
+    # Окно открывает первое событие; следующие его не сдвигают
+    get_queue_cache().add(SINCE_KEY.format(user_id), since, timeout=None)
+
+
+def fan_out_comments(comment_ids):
+    """Фоновая задача: ставит комментарии в очереди получателей"""
+    comments = Comment.objects.approved().select_related('post').filter(pk__in=comment_ids)
+    now = time.time()
+    queued = 0
+    for comment in comments:
+        recipients = comment_recipients(comment)
+        for user_id in recipients:
+            _queue(user_id, [comment.pk], now)
+        if recipients:
+            add_to_set(RECIPIENTS_KEY, *recipients)
+        queued += len(recipients)
+    return queued
+
+
+def _take_due(window, now):
+    """Забирает из очереди получателей с истекшим окном: {user_id: (since, [comment_id])}"""
+    recipients = pop_set(RECIPIENTS_KEY)
+    since_keys = {SINCE_KEY.format(user_id): user_id for user_id in recipients}
+    queue_cache = get_queue_cache()
+    found = queue_cache.get_many(list(since_keys))
+    due, waiting = {}, []
+    for key, user_id in since_keys.items():
+        # Метка вытеснена из кэша — отправляем сразу, а не держим вечно
+        since = found.get(key, 0)
+        if now - since < window:
+            waiting.append(user_id)
+            continue
+        queue_cache.delete(key)
+        comment_ids = pop_set(PENDING_KEY.format(user_id))
+        if comment_ids:
+            due[int(user_id)] = (since or now, sorted(int(pk) for pk in comment_ids))
+    if waiting:
+        add_to_set(RECIPIENTS_KEY, *waiting)
+    return due
+
+
+def _site_context():
+    site = Site.objects.get_current()
+    return {
+        'site_domain': site.domain,
+        'site_url': f'{settings.ACCOUNT_DEFAULT_HTTP_PROTOCOL}://{site.domain}',
+    }
+
+
+def _build_messages(due, connection):
+    """[(user_id, письмо)] для получателей, которые ещё хотят уведомления"""
+    comment_ids = {pk for _, pks in due.values() for pk in pks}
+    comments = Comment.objects.approved().filter(pk__in=comment_ids).select_related('author')
+    comments = {comment.pk: comment for comment in comments.order_by('created_at', 'id')}
+    post_ids = {comment.post_id for comment in comments.values()}
+    posts = Post.objects.filter(pk__in=post_ids).with_translations().in_bulk()
+    users = get_user_model().objects.filter(comments_notify=True, is_active=True).in_bulk(due)
+    context = {**_site_context(), 'language': translation.get_language()}
+
+    messages = []
+    for user_id, (_, pks) in due.items():
+        user = users.get(user_id)
+        by_post = defaultdict(list)
+        for pk in pks:
+            comment = comments.get(pk)
+            if comment is not None:
+                by_post[comment.post_id].append(comment)
+        if user is None or not by_post:
+            continue
+        context.update({
+            'user': user,
+            'posts': [(posts[post_id], post_comments) for post_id, post_comments in by_post.items()],
+            'comments_count': sum(len(post_comments) for post_comments in by_post.values()),
+        })
+        subject = translation.gettext('Новые комментарии на MilanWeek')
+        message = EmailMultiAlternatives(
+            subject, render_to_string('emails/comment_notification.txt', context),
+            settings.DEFAULT_FROM_EMAIL, [user.email], connection=connection,
+        )
+        message.attach_alternative(
+            render_to_string('emails/comment_notification.html', {**context, 'subject': subject}),
+            'text/html',
+        )
+        messages.append((user_id, message))
+    return messages
+
+
+def send_due_notifications(window=None):
+    """Отправляет письма получателям с истекшим окном, возвращает NotificationStats"""
+    window = settings.COMMENT_NOTIFY_WINDOW if window is None else window
+    now = time.time()
+    due = _take_due(window, now)
+    stats = NotificationStats()
+    if not due:
+        return stats
+
+    connection = get_connection(settings.COMMENT_NOTIFY_EMAIL_BACKEND)
+    with translation.override(settings.LANGUAGE_CODE):
+        messages = _build_messages(due, connection)
+    try:
+        for user_id, message in messages:
+            since, comment_ids = due[user_id]
+            try:
+                # Одно соединение на весь проход: открытое заранее send() не закрывает
+                connection.open()
+                message.send()
+            except (smtplib.SMTPException, OSError):
+                logger.warning('Не удалось отправить уведомление пользователю %s', user_id, exc_info=True)
+                stats.failed += 1
+                _queue(user_id, comment_ids, since)
+                add_to_set(RECIPIENTS_KEY, user_id)
+                # Соединение могло оборваться — следующее письмо откроет новое
+                connection.close()
+                continue
+            stats.recipients += 1
+            stats.comments += len(comment_ids)
+            stats.max_lag = max(stats.max_lag, now - since)
+    finally:
+        connection.close()
+    return stats
+
+
+def queue_stats():
+    """(получателей в очереди, задержка самого старого события в секундах)"""
+    recipients = set_members(RECIPIENTS_KEY)
+    found = get_queue_cache().get_many([SINCE_KEY.format(user_id) for user_id in recipients])
+    oldest = min(found.values(), default=None)
+    return len(recipients), (time.time() - oldest if oldest is not None else 0.0)
@@ -0,0 +1,189 @@
+"""Курсорная (keyset) пагинация.
+
+Курсор — подписанное непрозрачное значение ключа сортировки крайней
+записи страницы. Соседняя страница выбирается условием «ключ меньше/больше
+курсора» по составному индексу, без OFFSET и COUNT(*), поэтому глубокие
+страницы архива стоят столько же, сколько первая.
+
+Общее число записей не считается; при необходимости есть дешёвая оценка
+``approximate_count`` по статистике планировщика PostgreSQL.
+"""
+import datetime
+import decimal
+import json
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'blog.pagination'
+DIRECTION_NEXT = 'n'
+DIRECTION_PREVIOUS = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class _CursorEncoder(json.JSONEncoder):
+    # Полный isoformat: DjangoJSONEncoder обрезает микросекунды,
+    # а ключ курсора должен совпадать со значением в БД точно
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.date)):
+            return o.isoformat()
+        if isinstance(o, decimal.Decimal):
+            return str(o)
+        return super().default(o)
+
+
+class _CursorSerializer:
+    def dumps(self, obj):
+        return json.dumps(obj, cls=_CursorEncoder, separators=(',', ':')).encode('latin-1')
+
+    def loads(self, data):
+        return json.loads(data.decode('latin-1'))
+
+
+def encode_cursor(values, salt=CURSOR_SALT):
+    return signing.dumps(
+        list(values), salt=salt, serializer=_CursorSerializer, compress=True
+    )
+
+
+def decode_cursor(token, salt=CURSOR_SALT):
+    try:
+        return signing.loads(token, salt=salt, serializer=_CursorSerializer)
+    except signing.BadSignature:
+        raise InvalidCursor(token)
+
+
+def approximate_count(queryset):
+    """
+    Оценка числа строк без COUNT(*).
+
+    В PostgreSQL берётся из плана (EXPLAIN опирается на статистику таблиц),
+    в остальных БД — обычный count().
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPage:
+    """Страница курсорной пагинации"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Пагинация по уникальному ключу сортировки, например ('-published_at', '-id').
+
+    Последнее поле ключа должно быть уникальным (обычно id), все поля — не NULL.
+    """
+
+    def __init__(self, queryset, per_page, ordering=('-published_at', '-id')):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    @cached_property
+    def approximate_count(self):
+        return approximate_count(self.queryset)
+
+    def _key(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _decode(self, cursor):
+        """Направление и ключ из курсора, ключ приведён к типам полей сортировки"""
+        try:
+            direction, values = decode_cursor(cursor)
+        except (ValueError, TypeError):
+            raise InvalidCursor(cursor)
+        if direction not in (DIRECTION_NEXT, DIRECTION_PREVIOUS):
+            raise InvalidCursor(cursor)
+        # Подпись подтверждает только, что курсор выдали мы, — но, может быть,
+        # для другого списка с другим ключом сортировки
+        if not isinstance(values, list) or len(values) != len(self.fields) or None in values:
+            raise InvalidCursor(cursor)
+        fields = [self.queryset.model._meta.get_field(field) for field in self.fields]
+        try:
+            values = [field.to_python(value) for field, value in zip(fields, values)]
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(cursor)
+        return direction, values
+
+    def _seek(self, values, forward):
+        """Условие «строго после values» в порядке сортировки (forward) или до него"""
+        condition = Q()
+        equal = {}
+        for ordering, field, value in zip(self.ordering, self.fields, values):
+            descending = ordering.startswith('-')
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def page(self, cursor=None):
+        direction, values = DIRECTION_NEXT, None
+        if cursor:
+            try:
+                direction, values = self._decode(cursor)
+            except InvalidCursor:
+                direction, values = DIRECTION_NEXT, None
+
+        forward = direction != DIRECTION_PREVIOUS
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        ordering = self.ordering if forward else self._reversed_ordering()
+        rows = list(queryset.order_by(*ordering)[:self.per_page + 1])
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            # Вперёд: есть ещё строки, либо мы пришли сюда назад по курсору
+            if (forward and has_more) or (not forward and values is not None):
+                next_cursor = encode_cursor([DIRECTION_NEXT, self._key(rows[-1])])
+            if (not forward and has_more) or (forward and values is not None):
+                previous_cursor = encode_cursor([DIRECTION_PREVIOUS, self._key(rows[0])])
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
@@ -0,0 +1,189 @@
+"""Похожие статьи: общие теги и та же рубрика.
+
+Для каждой опубликованной статьи заранее считается RELATED_INDEX_SIZE
+похожих (таблица RelatedPost), страница статьи берёт их одним запросом по
+индексу (post, position).
+
+Оценка пары — число общих тегов плюс CATEGORY_WEIGHT за общую рубрику,
+при равенстве выше более свежая статья. Общие теги — строка произведения
+разреженной матрицы «статья × тег» на транспонированную: матрица хранится
+обратным индексом {тег: статьи}, и строка считается только по ненулевым
+элементам.
+
+* Команда ``rebuild_related_posts`` пересчитывает индекс целиком.
+* При изменении тегов, рубрики или статуса статьи (blog.signals) после
+  коммита фоновая задача (core.tasks) пересчитывает её строку и строки
+  статей, в чьей выдаче она есть или может появиться: до 500 соседей —
+  не работа для запроса админки.
+"""
+import heapq
+from collections import Counter, defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from taggit.models import TaggedItem
+
+from core.cache import bump_generation
+
+from .models import Post, RelatedPost
+
+RELATED_POSTS_COUNT = 4
+# С запасом: статьи, снятые с публикации, отсеиваются при чтении
+RELATED_INDEX_SIZE = 8
+CATEGORY_WEIGHT = 0.5
+MAX_AFFECTED_POSTS = 500
+WRITE_BATCH_SIZE = 1000
+
+
+def get_related_posts(post, limit=RELATED_POSTS_COUNT):
+    return (
+        Post.objects.published()
+        .filter(related_in__post=post)
+        .order_by('related_in__position')
+        .prefetch_translations()[:limit]
+    )
+
+
+class TagOverlap:
+    """Разреженная матрица «статья × тег» и рубрики опубликованных статей"""
+
+    def __init__(self):
+        self.post_tags = defaultdict(set)
+        self.tag_posts = defaultdict(set)
+        self.categories = {}
+        self.published_at = {}
+        self.category_latest = {}
+
+    @classmethod
+    def load(cls, post_ids=None):
+        """
+        Все опубликованные статьи или только то, что нужно для строк post_ids:
+        их теги, статьи с этими тегами и последние статьи их рубрик.
+        """
+        overlap = cls()
+        published = Post.objects.filter(status=Post.STATUS_PUBLISHED)
+        tagged = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post))
+        if post_ids is None:
+            tagged = tagged.filter(object_id__in=published.values('pk'))
+        else:
+            tag_ids = tagged.filter(object_id__in=post_ids).values('tag_id')
+            tagged = tagged.filter(tag_id__in=tag_ids, object_id__in=published.values('pk'))
+        for post_id, tag_id in tagged.values_list('object_id', 'tag_id').iterator(chunk_size=5000):
+            overlap.post_tags[post_id].add(tag_id)
+            overlap.tag_posts[tag_id].add(post_id)
+
+        posts = published
+        if post_ids is not None:
+            posts = published.filter(pk__in=set(post_ids) | set(overlap.post_tags))
+        overlap.add_posts(posts)
+
+        categories = set(overlap.categories.values()) - {None}
+        if post_ids is None:
+            latest = defaultdict(list)
+            for post_id in sorted(overlap.categories, key=overlap.recency, reverse=True):
+                category_id = overlap.categories[post_id]
+                if category_id and len(latest[category_id]) <= RELATED_INDEX_SIZE:
+                    latest[category_id].append(post_id)
+            overlap.category_latest = dict(latest)
+        else:
+            for category_id in categories:
+                mates = published.filter(category_id=category_id).order_by('-published_at', '-id')
+                overlap.category_latest[category_id] = list(
+                    mates.values_list('pk', flat=True)[:RELATED_INDEX_SIZE + 1]
+                )
+            extra = {pk for mates in overlap.category_latest.values() for pk in mates}
+            overlap.add_posts(published.filter(pk__in=extra - set(overlap.categories)))
+        return overlap
+
+    def add_posts(self, queryset):
+        rows = queryset.values_list('pk', 'category_id', 'published_at')
+        for post_id, category_id, published_at in rows.iterator(chunk_size=5000):
+            self.categories[post_id] = category_id
+            self.published_at[post_id] = published_at.timestamp() if published_at else 0
+
+    def recency(self, post_id):
+        return self.published_at.get(post_id, 0), post_id
+
+    def scores(self, post_id):
+        """Оценки всех статей, похожих на post_id (строка A·Aᵀ плюс рубрика)"""
+        if post_id not in self.categories:
+            return Counter()
+        scores = Counter()
+        for tag_id in self.post_tags.get(post_id, ()):
+            scores.update(self.tag_posts[tag_id])
+        category_id = self.categories[post_id]
+        if category_id:
+            for other_id in scores:
+                if self.categories.get(other_id) == category_id:
+                    scores[other_id] += CATEGORY_WEIGHT
+            for other_id in self.category_latest.get(category_id, ()):
+                if other_id not in scores:
+                    scores[other_id] = CATEGORY_WEIGHT
+        scores.pop(post_id, None)
+        # Кандидаты, которые не опубликованы, в categories не попадают
+        return Counter({pk: score for pk, score in scores.items() if pk in self.categories})
+
+    def top(self, post_id, size=RELATED_INDEX_SIZE):
+        scores = self.scores(post_id)
+        best = heapq.nlargest(size, scores, key=lambda pk: (scores[pk], self.recency(pk)))
+        return [(pk, scores[pk]) for pk in best]
+
+
+def write_related_rows(rows):
+    """Заменяет строки индекса: rows — {post_id: [(related_id, score), ...]}"""
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=list(rows)).delete()
+        RelatedPost.objects.bulk_create(
+            [
+                RelatedPost(post_id=post_id, related_id=related_id, position=position, score=score)
+                for post_id, related in rows.items()
+                for position, (related_id, score) in enumerate(related)
+            ],
+            batch_size=WRITE_BATCH_SIZE,
+        )
+
+
+def rebuild_related_posts():
+    """Полный пересчёт индекса, возвращает число статей"""
+    overlap = TagOverlap.load()
+    post_ids = sorted(overlap.categories)
+    with transaction.atomic():
+        RelatedPost.objects.exclude(post_id__in=post_ids).delete()
+        for start in range(0, len(post_ids), WRITE_BATCH_SIZE):
+            chunk = post_ids[start:start + WRITE_BATCH_SIZE]
+            write_related_rows({post_id: overlap.top(post_id) for post_id in chunk})
+    return len(post_ids)
+
+
+def refresh_related_posts(post_id):
+    """
+    Пересчёт после изменения одной статьи.
+
+    Оценка симметрична, поэтому достаточно пересчитать строку самой статьи,
+    строки, где она уже есть, и строки соседей, чей последний элемент она
+    теперь не хуже.
+    """
+    overlap = TagOverlap.load([post_id])
+    scores = overlap.scores(post_id)
+
+    affected = set(RelatedPost.objects.filter(related_id=post_id).values_list('post_id', flat=True))
+    thresholds = dict(
+        RelatedPost.objects.filter(
+            post_id__in=list(scores), position=RELATED_INDEX_SIZE - 1
+        ).values_list('post_id', 'score')
+    )
+    candidates = [
+        pk for pk, score in scores.items()
+        if pk not in thresholds or score >= thresholds[pk]
+    ]
+    # Остальное подберёт полный пересчёт rebuild_related_posts
+    affected.update(heapq.nlargest(MAX_AFFECTED_POSTS, candidates, key=scores.get))
+    affected.discard(post_id)
+
+    rows = {post_id: overlap.top(post_id)}
+    if affected:
+        neighbours = TagOverlap.load(affected)
+        rows.update({pk: neighbours.top(pk) for pk in affected})
+    write_related_rows(rows)
+    bump_generation(*[f'post:{pk}' for pk in rows])
+    return len(rows)
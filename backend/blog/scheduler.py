@@ -0,0 +1,141 @@
+"""Отложенная публикация статей.
+
+Статья с датой публикации в будущем хранится со статусом «Запланировано»
+(Post.save переводит в него «Опубликовано» с будущей датой). Команда
+``publish_scheduled_posts --loop`` опрашивает частичный индекс
+``blog_post_scheduled_idx`` — в нём только запланированные статьи — и
+публикует наступившие пачками по SCHEDULED_PUBLISH_BATCH_SIZE: один
+``UPDATE`` на пачку, строки заблокированы ``SKIP LOCKED``, поэтому
+несколько воркеров не публикуют одну статью дважды.
+
+После коммита пачки сбрасывается ровно то, что сбросило бы сохранение
+статьи: фрагменты статей, их рубрик и списков, страницы в кэше страниц и
+на прокси, шарды sitemap, показатели авторов и похожие статьи. Поэтому
+списки не фильтруют по текущему времени и кэшируются надолго.
+
+Если воркер не запущен, подстраховывает ScheduledPublishMiddleware: статьи,
+опоздавшие больше чем на SCHEDULED_PUBLISH_FALLBACK_DELAY секунд, публикует
+запрос к сайту — не чаще раза в SCHEDULED_PUBLISH_INTERVAL на весь сайт.
+"""
+import logging
+import time
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from taggit.models import TaggedItem
+
+from core.cache import SCOPE_POSTS, bump_generation
+from core.tasks import enqueue
+
+from .author_stats import refresh_author_stats
+from .models import Post
+from .related import refresh_related_posts
+from .signals import purge_post_pages
+from .sitemaps import mark_shards
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_LOCK_KEY = 'scheduler:fallback'
+
+# Время последней проверки в этом процессе (time.monotonic)
+_fallback_checked_at = None
+
+
+def posts_published(rows):
+    """Инвалидация после публикации пачки: rows — [(pk, slug, category_id, author_id)]"""
+    post_ids = [pk for pk, _, _, _ in rows]
+    category_ids = {category_id for _, _, category_id, _ in rows if category_id}
+    author_ids = {author_id for _, _, _, author_id in rows if author_id}
+    bump_generation(
+        SCOPE_POSTS,
+        *[f'post:{pk}' for pk in post_ids],
+        *[f'category:{pk}' for pk in category_ids],
+    )
+    tag_ids = TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Post), object_id__in=post_ids
+    ).values_list('tag_id', flat=True).distinct()
+    mark_shards(posts=post_ids, categories=category_ids, authors=author_ids, tags=list(tag_ids))
+    purge_post_pages(
+        post_ids, slugs=[slug for _, slug, _, _ in rows],
+        category_ids=category_ids, author_ids=author_ids,
+    )
+    refresh_author_stats(author_ids)
+    for post_id in post_ids:
+        enqueue(refresh_related_posts, post_id)
+
+
+def publish_due_posts(now=None, batch_size=None):
+    """Публикует запланированные статьи, срок которых наступил, возвращает их число"""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.SCHEDULED_PUBLISH_BATCH_SIZE
+    published = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Post.objects.due(now).order_by('published_at')
+                .select_for_update(skip_locked=True)
+                .values_list('pk', 'slug', 'category_id', 'author_id')[:batch_size]
+            )
+            if not rows:
+                break
+            # updated_at — метка лент (blog.feeds): их ETag меняется вместе с составом
+            Post.objects.filter(pk__in=[pk for pk, _, _, _ in rows]).update(
+                status=Post.STATUS_PUBLISHED, updated_at=now
+            )
+            transaction.on_commit(partial(posts_published, rows))
+        published += len(rows)
+        if len(rows) < batch_size:
+            break
+    return published
+
+
+def next_due_at():
+    """Дата ближайшей запланированной публикации или None"""
+    return (
+        Post.objects.filter(status=Post.STATUS_SCHEDULED, published_at__isnull=False)
+        .order_by('published_at')
+        .values_list('published_at', flat=True).first()
+    )
+
+
+def publish_overdue_posts():
+    """Публикует статьи, которые воркер не опубликовал вовремя, возвращает их число"""
+    global _fallback_checked_at
+    delay = settings.SCHEDULED_PUBLISH_FALLBACK_DELAY
+    if delay is None:
+        return 0
+    # Сначала проверка в памяти процесса: обычный запрос не ходит ни в кэш, ни в БД
+    checked_at = time.monotonic()
+    interval = settings.SCHEDULED_PUBLISH_INTERVAL
+    if _fallback_checked_at is not None and checked_at - _fallback_checked_at < interval:
+        return 0
+    _fallback_checked_at = checked_at
+    if not cache.add(FALLBACK_LOCK_KEY, 1, interval):
+        return 0
+    now = timezone.now()
+    due = next_due_at()
+    if due is None or now - due < timedelta(seconds=delay):
+        return 0
+    published = publish_due_posts(now)
+    logger.warning('Воркер отложенной публикации отстаёт: запрос опубликовал статей: %s', published)
+    return published
+
+
+class ScheduledPublishMiddleware:
+    """Подстраховка отложенной публикации на случай остановленного воркера"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            publish_overdue_posts()
+        except Exception:
+            # Страница важнее: статьи опубликует следующий запрос или воркер
+            logger.exception('Не удалось опубликовать запланированные статьи')
+        return self.get_response(request)
@@ -0,0 +1,237 @@
+"""Полнотекстовый поиск по переводам статей.
+
+Ищем по title / excerpt / content перевода на текущем языке parler с
+ранжированием (title важнее excerpt, excerpt важнее content).
+
+* PostgreSQL: колонка ``search_vector`` (tsvector) у перевода, GIN-индекс,
+  конфигурация словаря по языку из SEARCH_CONFIGS. Вектор пересчитывается
+  при сохранении перевода (см. blog.signals).
+* Остальные БД (SQLite в тестах): инвертированный индекс в памяти процесса
+  с ранжированием BM25. Пересобирается, когда меняется поколение ``posts``
+  кэша фрагментов, т.е. после сохранения опубликованной статьи.
+
+Результаты листаются курсором по (rank, id) — без OFFSET и COUNT(*).
+"""
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, TextField, Value
+from django.db.models.functions import Cast
+
+from core.cache import SCOPE_POSTS, get_generations
+
+from .models import Post
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+
+PostTranslation = Post._parler_meta.root_model
+
+DEFAULT_CONFIG = 'simple'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+TAG_RE = re.compile(r'<[^>]+>')
+# Курсор поиска — (rank, id), а не ключ списков: своя соль, чтобы их нельзя было перепутать
+CURSOR_SALT = 'blog.search'
+
+
+def _strip_tags(expression):
+    return Func(
+        expression, Value('<[^>]+>'), Value(' '), Value('g'),
+        function='regexp_replace', output_field=TextField(),
+    )
+
+
+def build_search_vector(config):
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('excerpt', weight='B', config=config)
+        + SearchVector(_strip_tags(F('content')), weight='C', config=config)
+    )
+
+
+def update_search_vector(translation):
+    """Пересчитывает tsvector перевода (только PostgreSQL)"""
+    if connection.vendor != 'postgresql':
+        return
+    config = settings.SEARCH_CONFIGS.get(translation.language_code, DEFAULT_CONFIG)
+    PostTranslation.objects.filter(pk=translation.pk).update(
+        search_vector=build_search_vector(config)
+    )
+
+
+def _published_translations(language):
+    return PostTranslation.objects.filter(
+        language_code=language,
+        master__status=Post.STATUS_PUBLISHED,
+    )
+
+
+class PostgresSearchBackend:
+    """tsvector + GIN, ранжирование ts_rank"""
+
+    def search(self, query, language, after=None, limit=None):
+        config = settings.SEARCH_CONFIGS.get(language, DEFAULT_CONFIG)
+        search_query = SearchQuery(query, config=config, search_type='websearch')
+        hits = (
+            _published_translations(language)
+            .filter(search_vector=search_query)
+            # ts_rank возвращает real (float4), а значение из курсора приходит как
+            # double precision: без приведения равенство по рангу не совпадёт
+            # никогда, и статьи с одинаковым рангом на границе страниц пропадут
+            .annotate(rank=Cast(SearchRank(F('search_vector'), search_query), FloatField()))
+        )
+        if after is not None:
+            rank, post_id = after
+            hits = hits.filter(Q(rank__lt=rank) | Q(rank=rank, master_id__lt=post_id))
+        hits = hits.order_by('-rank', '-master_id').values_list('rank', 'master_id')
+        return list(hits[:limit] if limit else hits)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(TAG_RE.sub(' ', text or '').lower())
+
+
+class InvertedIndex:
+    """Инвертированный индекс с ранжированием BM25 и весами полей"""
+
+    K1 = 1.2
+    B = 0.75
+    FIELD_WEIGHTS = {'title': 3.0, 'excerpt': 2.0, 'content': 1.0}
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        self.average_length = 0
+
+    def add(self, post_id, **fields):
+        frequencies = Counter()
+        length = 0
+        for name, text in fields.items():
+            tokens = tokenize(text)
+            length += len(tokens)
+            for token in tokens:
+                frequencies[token] += self.FIELD_WEIGHTS[name]
+        self.lengths[post_id] = length
+        for token, frequency in frequencies.items():
+            self.postings[token][post_id] = frequency
+
+    def finalize(self):
+        if self.lengths:
+            self.average_length = sum(self.lengths.values()) / len(self.lengths)
+        return self
+
+    def search(self, query):
+        """Список (score, post_id) по убыванию; в документе должны быть все слова запроса"""
+        terms = set(tokenize(query))
+        postings = [self.postings.get(term) for term in terms]
+        if not postings or not all(postings):
+            return []
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+
+        total = len(self.lengths)
+        average = self.average_length or 1
+        idf = [
+            math.log(1 + (total - len(posting) + 0.5) / (len(posting) + 0.5))
+            for posting in postings
+        ]
+        results = []
+        for post_id in candidates:
+            norm = self.K1 * (1 - self.B + self.B * self.lengths[post_id] / average)
+            score = sum(
+                weight * posting[post_id] * (self.K1 + 1) / (posting[post_id] + norm)
+                for weight, posting in zip(idf, postings)
+            )
+            results.append((round(score, 6), post_id))
+        results.sort(reverse=True)
+        return results
+
+
+class InvertedIndexSearchBackend:
+    """Запасной поиск без PostgreSQL: индекс в памяти процесса"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def build(self, language):
+        index = InvertedIndex()
+        rows = _published_translations(language).values_list(
+            'master_id', 'title', 'excerpt', 'content'
+        )
+        for post_id, title, excerpt, content in rows.iterator(chunk_size=2000):
+            index.add(post_id, title=title, excerpt=excerpt, content=content)
+        return index.finalize()
+
+    def get_index(self, language):
+        generation = get_generations([SCOPE_POSTS])[SCOPE_POSTS]
+        with self._lock:
+            cached = self._indexes.get(language)
+            if cached is None or cached[0] != generation:
+                cached = (generation, self.build(language))
+                self._indexes[language] = cached
+        return cached[1]
+
+    def search(self, query, language, after=None, limit=None):
+        hits = self.get_index(language).search(query)
+        if after is not None:
+            after = tuple(after)
+            hits = [hit for hit in hits if hit < after]
+        return hits[:limit] if limit else hits
+
+
+_fallback_backend = InvertedIndexSearchBackend()
+
+
+def get_search_backend():
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return _fallback_backend
+
+
+class SearchPage:
+    """Страница результатов поиска"""
+
+    def __init__(self, posts, next_cursor=None):
+        self.object_list = posts
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def search_posts(query, language, cursor=None, per_page=None):
+    per_page = per_page or settings.PAGINATE_BY
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, salt=CURSOR_SALT)
+        except InvalidCursor:
+            after = None
+        if not (
+            isinstance(after, list) and len(after) == 2
+            and isinstance(after[0], (int, float)) and isinstance(after[1], int)
+        ):
+            after = None
+
+    hits = get_search_backend().search(query, language, after=after, limit=per_page + 1)
+    has_next = len(hits) > per_page
+    hits = hits[:per_page]
+
+    posts = (
+        Post.objects.select_related('author')
+        .with_translations(language)
+        .in_bulk([post_id for _, post_id in hits])
+    )
+    next_cursor = encode_cursor(hits[-1], salt=CURSOR_SALT) if has_next else None
+    return SearchPage([posts[post_id] for _, post_id in hits if post_id in posts], next_cursor)
@@ -0,0 +1,28 @@
+"""Данные сайдбара блога.
+
+Возвращаются ленивые QuerySet'ы: сайдбар рендерится внутри кэша фрагментов,
+и при попадании в кэш запросы к БД не выполняются вовсе.
+"""
+from django.db.models import Count, Q
+
+from .models import Category, Post
+
+POPULAR_POSTS_COUNT = 4
+SIDEBAR_TAGS_COUNT = 15
+
+
+def get_sidebar_context():
+    published = Q(posts__status=Post.STATUS_PUBLISHED)
+    return {
+        'sidebar_categories': (
+            Category.objects.filter(is_active=True)
+            .annotate(posts_count=Count('posts', filter=published))
+            .with_translations()
+        ),
+        'popular_posts': (
+            Post.objects.published()
+            .order_by('-views_count')
+            .prefetch_translations()[:POPULAR_POSTS_COUNT]
+        ),
+        'sidebar_tags': Post.tags.most_common()[:SIDEBAR_TAGS_COUNT],
+    }
@@ -0,0 +1,357 @@
+from collections import Counter
+from functools import partial
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.urls import reverse
+from taggit.models import Tag, TaggedItem
+
+from core.cache import SCOPE_CATEGORIES, SCOPE_POSTS, bump_generation
+from core.edge import purge_keys
+from core.images import queue_image_variants
+from core.pagecache import purge_paths
+from core.tasks import enqueue
+from core.thumbnails import queue_thumbnails
+
+from .author_stats import refresh_author_stats
+from .comments import change_comments_count
+from .models import Category, Comment, Post, RelatedPost
+from .notifications import fan_out_comments
+from .related import refresh_related_posts
+from .search import update_search_vector
+from .sitemaps import mark_post_shards, mark_shards
+from .translation_cache import invalidate_translations
+
+PostTranslation = Post._parler_meta.root_model
+CategoryTranslation = Category._parler_meta.root_model
+
+
+def _translation_master(translation):
+    """Статья или рубрика перевода; None, если её удалили раньше перевода"""
+    try:
+        return translation.master
+    except ObjectDoesNotExist:
+        return None
+
+
+def _post_scopes(post):
+    """Области кэша, которые затрагивает изменение статьи"""
+    loaded = getattr(post, '_loaded_values', {})
+    scopes = {f'post:{post.pk}'}
+    for category_id in (post.category_id, loaded.get('category_id')):
+        if category_id:
+            scopes.add(f'category:{category_id}')
+    # Черновики не попадают в списки — их правка не трогает главную и сайдбары
+    if Post.STATUS_PUBLISHED in (post.status, loaded.get('status')):
+        scopes.add(SCOPE_POSTS)
+    return scopes
+
+
+def purge_post_pages(post_ids, slugs, category_ids=(), author_ids=(), listings=True):
+    """Сбрасывает кэш страниц статей и, если они в списках, — списков с ними (здесь и на прокси)"""
+    paths = [reverse('blog:post_detail', kwargs={'slug': slug}) for slug in slugs if slug]
+    keys = [f'post-{post_id}' for post_id in post_ids]
+    if listings:
+        category_ids = [pk for pk in category_ids if pk]
+        author_ids = [pk for pk in author_ids if pk]
+        tags = TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Post), object_id__in=post_ids
+        ).values_list('tag_id', 'tag__slug').distinct()
+        category_slugs = Category.objects.filter(pk__in=category_ids).values_list('slug', flat=True)
+        paths += [reverse('core:home'), reverse('blog:post_list')]
+        paths += [reverse('blog:author', kwargs={'pk': pk}) for pk in author_ids]
+        paths += [reverse('blog:category', kwargs={'slug': slug}) for slug in category_slugs]
+        keys += ['home', 'posts', 'sidebar', 'feeds']
+        keys += [f'category-{pk}' for pk in category_ids] + [f'author-{pk}' for pk in author_ids]
+        for tag_id, tag_slug in tags:
+            paths.append(reverse('blog:tag', kwargs={'slug': tag_slug}))
+            keys.append(f'tag-{tag_id}')
+    purge_paths(*paths)
+    purge_keys(*keys)
+
+
+def purge_tag_pages(post_id, post_slug, tag_ids):
+    tag_slugs = Tag.objects.filter(pk__in=tag_ids).values_list('slug', flat=True)
+    purge_paths(
+        reverse('blog:post_detail', kwargs={'slug': post_slug}),
+        *[reverse('blog:tag', kwargs={'slug': slug}) for slug in tag_slugs],
+    )
+    # Облако тегов в сайдбаре и ленты тегов
+    purge_keys(f'post-{post_id}', 'sidebar', 'feeds', *[f'tag-{pk}' for pk in tag_ids])
+
+
+def purge_category_pages(category_id, slug):
+    purge_paths(
+        reverse('core:home'), reverse('blog:post_list'),
+        reverse('blog:category', kwargs={'slug': slug}),
+    )
+    purge_keys(f'category-{category_id}', 'home', 'posts', 'sidebar', 'feeds')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_fragments(sender, instance, **kwargs):
+    bump_generation(*_post_scopes(instance))
+
+
+@receiver(post_save, sender=PostTranslation)
+@receiver(post_delete, sender=PostTranslation)
+def invalidate_post_translation_fragments(sender, instance, **kwargs):
+    # При удалении статьи её области сбрасывает сигнал самой статьи
+    post = _translation_master(instance) if instance.master_id else None
+    if post is not None:
+        bump_generation(*_post_scopes(post))
+
+
+def _referencing_posts(post):
+    """Статьи, которые показывают post в «Похожих статьях»: [(id, slug)]"""
+    loaded = getattr(post, '_loaded_values', {})
+    # Черновик в «Похожих статьях» не показывается
+    if Post.STATUS_PUBLISHED not in (post.status, loaded.get('status')):
+        return []
+    referencing = getattr(post, '_referencing_posts', None)
+    if referencing is None:
+        referencing = list(
+            Post.objects.filter(related_index__related_id=post.pk).values_list('pk', 'slug')
+        )
+    return referencing
+
+
+def purge_referencing_pages(referencing):
+    purge_paths(*[reverse('blog:post_detail', kwargs={'slug': slug}) for _, slug in referencing])
+    purge_keys(*[f'post-{post_id}' for post_id, _ in referencing])
+
+
+@receiver(pre_delete, sender=Post)
+def remember_referencing_posts(sender, instance, **kwargs):
+    # К post_delete строки RelatedPost со ссылкой на статью уже удалены каскадом
+    instance._referencing_posts = _referencing_posts(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=PostTranslation)
+@receiver(post_delete, sender=PostTranslation)
+def invalidate_referencing_posts(sender, instance, raw=False, **kwargs):
+    # Заголовок, ссылка и картинка статьи видны во фрагменте post_related
+    # других статей: их области и страницы сбрасываются вместе с её собственными
+    if raw:
+        return
+    post = instance
+    if sender is PostTranslation:
+        post = _translation_master(instance) if instance.master_id else None
+        if post is None:
+            return
+    referencing = _referencing_posts(post)
+    if referencing:
+        bump_generation(*[f'post:{post_id}' for post_id, _ in referencing])
+        transaction.on_commit(partial(purge_referencing_pages, referencing))
+
+
+@receiver(post_save, sender=PostTranslation)
+def refresh_search_vector(sender, instance, **kwargs):
+    update_search_vector(instance)
+
+
+@receiver(post_save, sender=Post)
+def refresh_related_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    changed = any(
+        loaded.get(field) != getattr(instance, field)
+        for field in ('category_id', 'status')
+    )
+    if created or changed:
+        transaction.on_commit(partial(enqueue, refresh_related_posts, instance.pk))
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_post_images(sender, instance, created, raw=False, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if not raw and (created or loaded.get('image') != instance.image.name):
+        queue_thumbnails(instance, 'image')
+        queue_image_variants(instance, 'image', 'image_variants', scopes=_post_scopes(instance))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_post_tag_fragments(sender, instance, action, **kwargs):
+    # Теги видны в списках и лентах тегов (blog.feeds)
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Post):
+        bump_generation(*_post_scopes(instance))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_related_on_tags(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and isinstance(instance, Post):
+        transaction.on_commit(partial(enqueue, refresh_related_posts, instance.pk))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CategoryTranslation)
+@receiver(post_delete, sender=CategoryTranslation)
+def invalidate_category_fragments(sender, instance, **kwargs):
+    category_id = instance.master_id if sender is CategoryTranslation else instance.pk
+    if category_id:
+        bump_generation(f'category:{category_id}', SCOPE_CATEGORIES)
+
+
+@receiver(post_save, sender=PostTranslation)
+@receiver(post_delete, sender=PostTranslation)
+@receiver(post_save, sender=CategoryTranslation)
+@receiver(post_delete, sender=CategoryTranslation)
+def invalidate_translation_cache(sender, instance, raw=False, **kwargs):
+    # Запись в L2 parler обновляет сам, здесь — L1 остальных процессов
+    if not raw:
+        invalidate_translations()
+
+
+def _post_tag_ids(post_id):
+    return list(TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Post), object_id=post_id
+    ).values_list('tag_id', flat=True))
+
+
+@receiver(pre_delete, sender=Post)
+def remember_post_tags(sender, instance, **kwargs):
+    # К post_delete связи с тегами уже удалены
+    instance._loaded_tag_ids = _post_tag_ids(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def refresh_post_sitemaps(sender, instance, raw=False, created=False, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if raw or Post.STATUS_PUBLISHED not in (instance.status, loaded.get('status')):
+        return
+    category_ids = {instance.category_id, loaded.get('category_id')}
+    author_ids = {instance.author_id, loaded.get('author_id')}
+    # Теги до изменения: форма сохраняет их после статьи, и к коммиту снятый
+    # с неё тег уже не найти, а его шард мог потерять последнюю статью
+    tag_ids = getattr(instance, '_loaded_tag_ids', None)
+    if tag_ids is None:
+        tag_ids = [] if created else _post_tag_ids(instance.pk)
+    transaction.on_commit(partial(mark_post_shards, instance.pk, category_ids, author_ids, tag_ids))
+
+
+@receiver(post_save, sender=PostTranslation)
+@receiver(post_delete, sender=PostTranslation)
+def refresh_post_translation_sitemaps(sender, instance, raw=False, **kwargs):
+    # Набор языков статьи определяет её адреса в шарде
+    if not raw and instance.master_id:
+        transaction.on_commit(partial(mark_shards, posts=[instance.master_id]))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_tag_sitemaps(sender, instance, action, pk_set=None, **kwargs):
+    if not isinstance(instance, Post):
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    if Post.STATUS_PUBLISHED not in (instance.status, loaded.get('status')):
+        return
+    if action == 'pre_clear':
+        # У post_clear нет pk_set: снятые теги запоминаются заранее
+        instance._cleared_tag_ids = _post_tag_ids(instance.pk)
+    elif action == 'post_clear':
+        pk_set = instance.__dict__.pop('_cleared_tag_ids', None)
+    if action in ('post_add', 'post_remove', 'post_clear') and pk_set:
+        transaction.on_commit(partial(mark_shards, tags=list(pk_set)))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CategoryTranslation)
+@receiver(post_delete, sender=CategoryTranslation)
+def refresh_category_sitemaps(sender, instance, raw=False, **kwargs):
+    category_id = instance.master_id if sender is CategoryTranslation else instance.pk
+    if not raw and category_id:
+        transaction.on_commit(partial(mark_shards, categories=[category_id]))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_page_cache(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    # Черновик не виден ни на своей странице, ни в списках
+    listed = Post.STATUS_PUBLISHED in (instance.status, loaded.get('status'))
+    transaction.on_commit(partial(
+        purge_post_pages, [instance.pk],
+        slugs={instance.slug, loaded.get('slug')},
+        category_ids={instance.category_id, loaded.get('category_id')},
+        author_ids={instance.author_id, loaded.get('author_id')},
+        listings=listed,
+    ))
+
+
+@receiver(post_save, sender=PostTranslation)
+@receiver(post_delete, sender=PostTranslation)
+def purge_post_translation_page_cache(sender, instance, raw=False, **kwargs):
+    post = _translation_master(instance) if not raw and instance.master_id else None
+    if post is None:
+        return
+    transaction.on_commit(partial(
+        purge_post_pages, [post.pk], slugs=[post.slug],
+        category_ids=[post.category_id], author_ids=[post.author_id],
+        listings=post.status == Post.STATUS_PUBLISHED,
+    ))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def purge_tag_page_cache(sender, instance, action, pk_set=None, **kwargs):
+    if action in ('post_add', 'post_remove') and isinstance(instance, Post) and pk_set:
+        if instance.status == Post.STATUS_PUBLISHED:
+            transaction.on_commit(partial(purge_tag_pages, instance.pk, instance.slug, list(pk_set)))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=CategoryTranslation)
+@receiver(post_delete, sender=CategoryTranslation)
+def purge_category_page_cache(sender, instance, raw=False, **kwargs):
+    if raw or (sender is CategoryTranslation and not instance.master_id):
+        return
+    category = _translation_master(instance) if sender is CategoryTranslation else instance
+    if category is None:
+        return
+    transaction.on_commit(partial(purge_category_pages, category.pk, category.slug))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def refresh_author_stats_on_save(sender, instance, raw=False, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    # Черновики в показатели автора не входят
+    if raw or Post.STATUS_PUBLISHED not in (instance.status, loaded.get('status')):
+        return
+    author_ids = {instance.author_id, loaded.get('author_id')}
+    transaction.on_commit(partial(refresh_author_stats, author_ids))
+
+
+@receiver(post_save, sender=Comment)
+def update_comments_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', {})
+    deltas = Counter()
+    if loaded.get('is_approved'):
+        deltas[loaded['post_id']] -= 1
+    if instance.is_approved:
+        deltas[instance.post_id] += 1
+        if not loaded.get('is_approved'):
+            # Комментарий стал виден — уведомления рассылает фоновая задача
+            transaction.on_commit(partial(enqueue, fan_out_comments, [instance.pk]))
+    change_comments_count(deltas)
+    # Следующее сохранение того же экземпляра сравнивается с этим
+    instance._loaded_values = {'post_id': instance.post_id, 'is_approved': instance.is_approved}
+
+
+@receiver(post_delete, sender=Comment)
+def update_comments_count_on_delete(sender, instance, **kwargs):
+    if instance.is_approved:
+        change_comments_count({instance.post_id: -1})
@@ -0,0 +1,320 @@
+"""Sitemap: заранее собранные gzip-файлы.
+
+Разделы — опубликованные статьи, активные рубрики, теги опубликованных
+статей и их авторы. Каждый раздел делится на файлы (шарды) по диапазонам
+pk: в шарде ``SITEMAP_SHARD_SIZE`` адресов, у каждого объекта по адресу на
+язык (``?lang=en``, core.middleware) с альтернативами hreflang. Статья или
+рубрика попадает в языки, на которые она переведена.
+
+Файлы ``<раздел>-<номер>.xml.gz`` и индекс ``sitemap.xml.gz`` лежат в
+SITEMAP_ROOT и отдаются представлениями core.views как есть — без ORM и
+шаблонов.
+
+* Команда ``build_sitemaps`` собирает всё заново и удаляет лишние шарды.
+* Изменение статьи (blog.signals) после коммита помечает затронутые шарды
+  её раздела, рубрики, автора и тегов; фоновая задача пересобирает только
+  их и индекс.
+
+После записи файлов кэш прокси сбрасывается по ключу ``sitemaps`` (core.edge).
+"""
+import gzip
+import os
+import re
+import tempfile
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sites.models import Site
+from django.db.models import Max, Q
+from django.urls import reverse
+from taggit.models import Tag, TaggedItem
+
+from core.cache import add_to_set, pop_set
+from core.edge import purge_keys
+from core.middleware import language_url
+from core.tasks import enqueue
+
+from .models import Category, Post
+
+INDEX_FILE = 'sitemap.xml.gz'
+SHARD_FILE = '{}-{}.xml.gz'
+SHARD_FILE_RE = re.compile(r'^(?P<section>[a-z]+)-(?P<index>\d+)\.xml\.gz$')
+PENDING_KEY = 'sitemaps:pending'
+GZIP_LEVEL = 6
+
+URLSET_OPEN = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+    'xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
+)
+
+
+def _languages():
+    return [code for code, _ in settings.LANGUAGES]
+
+
+def items_per_shard():
+    # У объекта по адресу на каждый язык, лимит протокола — на адреса
+    return max(1, settings.SITEMAP_SHARD_SIZE // len(settings.LANGUAGES))
+
+
+def shard_of(pk):
+    return (pk - 1) // items_per_shard()
+
+
+def _published_posts():
+    return Post.objects.published()
+
+
+def _published_related():
+    return Q(posts__status=Post.STATUS_PUBLISHED)
+
+
+class Section:
+    """Раздел sitemap: объекты с pk в диапазоне шарда"""
+
+    name = None
+    translated = False
+
+    def queryset(self):
+        raise NotImplementedError
+
+    def entries(self, start, stop):
+        """[(pk, путь, lastmod)] для pk из [start, stop)"""
+        raise NotImplementedError
+
+    def languages(self, pks):
+        """{pk: языки перевода}; None — объект доступен на всех языках"""
+        return None
+
+    def last_shard(self):
+        max_pk = self.queryset().aggregate(max_pk=Max('pk'))['max_pk']
+        return None if max_pk is None else shard_of(max_pk)
+
+    def _translated_languages(self, model, pks):
+        translations = model._parler_meta.root_model.objects.filter(
+            master_id__in=pks, language_code__in=_languages()
+        )
+        languages = {}
+        for master_id, language_code in translations.values_list('master_id', 'language_code'):
+            languages.setdefault(master_id, set()).add(language_code)
+        return languages
+
+
+class PostSection(Section):
+    name = 'posts'
+    translated = True
+
+    def queryset(self):
+        return _published_posts()
+
+    def entries(self, start, stop):
+        rows = (
+            self.queryset().filter(pk__gte=start, pk__lt=stop)
+            .order_by('pk').values_list('pk', 'slug', 'updated_at')
+        )
+        return [
+            (pk, reverse('blog:post_detail', kwargs={'slug': slug}), updated_at)
+            for pk, slug, updated_at in rows
+        ]
+
+    def languages(self, pks):
+        return self._translated_languages(Post, pks)
+
+
+class CategorySection(Section):
+    name = 'categories'
+    translated = True
+
+    def queryset(self):
+        return Category.objects.filter(is_active=True)
+
+    def entries(self, start, stop):
+        rows = (
+            self.queryset().filter(pk__gte=start, pk__lt=stop)
+            .annotate(lastmod=Max('posts__updated_at', filter=_published_related()))
+            .order_by('pk').values_list('pk', 'slug', 'lastmod')
+        )
+        return [
+            (pk, reverse('blog:category', kwargs={'slug': slug}), lastmod)
+            for pk, slug, lastmod in rows
+        ]
+
+    def languages(self, pks):
+        return self._translated_languages(Category, pks)
+
+
+class TagSection(Section):
+    name = 'tags'
+
+    def _tagged(self):
+        return TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Post),
+            object_id__in=_published_posts().values('pk'),
+        )
+
+    def queryset(self):
+        return Tag.objects.filter(pk__in=self._tagged().values('tag_id'))
+
+    def entries(self, start, stop):
+        rows = (
+            self.queryset().filter(pk__gte=start, pk__lt=stop)
+            .order_by('pk').values_list('pk', 'slug')
+        )
+        # У тега нет даты изменения, lastmod не указываем
+        return [(pk, reverse('blog:tag', kwargs={'slug': slug}), None) for pk, slug in rows]
+
+
+class AuthorSection(Section):
+    name = 'authors'
+
+    def queryset(self):
+        return get_user_model().objects.filter(pk__in=_published_posts().values('author_id'))
+
+    def entries(self, start, stop):
+        rows = (
+            self.queryset().filter(pk__gte=start, pk__lt=stop)
+            .annotate(lastmod=Max('posts__updated_at', filter=_published_related()))
+            .order_by('pk').values_list('pk', 'lastmod')
+        )
+        return [(pk, reverse('blog:author', kwargs={'pk': pk}), lastmod) for pk, lastmod in rows]
+
+
+SECTIONS = {section.name: section for section in (
+    PostSection(), CategorySection(), TagSection(), AuthorSection(),
+)}
+
+
+def _base_url():
+    return f'{settings.ACCOUNT_DEFAULT_HTTP_PROTOCOL}://{Site.objects.get_current().domain}'
+
+
+def _write(name, data):
+    """Атомарно записывает gzip-файл: читатель не увидит его недописанным"""
+    os.makedirs(settings.SITEMAP_ROOT, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.SITEMAP_ROOT, suffix='.tmp', delete=False) as temp_file:
+        temp_file.write(gzip.compress(data.encode(), GZIP_LEVEL, mtime=0))
+    os.chmod(temp_file.name, 0o644)
+    os.replace(temp_file.name, os.path.join(settings.SITEMAP_ROOT, name))
+
+
+def render_urlset(entries, available, base_url):
+    languages = _languages()
+    parts = [URLSET_OPEN]
+    for pk, path, lastmod in entries:
+        object_languages = languages
+        if available is not None:
+            object_languages = [code for code in languages if code in available.get(pk, ())]
+        if not object_languages:
+            continue
+        url = base_url + path
+        alternates = ''.join(
+            f'<xhtml:link rel="alternate" hreflang="{code}" href={quoteattr(language_url(url, code))}/>'
+            for code in object_languages
+        )
+        alternates += f'<xhtml:link rel="alternate" hreflang="x-default" href={quoteattr(url)}/>'
+        lastmod = f'<lastmod>{lastmod.date().isoformat()}</lastmod>' if lastmod else ''
+        for code in object_languages:
+            parts.append(f'<url><loc>{escape(language_url(url, code))}</loc>{lastmod}{alternates}</url>\n')
+    parts.append('</urlset>\n')
+    return ''.join(parts), len(parts) > 2
+
+
+def build_shard(section, index, base_url=None):
+    """Пересобирает шард; пустой шард удаляется. Возвращает True, если файл есть"""
+    size = items_per_shard()
+    entries = section.entries(index * size + 1, (index + 1) * size + 1)
+    available = section.languages([pk for pk, _, _ in entries]) if section.translated else None
+    data, has_urls = render_urlset(entries, available, base_url or _base_url())
+    name = SHARD_FILE.format(section.name, index)
+    if has_urls:
+        _write(name, data)
+        return True
+    try:
+        os.remove(os.path.join(settings.SITEMAP_ROOT, name))
+    except FileNotFoundError:
+        pass
+    return False
+
+
+def build_index(base_url=None):
+    """Индекс по файлам шардов на диске, lastmod — время записи шарда"""
+    base_url = base_url or _base_url()
+    shards = []
+    if os.path.isdir(settings.SITEMAP_ROOT):
+        for entry in os.scandir(settings.SITEMAP_ROOT):
+            match = SHARD_FILE_RE.match(entry.name)
+            if match and match['section'] in SECTIONS:
+                shards.append((match['section'], int(match['index']), entry.stat().st_mtime))
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    ]
+    for section, index, mtime in sorted(shards):
+        modified = datetime.fromtimestamp(mtime, tz=dt_timezone.utc)
+        parts.append(
+            f'<sitemap><loc>{escape(base_url)}/sitemaps/{section}-{index}.xml</loc>'
+            f'<lastmod>{modified.isoformat(timespec="seconds")}</lastmod></sitemap>\n'
+        )
+    parts.append('</sitemapindex>\n')
+    _write(INDEX_FILE, ''.join(parts))
+    return len(shards)
+
+
+def build_all():
+    """Собирает все шарды и индекс, удаляет шарды за пределами разделов"""
+    base_url = _base_url()
+    built = set()
+    for section in SECTIONS.values():
+        last_shard = section.last_shard()
+        for index in range(0 if last_shard is None else last_shard + 1):
+            if build_shard(section, index, base_url):
+                built.add(SHARD_FILE.format(section.name, index))
+    if os.path.isdir(settings.SITEMAP_ROOT):
+        for entry in os.scandir(settings.SITEMAP_ROOT):
+            if SHARD_FILE_RE.match(entry.name) and entry.name not in built:
+                os.remove(entry.path)
+    build_index(base_url)
+    purge_keys('sitemaps')
+    return len(built)
+
+
+def mark_shards(**pks_by_section):
+    """Помечает шарды объектов к пересборке и ставит задачу: mark_shards(posts=[1], tags=[5])"""
+    members = {
+        f'{section_name}:{shard_of(pk)}'
+        for section_name, pks in pks_by_section.items() for pk in pks if pk
+    }
+    if members:
+        add_to_set(PENDING_KEY, *members)
+        enqueue(build_pending_shards)
+
+
+def mark_post_shards(post_id, category_ids=(), author_ids=(), tag_ids=()):
+    """Шарды, которые затрагивает изменение статьи: её, рубрик, авторов и тегов.
+
+    tag_ids — теги статьи до изменения, к ним добавляются текущие.
+    """
+    tag_ids = set(tag_ids)
+    tag_ids.update(TaggedItem.objects.filter(
+        content_type=ContentType.objects.get_for_model(Post), object_id=post_id
+    ).values_list('tag_id', flat=True))
+    mark_shards(posts=[post_id], categories=category_ids, authors=author_ids, tags=tag_ids)
+
+
+def build_pending_shards():
+    """Фоновая задача: пересобирает помеченные шарды и индекс"""
+    pending = pop_set(PENDING_KEY)
+    if not pending:
+        return 0
+    base_url = _base_url()
+    for member in sorted(pending):
+        section_name, index = member.split(':')
+        build_shard(SECTIONS[section_name], int(index), base_url)
+    build_index(base_url)
+    purge_keys('sitemaps')
+    return len(pending)
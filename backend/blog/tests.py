@@ -0,0 +1,1056 @@
+import gzip
+import os
+import random
+import re
+import smtplib
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import escape
+from parler import appsettings
+from parler.cache import get_translation_cache_key
+from parler.utils.conf import add_default_language_settings
+from redis.exceptions import ResponseError
+
+from accounts.models import Bookmark, User
+from core.cache import (
+    bump_generation,
+    get_generations,
+    get_queue_cache,
+    pop_set,
+    scope_for,
+    set_members,
+)
+from core.tests import create_archive, record_tasks
+
+from . import notifications, scheduler, sitemaps
+from .author_stats import add_author_views, refresh_author_stats
+from .comments import get_comments_page, reconcile_comments_count, set_approved
+from .counters import LocalViewBuffer, RedisViewBuffer
+from .models import AuthorStats, Category, Comment, Post, RelatedPost, ViewCountFlush
+from .notifications import fan_out_comments, send_due_notifications
+from .pagination import encode_cursor
+from .related import refresh_related_posts
+from .search import search_posts
+from .translation_cache import (
+    TieredTranslationCache,
+    translation_cache,
+    warm_translations,
+)
+
+PostTranslation = Post._parler_meta.root_model
+
+LISTING_SIZE = 50
+
+
+def clear_caches():
+    cache.clear()
+    translation_cache.local.clear()
+
+
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'], PAGINATE_BY=LISTING_SIZE,
+    SCHEDULED_PUBLISH_FALLBACK_DELAY=None,
+)
+class PostListTranslationQueryTests(TestCase):
+    """Список из 50 статей загружает переводы пакетно на любом языке"""
+
+    # Статьи, их переводы, переводы рубрик; рубрики, популярное и теги сайдбара
+    LISTING_QUERIES = 6
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author@example.com', first_name='Автор')
+        create_archive(5, LISTING_SIZE // 5, author)
+
+    def get_listing(self, language):
+        clear_caches()
+        with self.assertNumQueries(self.LISTING_QUERIES):
+            response = self.client.get(reverse('blog:post_list'), {'lang': language})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['posts']), LISTING_SIZE)
+        return response
+
+    def test_russian(self):
+        response = self.get_listing('ru')
+        self.assertContains(response, 'Статья 0-0')
+        self.assertContains(response, 'Рубрика 4')
+
+    def test_english(self):
+        response = self.get_listing('en')
+        self.assertContains(response, 'Post 0-0')
+        self.assertContains(response, 'Category 4')
+
+    def test_fallback_language(self):
+        # Половина статей без перевода на английский: заголовок берётся из запасного
+        # русского, запросов столько же
+        PostTranslation.objects.filter(language_code='en', master__slug__startswith='post-1-').delete()
+        languages = add_default_language_settings({
+            None: ({'code': 'ru'}, {'code': 'en'}),
+            'default': {'fallbacks': ['ru'], 'hide_untranslated': False},
+        })
+        with mock.patch.object(appsettings, 'PARLER_LANGUAGES', languages):
+            response = self.get_listing('en')
+        self.assertContains(response, 'Post 0-0')
+        self.assertContains(response, 'Статья 1-0')
+
+
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'], PAGINATE_BY=2,
+    SCHEDULED_PUBLISH_FALLBACK_DELAY=None,
+)
+class PostListCursorTests(TestCase):
+    """Курсор списка: чужие и испорченные курсоры дают первую страницу, ссылки сохраняют параметры"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_archive(1, 5)
+
+    def get(self, **params):
+        clear_caches()
+        response = self.client.get(reverse('blog:post_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertFirstPage(self, cursor):
+        response = self.get(cursor=cursor)
+        self.assertEqual([post.slug for post in response.context['posts']], ['post-0-0', 'post-0-1'])
+
+    def test_foreign_cursor(self):
+        # Подписанный курсор другой формы — как у поиска, (rank, id)
+        self.assertFirstPage(encode_cursor([0.5, 3]))
+        self.assertFirstPage(encode_cursor(['n', [0.5, 3]]))
+        self.assertFirstPage(encode_cursor(['n', ['вчера', 'x']]))
+        self.assertFirstPage(encode_cursor(['x', [timezone.now(), 1]]))
+        self.assertFirstPage('испорчен')
+
+    def test_next_page_link_keeps_language(self):
+        response = self.get(lang='en')
+        cursor = response.context['posts'].next_cursor
+        query = urlencode({'lang': 'en', 'cursor': cursor})
+        self.assertContains(response, f'href="?{escape(query)}"')
+
+        response = self.get(lang='en', cursor=cursor)
+        self.assertEqual([post.slug for post in response.context['posts']], ['post-0-2', 'post-0-3'])
+        self.assertContains(response, 'Post 0-2')
+
+
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'], SCHEDULED_PUBLISH_FALLBACK_DELAY=None,
+)
+class UnicodeTagTests(TestCase):
+    """Теги на кириллице: слаг taggit юникодный, страница и сброс кэша по нему работают"""
+
+    def test_cyrillic_tag(self):
+        with record_tasks(), self.captureOnCommitCallbacks(execute=True):
+            create_archive(1, 1)
+            post = Post.objects.get()
+            post.tags.add('Неделя моды')
+        tag = post.tags.get()
+        self.assertEqual(tag.slug, 'неделя-моды')
+        clear_caches()
+        response = self.client.get(reverse('blog:tag', kwargs={'slug': tag.slug}))
+        self.assertContains(response, 'Статья 0-0')
+
+
+class SearchPaginationTests(TestCase):
+    """Курсор поиска не теряет статьи с одинаковым рангом на границе страниц"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post_ids = []
+        for index in range(3):
+            post = Post(slug=f'twin-{index}', status=Post.STATUS_PUBLISHED)
+            post.set_current_language('ru')
+            # Одинаковый текст — одинаковый ранг у всех трёх
+            post.title = 'Неделя моды в Милане'
+            post.content = '<p>Показы и гости недели моды</p>'
+            post.save()
+            cls.post_ids.append(post.pk)
+
+    def test_equal_ranks_straddle_pages(self):
+        found, cursor = [], None
+        for _ in range(len(self.post_ids) + 1):
+            page = search_posts('неделя моды', 'ru', cursor=cursor, per_page=1)
+            found += [post.pk for post in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(found, sorted(self.post_ids, reverse=True))
+
+
+class RelatedPostsRefreshTests(TestCase):
+    """Похожие статьи пересчитывает фоновая задача, а не запрос, сохранивший статью"""
+
+    def test_save_and_tags_enqueue_refresh(self):
+        with record_tasks() as recorder, self.captureOnCommitCallbacks(execute=True):
+            post = Post(slug='related', status=Post.STATUS_PUBLISHED)
+            post.set_current_language('ru')
+            post.title = 'Статья'
+            post.save()
+            post.tags.add('milan')
+        self.assertEqual(recorder.calls(refresh_related_posts), [(post.pk,), (post.pk,)])
+
+
+class TranslatedDeleteTests(TestCase):
+    """Удаление статьи и рубрики с переводами: каскад удаляет переводы после них"""
+
+    def setUp(self):
+        create_archive(1, 1)
+        self.post = Post.objects.get()
+        self.category = Category.objects.get()
+
+    def delete(self, obj):
+        scope = scope_for(obj)
+        before = get_generations([scope])[scope]
+        with record_tasks(), self.captureOnCommitCallbacks(execute=True):
+            obj.delete()
+        # Фрагменты сбрасывает сигнал самого объекта
+        self.assertNotEqual(get_generations([scope])[scope], before)
+
+    def test_delete_post(self):
+        self.delete(self.post)
+        self.assertFalse(PostTranslation.objects.exists())
+
+    def test_delete_category(self):
+        self.delete(self.category)
+        self.assertFalse(Category._parler_meta.root_model.objects.exists())
+        self.assertIsNone(Post.objects.get().category_id)
+
+    @override_settings(ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'])
+    def test_deleted_pages_leave_page_cache(self):
+        post_url = reverse('blog:post_detail', kwargs={'slug': self.post.slug})
+        category_url = reverse('blog:category', kwargs={'slug': self.category.slug})
+        for url in (post_url, category_url):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        # Кэш страниц сбрасывают сигналы статьи и рубрики, а не их переводов
+        with record_tasks(), self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+            self.category.delete()
+        for url in (post_url, category_url):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'], SCHEDULED_PUBLISH_FALLBACK_DELAY=None,
+)
+class RelatedFragmentTests(TestCase):
+    """Правка или удаление похожей статьи сбрасывает блок «Похожие статьи» у ссылающихся на неё"""
+
+    def setUp(self):
+        clear_caches()
+        create_archive(1, 2)
+        self.post, self.related = Post.objects.order_by('slug')
+        RelatedPost.objects.create(post=self.post, related=self.related, position=0, score=1)
+        self.url = reverse('blog:post_detail', kwargs={'slug': self.post.slug})
+
+    def change(self, action):
+        scope = scope_for(self.post)
+        before = get_generations([scope])[scope]
+        with record_tasks(), self.captureOnCommitCallbacks(execute=True):
+            action()
+        self.assertNotEqual(get_generations([scope])[scope], before)
+
+    def test_edit_title(self):
+        self.assertContains(self.client.get(self.url), 'Статья 0-1')
+
+        def edit():
+            self.related.set_current_language('ru')
+            self.related.title = 'Новый заголовок'
+            self.related.save_translations()
+
+        self.change(edit)
+        self.assertContains(self.client.get(self.url), 'Новый заголовок')
+
+    def test_unpublish(self):
+        self.assertContains(self.client.get(self.url), 'Статья 0-1')
+
+        def unpublish():
+            self.related.status = Post.STATUS_DRAFT
+            self.related.save()
+
+        self.change(unpublish)
+        self.assertNotContains(self.client.get(self.url), 'Статья 0-1')
+
+    def test_delete(self):
+        self.change(self.related.delete)
+        self.assertNotContains(self.client.get(self.url), 'Статья 0-1')
+
+
+class CommentsCountTests(TestCase):
+    """comments_count равен числу одобренных комментариев после любых изменений"""
+
+    def setUp(self):
+        create_archive(1, 2)
+        self.post, self.other = Post.objects.order_by('slug')
+        self.author = User.objects.create_user('reader@example.com')
+
+    def change(self, func, *args):
+        with record_tasks(), self.captureOnCommitCallbacks(execute=True):
+            return func(*args)
+
+    def comment(self, post=None, approved=True):
+        with record_tasks(), self.captureOnCommitCallbacks(execute=True):
+            return Comment.objects.create(
+                post=post or self.post, author=self.author, content='Текст', is_approved=approved,
+            )
+
+    def assertCounts(self, post_count, other_count=0):
+        counts = dict(Post.objects.values_list('pk', 'comments_count'))
+        self.assertEqual((counts[self.post.pk], counts[self.other.pk]), (post_count, other_count))
+        # Пересчёт с нуля не находит расхождений
+        self.assertEqual(reconcile_comments_count(), 0)
+
+    def test_create_and_delete(self):
+        approved = self.comment()
+        hidden = self.comment(approved=False)
+        self.assertCounts(1)
+        self.change(hidden.delete)
+        self.assertCounts(1)
+        self.change(approved.delete)
+        self.assertCounts(0)
+
+    def test_approve_and_unapprove_on_save(self):
+        comment = self.comment(approved=False)
+        self.assertCounts(0)
+        comment = Comment.objects.get(pk=comment.pk)
+        comment.is_approved = True
+        self.change(comment.save)
+        self.assertCounts(1)
+        comment.save()
+        self.assertCounts(1)
+        comment = Comment.objects.get(pk=comment.pk)
+        comment.is_approved = False
+        self.change(comment.save)
+        self.assertCounts(0)
+
+    def test_move_to_another_post(self):
+        comment = Comment.objects.get(pk=self.comment().pk)
+        comment.post = self.other
+        self.change(comment.save)
+        self.assertCounts(0, 1)
+
+    def test_bulk_approve_and_unapprove(self):
+        for _ in range(3):
+            self.comment(approved=False)
+        self.comment(post=self.other, approved=False)
+        self.assertEqual(self.change(set_approved, Comment.objects.all(), True), 4)
+        self.assertCounts(3, 1)
+        # Уже одобренные не считаются второй раз
+        self.assertEqual(self.change(set_approved, Comment.objects.all(), True), 0)
+        self.assertCounts(3, 1)
+        self.assertEqual(self.change(set_approved, Comment.objects.filter(post=self.post), False), 3)
+        self.assertCounts(0, 1)
+
+    def test_reconcile_fixes_drift(self):
+        self.comment()
+        Post.objects.filter(pk=self.post.pk).update(comments_count=7)
+        self.assertEqual(reconcile_comments_count(), 1)
+        self.assertCounts(1)
+
+
+@override_settings(ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'])
+class CommentsPageTests(TestCase):
+    """Комментарии статьи постранично по курсору (created_at, id)"""
+
+    def setUp(self):
+        create_archive(1, 1)
+        self.post = Post.objects.get()
+        authors = [User.objects.create_user(f'reader{index}@example.com') for index in range(2)]
+        with record_tasks():
+            comments = [
+                Comment.objects.create(
+                    post=self.post, author=authors[index % 2], content=f'Комментарий {index}',
+                    is_approved=index != 3,
+                )
+                for index in range(7)
+            ]
+        # Одинаковое время у соседей — порядок задаёт id
+        created_at = timezone.now() - timedelta(hours=1)
+        for index, comment in enumerate(comments):
+            Comment.objects.filter(pk=comment.pk).update(created_at=created_at + timedelta(minutes=index // 2))
+        self.approved = [comment.pk for comment in comments if comment.is_approved]
+
+    def test_pages(self):
+        found, cursor = [], None
+        while True:
+            with self.assertNumQueries(2):
+                page = get_comments_page(self.post.pk, cursor, per_page=2)
+                ids = [comment.pk for comment in page]
+                # Авторы загружены вместе со страницей
+                [comment.author.email for comment in page]
+            self.assertLessEqual(len(ids), 2)
+            found += ids
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(found, self.approved)
+        previous = get_comments_page(self.post.pk, page.previous_cursor, per_page=2)
+        self.assertEqual([comment.pk for comment in previous], self.approved[-4:-2])
+
+    def test_json(self):
+        response = self.client.get(reverse('blog:comments', kwargs={'slug': self.post.slug}))
+        data = response.json()
+        self.assertEqual([comment['id'] for comment in data['comments']], self.approved)
+        self.assertEqual(data['comments'][0]['author']['name'], 'reader0@example.com')
+        self.assertIsNone(data['next_cursor'])
+
+    def test_unpublished_post(self):
+        Post.objects.update(status=Post.STATUS_DRAFT)
+        response = self.client.get(reverse('blog:comments', kwargs={'slug': self.post.slug}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'], PAGINATE_BY=LISTING_SIZE,
+    SCHEDULED_PUBLISH_FALLBACK_DELAY=None,
+)
+class BookmarkTests(TestCase):
+    """Закладки: только опубликованные статьи, кнопка на страницах рубрики и автора"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('reader@example.com')
+        create_archive(1, 2, author=self.user)
+        self.post, self.draft = Post.objects.order_by('-published_at')
+        Post.objects.filter(pk=self.draft.pk).update(status=Post.STATUS_DRAFT)
+        self.client.force_login(self.user)
+
+    def bookmark(self, post_id):
+        return self.client.post(reverse('accounts:bookmark_add', kwargs={'post_id': post_id}))
+
+    def test_published_post(self):
+        response = self.bookmark(self.post.pk)
+        self.assertEqual(response.json(), {'post': self.post.pk, 'bookmarked': True})
+        self.assertTrue(Bookmark.objects.filter(user=self.user, post=self.post).exists())
+
+    def test_draft_and_missing_post(self):
+        self.assertEqual(self.bookmark(self.draft.pk).status_code, 404)
+        self.assertEqual(self.bookmark(self.draft.pk + 1000).status_code, 404)
+        self.assertFalse(Bookmark.objects.exists())
+
+    def test_listing_buttons(self):
+        button = reverse('accounts:bookmark_add', kwargs={'post_id': self.post.pk})
+        for url in (
+            reverse('blog:category', kwargs={'slug': self.post.category.slug}),
+            reverse('blog:author', kwargs={'pk': self.user.pk}),
+        ):
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), f'data-bookmark-add="{button}"')
+
+
+@override_settings(
+    COMMENT_NOTIFY_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', COMMENT_NOTIFY_WINDOW=900,
+)
+class CommentNotificationTests(TestCase):
+    """Одно письмо на окно, получатели по настройкам, неудачная отправка возвращается в очередь"""
+
+    def setUp(self):
+        get_queue_cache().clear()
+        self.now = 1_000_000.0
+        clock = mock.patch.object(notifications, 'time', mock.Mock(time=lambda: self.now))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+        self.post_author = User.objects.create_user('author@example.com')
+        self.reader = User.objects.create_user('reader@example.com')
+        self.silent = User.objects.create_user('silent@example.com', comments_notify=False)
+        self.writer = User.objects.create_user('writer@example.com')
+        create_archive(1, 1, self.post_author)
+        self.post = Post.objects.get()
+        self.recorded = []
+        self.comment(self.reader, 'Первый')
+        self.comment(self.silent, 'Второй')
+        self.flush_fan_out()
+        get_queue_cache().clear()
+
+    def comment(self, author, content):
+        with record_tasks() as recorder, self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=self.post, author=author, content=content)
+        self.recorded += recorder.calls(fan_out_comments)
+
+    def flush_fan_out(self):
+        recorded, self.recorded = self.recorded, []
+        for (comment_ids,) in recorded:
+            fan_out_comments(comment_ids)
+
+    def test_one_email_per_window(self):
+        self.comment(self.writer, 'Новый комментарий')
+        self.flush_fan_out()
+        self.now += 60
+        self.comment(self.writer, 'Ещё один')
+        self.flush_fan_out()
+
+        # Окно ещё открыто
+        self.assertEqual(send_due_notifications().recipients, 0)
+        self.assertEqual(mail.outbox, [])
+
+        self.now += 900
+        stats = send_due_notifications()
+        self.assertEqual((stats.recipients, stats.comments, stats.failed), (2, 4, 0))
+        self.assertEqual(stats.max_lag, 960)
+        # Автор комментариев и отказавшиеся от уведомлений писем не получают
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [
+            'author@example.com', 'reader@example.com',
+        ])
+        for message in mail.outbox:
+            self.assertIn('Новый комментарий', message.body)
+            self.assertIn('Ещё один', message.body)
+        self.assertEqual(notifications.queue_stats(), (0, 0.0))
+
+    def test_failed_send_is_requeued(self):
+        self.comment(self.writer, 'Новый комментарий')
+        self.flush_fan_out()
+        self.now += 900
+        with mock.patch.object(
+            locmem.EmailBackend, 'send_messages', side_effect=smtplib.SMTPException('down'),
+        ), self.assertLogs('blog.notifications', 'WARNING'):
+            stats = send_due_notifications()
+        self.assertEqual((stats.recipients, stats.failed), (0, 2))
+        self.assertEqual(mail.outbox, [])
+
+        # Окно прежнее: следующий проход отправляет сразу
+        self.now += 60
+        self.assertEqual(notifications.queue_stats(), (2, 960))
+        stats = send_due_notifications()
+        self.assertEqual((stats.recipients, stats.comments, stats.failed), (2, 2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_queue_stats(self):
+        self.assertEqual(notifications.queue_stats(), (0, 0.0))
+        self.comment(self.writer, 'Новый комментарий')
+        self.flush_fan_out()
+        self.now += 30
+        self.comment(self.reader, 'Ответ')
+        self.flush_fan_out()
+        self.now += 30
+        # Получатели: автор статьи, читатель и автор первого комментария; задержка — от первого события
+        self.assertEqual(notifications.queue_stats(), (3, 60))
+
+
+@override_settings(ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'])
+class ScheduledPublishFallbackTests(TestCase):
+    """Без воркера просроченные запланированные статьи публикует запрос к сайту"""
+
+    def setUp(self):
+        clear_caches()
+        scheduler._fallback_checked_at = None
+        self.post = Post(slug='scheduled', status=Post.STATUS_PUBLISHED, published_at=timezone.now() + timedelta(hours=1))
+        self.post.set_current_language('ru')
+        self.post.title = 'Запланированная статья'
+        self.post.save()
+        self.assertEqual(self.post.status, Post.STATUS_SCHEDULED)
+
+    def make_due(self, seconds_ago):
+        Post.objects.filter(pk=self.post.pk).update(published_at=timezone.now() - timedelta(seconds=seconds_ago))
+
+    def test_overdue_post_is_published(self):
+        self.make_due(settings.SCHEDULED_PUBLISH_FALLBACK_DELAY + 60)
+        self.client.get(reverse('blog:post_list'))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.status, Post.STATUS_PUBLISHED)
+
+    def test_worker_has_time_to_publish(self):
+        self.make_due(1)
+        self.client.get(reverse('blog:post_list'))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.status, Post.STATUS_SCHEDULED)
+
+
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'], SCHEDULED_PUBLISH_FALLBACK_DELAY=None,
+)
+class PublishDuePostsTests(TestCase):
+    """Воркер публикует наступившие статьи пачками и после коммита сбрасывает кэши"""
+
+    def setUp(self):
+        clear_caches()
+        pop_set(sitemaps.PENDING_KEY)
+        sitemap_root = tempfile.TemporaryDirectory()
+        self.addCleanup(sitemap_root.cleanup)
+        settings_override = override_settings(SITEMAP_ROOT=sitemap_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.author = User.objects.create_user('author@example.com')
+        with record_tasks():
+            create_archive(1, 1, author=self.author)
+        refresh_author_stats([self.author.pk])
+        self.category = Category.objects.get()
+
+    def schedule(self, count):
+        posts = []
+        with record_tasks():
+            for number in range(count):
+                post = Post(
+                    slug=f'scheduled-{number}', author=self.author, category=self.category,
+                    status=Post.STATUS_PUBLISHED, published_at=timezone.now() + timedelta(hours=1),
+                )
+                post.set_current_language('ru')
+                post.title = f'Запланированная статья {number}'
+                post.save()
+                posts.append(post)
+        Post.objects.filter(status=Post.STATUS_SCHEDULED).update(published_at=timezone.now() - timedelta(minutes=1))
+        return posts
+
+    def publish(self, **kwargs):
+        with record_tasks() as recorder, self.captureOnCommitCallbacks(execute=True):
+            published = scheduler.publish_due_posts(**kwargs)
+        return published, recorder
+
+    def test_cached_pages_and_sitemap_show_post(self):
+        post, = self.schedule(1)
+        urls = [
+            reverse('blog:post_list'),
+            reverse('blog:category', kwargs={'slug': self.category.slug}),
+            reverse('blog:author', kwargs={'pk': self.author.pk}),
+        ]
+        for url in urls:
+            self.assertNotContains(self.client.get(url), post.title)
+        with record_tasks():
+            sitemaps.build_all()
+
+        published, recorder = self.publish()
+        self.assertEqual(published, 1)
+        for url in urls:
+            response = self.client.get(url)
+            self.assertEqual(response['X-Page-Cache'], 'miss')
+            self.assertContains(response, post.title)
+        self.assertEqual(AuthorStats.objects.get(pk=self.author.pk).posts_count, 2)
+        self.assertEqual(recorder.calls(refresh_related_posts), [(post.pk,)])
+
+        self.assertIn(f'posts:{sitemaps.shard_of(post.pk)}', set_members(sitemaps.PENDING_KEY))
+        recorder.run(sitemaps.build_pending_shards)
+        shard = sitemaps.SHARD_FILE.format('posts', sitemaps.shard_of(post.pk))
+        with gzip.open(os.path.join(settings.SITEMAP_ROOT, shard), 'rt') as sitemap_file:
+            self.assertIn(reverse('blog:post_detail', kwargs={'slug': post.slug}), sitemap_file.read())
+
+    def test_batches(self):
+        posts = self.schedule(5)
+        with mock.patch.object(scheduler, 'posts_published') as posts_published:
+            published, _ = self.publish(batch_size=2)
+        self.assertEqual(published, 5)
+        batches = [call.args[0] for call in posts_published.call_args_list]
+        self.assertEqual([len(rows) for rows in batches], [2, 2, 1])
+        self.assertEqual(sorted(pk for rows in batches for pk, _, _, _ in rows), [post.pk for post in posts])
+        self.assertFalse(Post.objects.filter(status=Post.STATUS_SCHEDULED).exists())
+        self.assertEqual(self.publish(batch_size=2)[0], 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Планы запросов проверяются на PostgreSQL')
+class QueryPlanTests(TestCase):
+    """Горячие запросы на заполненных таблицах после ANALYZE идут по своим индексам"""
+
+    POSTS = 5000
+    USERS = 50
+    CATEGORIES = 10
+    BOOKMARKS_PER_USER = 100
+    # Статья и читатель, на которых проверяются комментарии и закладки: на паре
+    # строк планировщику дешевле отсортировать, чем идти по составному индексу
+    HOT_POST_COMMENTS = 1000
+    HOT_USER_BOOKMARKS = 2000
+    PAGE_SIZE = 20
+
+    @classmethod
+    def setUpTestData(cls):
+        rnd = random.Random(42)
+        now = timezone.now()
+        users = User.objects.bulk_create([User(email=f'user{index}@example.com') for index in range(cls.USERS)])
+        categories = Category.objects.bulk_create([
+            Category(slug=f'category-{index}', order=index) for index in range(cls.CATEGORIES)
+        ])
+        statuses = [Post.STATUS_PUBLISHED] * 18 + [Post.STATUS_DRAFT, Post.STATUS_SCHEDULED]
+        posts = Post.objects.bulk_create([
+            Post(
+                slug=f'post-{index}',
+                author=rnd.choice(users),
+                category=rnd.choice(categories),
+                status=rnd.choice(statuses),
+                is_featured=rnd.random() < 0.02,
+                published_at=now - timedelta(minutes=index),
+            )
+            for index in range(cls.POSTS)
+        ])
+        PostTranslation.objects.bulk_create([
+            PostTranslation(master=post, language_code=code, title=post.slug, content='')
+            for post in posts for code, _ in settings.LANGUAGES
+        ])
+        cls.post = next(post for post in posts if post.status == Post.STATUS_PUBLISHED)
+        cls.user = users[0]
+        Comment.objects.bulk_create([
+            Comment(post=post, author=rnd.choice(users), content='Текст', is_approved=rnd.random() < 0.9)
+            for post in posts
+            for _ in range(cls.HOT_POST_COMMENTS if post == cls.post else 3)
+        ])
+        Bookmark.objects.bulk_create([
+            Bookmark(user=user, post=post)
+            for user in users
+            for post in rnd.sample(posts, cls.HOT_USER_BOOKMARKS if user == cls.user else cls.BOOKMARKS_PER_USER)
+        ])
+        with connection.cursor() as cursor:
+            for model in (User, Category, Post, PostTranslation, Comment, Bookmark):
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = queryset.explain()
+        self.assertNotRegex(plan, r'Seq Scan on', plan)
+        # Порядок ленты должен давать индекс, а не сортировка
+        self.assertNotRegex(plan, r'\bSort\b', plan)
+        if index is not None:
+            self.assertRegex(plan, rf'\b{re.escape(index)}\b', plan)
+
+    def published(self):
+        return Post.objects.published().order_by('-published_at', '-id').values('pk')
+
+    def test_feed(self):
+        self.assertUsesIndex(self.published()[:self.PAGE_SIZE], 'blog_post_published_idx')
+
+    def test_category_feed(self):
+        queryset = self.published().filter(category_id=self.post.category_id)[:self.PAGE_SIZE]
+        self.assertUsesIndex(queryset, 'blog_post_category_pub_idx')
+
+    def test_author_feed(self):
+        queryset = self.published().filter(author_id=self.post.author_id)[:self.PAGE_SIZE]
+        self.assertUsesIndex(queryset, 'blog_post_author_pub_idx')
+
+    def test_featured(self):
+        self.assertUsesIndex(self.published().filter(is_featured=True)[:self.PAGE_SIZE], 'blog_post_featured_idx')
+
+    def test_due_scheduled_posts(self):
+        queryset = Post.objects.due().order_by('published_at').values('pk')[:settings.SCHEDULED_PUBLISH_BATCH_SIZE]
+        self.assertUsesIndex(queryset, 'blog_post_scheduled_idx')
+
+    def test_translations(self):
+        # Покрывается уникальным индексом parler (language_code, master)
+        queryset = PostTranslation.objects.filter(
+            master_id__in=[self.post.pk], language_code__in=[code for code, _ in settings.LANGUAGES]
+        )
+        self.assertUsesIndex(queryset)
+
+    def test_post_comments(self):
+        queryset = (
+            Comment.objects.approved().filter(post_id=self.post.pk)
+            .order_by('created_at', 'id').values('pk')[:30]
+        )
+        self.assertUsesIndex(queryset, 'blog_comment_post_feed_idx')
+
+    def test_bookmarks(self):
+        queryset = (
+            Bookmark.objects.filter(user_id=self.user.pk)
+            .order_by('-created_at', '-id').values('pk')[:self.PAGE_SIZE]
+        )
+        self.assertUsesIndex(queryset, 'accounts_bookmark_feed_idx')
+
+
+class FakeHashRedis:
+    """Команды Redis, которыми пользуется RedisViewBuffer, поверх словаря"""
+
+    def __init__(self):
+        self.data = {}
+
+    def hincrby(self, key, field, amount):
+        field = str(field).encode()
+        hash_ = self.data.setdefault(key, {})
+        hash_[field] = str(int(hash_.get(field, 0)) + amount).encode()
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def rename(self, source, destination):
+        if source not in self.data:
+            raise ResponseError('no such key')
+        self.data[destination] = self.data.pop(source)
+
+    def hsetnx(self, key, field, value):
+        self.data.setdefault(key, {}).setdefault(field.encode(), value.encode())
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class ViewCounterTests(TestCase):
+    """Отложенный счётчик просмотров: сброс в БД и защита от повторного применения пачки"""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_archive(1, 2)
+        cls.first, cls.second = Post.objects.order_by('slug')
+
+    def views(self):
+        return dict(Post.objects.values_list('slug', 'views_count'))
+
+    def record(self, buffer):
+        for post in (self.first, self.first, self.first, self.second):
+            buffer.record(post.pk)
+
+    def test_local_buffer(self):
+        buffer = LocalViewBuffer(interval=3600)
+        self.record(buffer)
+        self.assertEqual(self.views(), {'post-0-0': 0, 'post-0-1': 0})
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(self.views(), {'post-0-0': 3, 'post-0-1': 1})
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_redis_buffer(self):
+        buffer = RedisViewBuffer(FakeHashRedis())
+        self.record(buffer)
+        self.assertEqual(buffer.flush(), 4)
+        self.assertEqual(self.views(), {'post-0-0': 3, 'post-0-1': 1})
+        self.assertEqual(ViewCountFlush.objects.get().views_count, 4)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_replayed_batch_is_not_counted_twice(self):
+        client = FakeHashRedis()
+        buffer = RedisViewBuffer(client)
+        self.record(buffer)
+        # Падение после коммита, до удаления пачки: она останется в Redis
+        with mock.patch.object(client, 'delete', side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                buffer.flush()
+        self.assertEqual(self.views(), {'post-0-0': 3, 'post-0-1': 1})
+
+        buffer.record(self.second.pk)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(self.views(), {'post-0-0': 3, 'post-0-1': 1})
+        self.assertEqual(ViewCountFlush.objects.count(), 1)
+        # Новые просмотры копились отдельно и применяются следующей пачкой
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(self.views(), {'post-0-0': 3, 'post-0-1': 2})
+
+
+class AuthorStatsTests(TestCase):
+    """Показатели автора: пересчёт после публикации и снятия статьи, пачки просмотров"""
+
+    def setUp(self):
+        self.author = User.objects.create_user('author@example.com')
+        self.other = User.objects.create_user('other@example.com')
+        with record_tasks():
+            create_archive(2, 2, author=self.author)
+        self.posts = list(Post.objects.order_by('slug'))
+        refresh_author_stats([self.author.pk])
+
+    def stats(self, author=None):
+        return AuthorStats.objects.get(pk=(author or self.author).pk)
+
+    def save(self, post, **fields):
+        for name, value in fields.items():
+            setattr(post, name, value)
+        with record_tasks(), self.captureOnCommitCallbacks(execute=True):
+            post.save()
+
+    def test_refresh(self):
+        stats = self.stats()
+        self.assertEqual(stats.posts_count, 4)
+        self.assertEqual(stats.category_counts, {
+            str(self.posts[0].category_id): 2, str(self.posts[2].category_id): 2,
+        })
+        self.assertEqual(stats.last_published_at, self.posts[0].published_at)
+
+    def test_unpublish_and_move(self):
+        self.save(self.posts[0], status=Post.STATUS_DRAFT)
+        stats = self.stats()
+        self.assertEqual(stats.posts_count, 3)
+        self.assertEqual(stats.last_published_at, self.posts[1].published_at)
+
+        # Смена автора пересчитывает обоих: старого и нового
+        self.save(self.posts[2], author=self.other)
+        self.assertEqual(self.stats().posts_count, 2)
+        self.assertEqual(self.stats().category_counts, {str(self.posts[1].category_id): 1, str(self.posts[3].category_id): 1})
+        self.assertEqual(self.stats(self.other).posts_count, 1)
+
+    def add_views(self, counts):
+        # Как сброс счётчика: просмотры статей и пачка авторам в одной транзакции
+        for post_id, count in counts.items():
+            Post.objects.filter(pk=post_id).update(views_count=F('views_count') + count)
+        add_author_views(counts)
+
+    def test_add_author_views(self):
+        self.add_views({self.posts[0].pk: 3, self.posts[2].pk: 2})
+        self.assertEqual(self.stats().views_count, 5)
+
+        self.save(self.posts[3], author=self.other)
+        AuthorStats.objects.filter(pk=self.other.pk).delete()
+        # Строки нет: её создаёт пересчёт, и пачка уже учтена в Post.views_count
+        self.add_views({self.posts[3].pk: 7, self.posts[1].pk: 1})
+        self.assertEqual(self.stats(self.other).views_count, 7)
+        self.assertEqual(self.stats().views_count, 6)
+
+    @override_settings(ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'])
+    def test_author_page(self):
+        clear_caches()
+        response = self.client.get(reverse('blog:author', kwargs={'pk': self.author.pk}))
+        self.assertContains(response, self.posts[0].title)
+        self.assertNotContains(response, self.author.email)
+        # Пользователь без опубликованных статей — не автор, страницы и строки нет
+        response = self.client.get(reverse('blog:author', kwargs={'pk': self.other.pk}))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(AuthorStats.objects.filter(pk=self.other.pk).exists())
+
+    @override_settings(ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'])
+    def test_author_page_without_stats_row(self):
+        clear_caches()
+        AuthorStats.objects.all().delete()
+        response = self.client.get(reverse('blog:author', kwargs={'pk': self.author.pk}))
+        self.assertEqual(response.context['stats'].posts_count, 4)
+        self.assertFalse(AuthorStats.objects.exists())
+
+    def test_draft_views_are_not_counted(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(status=Post.STATUS_DRAFT)
+        add_author_views({self.posts[0].pk: 3})
+        self.assertEqual(self.stats().views_count, 0)
+
+
+class TranslationCacheTests(TestCase):
+    """L1 перед кэшем parler: LRU, копии значений, сброс по поколению и прогрев L2"""
+
+    def setUp(self):
+        clear_caches()
+        self.tiered = TieredTranslationCache(cache, max_size=2, timeout=60, check_interval=3600)
+
+    def test_tiers(self):
+        cache.set('tr:1', {'title': 'Статья'})
+        self.assertEqual(self.tiered.get('tr:1'), {'title': 'Статья'})
+        # Второе чтение — из памяти процесса, даже если L2 уже другой
+        cache.set('tr:1', {'title': 'Другая'})
+        value = self.tiered.get('tr:1')
+        self.assertEqual(value, {'title': 'Статья'})
+        # parler дописывает в словарь — L1 это не портит
+        value['master'] = object()
+        self.assertEqual(self.tiered.get('tr:1'), {'title': 'Статья'})
+        self.assertIsNone(self.tiered.get('tr:missing'))
+        self.assertEqual(self.tiered.stats, {'l1': 2, 'l2': 1, 'miss': 1})
+
+    def test_lru(self):
+        self.tiered.set_many({'tr:1': {'n': 1}, 'tr:2': {'n': 2}})
+        self.tiered.get('tr:1')
+        self.tiered.set('tr:3', {'n': 3})
+        self.assertEqual(list(self.tiered.local), ['tr:1', 'tr:3'])
+        self.assertEqual(self.tiered.get_many(['tr:1', 'tr:2', 'tr:3']), {
+            'tr:1': {'n': 1}, 'tr:2': {'n': 2}, 'tr:3': {'n': 3},
+        })
+
+    def test_generation_clears_local(self):
+        self.tiered.sync_generation(force=True)
+        self.tiered.set('tr:1', {'n': 1})
+        # Другой процесс сохранил перевод: поколение в L2 выросло
+        bump_generation('translations')
+        cache.set('tr:1', {'n': 2})
+        self.tiered.sync_generation()
+        self.assertEqual(self.tiered.get('tr:1'), {'n': 1})
+        self.tiered.sync_generation(force=True)
+        self.assertEqual(self.tiered.get('tr:1'), {'n': 2})
+
+    def test_saved_translation_is_read_back(self):
+        create_archive(1, 1)
+        post = Post.objects.get()
+        self.assertEqual(Post.objects.language('ru').get(pk=post.pk).title, 'Статья 0-0')
+        post.set_current_language('ru')
+        post.title = 'Новый заголовок'
+        post.save()
+        self.assertEqual(Post.objects.language('ru').get(pk=post.pk).title, 'Новый заголовок')
+        cached = translation_cache.backend.get(get_translation_cache_key(PostTranslation, post.pk, 'ru'))
+        self.assertEqual(cached['title'], 'Новый заголовок')
+        self.assertNotIn('search_vector', cached)
+
+    def test_warm(self):
+        create_archive(1, 2)
+        PostTranslation.objects.filter(language_code='en', master__slug='post-0-1').delete()
+        self.assertEqual(warm_translations(Post.objects.all(), ['ru', 'en']), 4)
+        first, second = Post.objects.order_by('slug')
+        cached = translation_cache.backend.get(get_translation_cache_key(PostTranslation, first.pk, 'en'))
+        self.assertEqual(cached['title'], 'Post 0-0')
+        self.assertNotIn('search_vector', cached)
+        missing = translation_cache.backend.get(get_translation_cache_key(PostTranslation, second.pk, 'en'))
+        self.assertEqual(missing, {'__FALLBACK__': True})
+
+
+@override_settings(SITEMAP_SHARD_SIZE=4)
+class SitemapShardTests(TestCase):
+    """Шарды sitemap: адрес на язык перевода, пересборка только помеченных шардов"""
+
+    def setUp(self):
+        clear_caches()
+        pop_set(sitemaps.PENDING_KEY)
+        sitemap_root = tempfile.TemporaryDirectory()
+        self.addCleanup(sitemap_root.cleanup)
+        settings_override = override_settings(SITEMAP_ROOT=sitemap_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        with record_tasks():
+            create_archive(1, 3)
+            self.posts = list(Post.objects.order_by('pk'))
+            self.posts[0].tags.add('milan')
+        PostTranslation.objects.filter(master=self.posts[1], language_code='en').delete()
+
+    def read(self, name):
+        with gzip.open(os.path.join(settings.SITEMAP_ROOT, name), 'rt') as sitemap_file:
+            return sitemap_file.read()
+
+    def shard(self, section, pk):
+        return sitemaps.SHARD_FILE.format(section, sitemaps.shard_of(pk))
+
+    def shard_files(self):
+        return sorted(name for name in os.listdir(settings.SITEMAP_ROOT) if sitemaps.SHARD_FILE_RE.match(name))
+
+    def test_build_all(self):
+        with record_tasks():
+            sitemaps.build_all()
+        locs = re.findall(r'<loc>([^<]+)</loc>', ''.join(
+            self.read(self.shard('posts', post.pk)) for post in self.posts
+        ))
+        first = reverse('blog:post_detail', kwargs={'slug': self.posts[0].slug})
+        second = reverse('blog:post_detail', kwargs={'slug': self.posts[1].slug})
+        self.assertIn(f'http://example.com{first}?lang=en', locs)
+        # Статья без английского перевода — только русский адрес
+        self.assertEqual([loc for loc in set(locs) if second in loc], [f'http://example.com{second}'])
+        index = self.read(sitemaps.INDEX_FILE)
+        for name in self.shard_files():
+            self.assertIn(f'/sitemaps/{name[:-len(".gz")]}</loc>', index)
+        self.assertIn(self.shard('tags', self.posts[0].tags.get().pk), self.shard_files())
+
+        # Шард, которого больше нет в разделе, удаляется при полной сборке
+        stale = sitemaps.SHARD_FILE.format('posts', 999)
+        open(os.path.join(settings.SITEMAP_ROOT, stale), 'wb').close()
+        with record_tasks():
+            sitemaps.build_all()
+        self.assertNotIn(stale, self.shard_files())
+
+    def test_incremental_rebuild(self):
+        with record_tasks():
+            sitemaps.build_all()
+        post, tag = self.posts[0], self.posts[0].tags.get()
+        # Шарды других статей не пересобираются
+        untouched = {
+            name: os.stat(os.path.join(settings.SITEMAP_ROOT, name)).st_mtime_ns for name in self.shard_files()
+            if name.startswith('posts-') and name != self.shard('posts', post.pk)
+        }
+        with record_tasks() as recorder, self.captureOnCommitCallbacks(execute=True):
+            post.status = Post.STATUS_DRAFT
+            post.save()
+        self.assertTrue(recorder.calls(sitemaps.build_pending_shards))
+        pending = set_members(sitemaps.PENDING_KEY)
+        self.assertIn(f'posts:{sitemaps.shard_of(post.pk)}', pending)
+        self.assertIn(f'tags:{sitemaps.shard_of(tag.pk)}', pending)
+        recorder.run(sitemaps.build_pending_shards)
+
+        path = reverse('blog:post_detail', kwargs={'slug': post.slug})
+        shard = self.shard('posts', post.pk)
+        if shard in self.shard_files():
+            self.assertNotIn(path, self.read(shard))
+        # У тега не осталось опубликованных статей — его шард удалён
+        self.assertNotIn(self.shard('tags', tag.pk), self.shard_files())
+        for name, mtime in untouched.items():
+            self.assertEqual(os.stat(os.path.join(settings.SITEMAP_ROOT, name)).st_mtime_ns, mtime)
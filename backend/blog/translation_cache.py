@@ -0,0 +1,231 @@
+"""Двухуровневый кэш переводов parler.
+
+parler хранит переводы в общем кэше (Redis), и каждый воркер ходит туда
+за каждым переводом. Здесь перед общим кэшем (L2) стоит ограниченный
+LRU-кэш в памяти процесса (L1):
+
+* записи L1 помечены поколением переводов (счётчик ``gen:translations``
+  в core.cache). Сохранение или удаление перевода увеличивает поколение,
+  и все процессы перестают доверять своему L1;
+* поколение читается из L2 в начале каждого запроса и не реже раза в
+  TRANSLATION_CACHE_GENERATION_CHECK секунд вне запросов;
+* записи parler в L2 живут TRANSLATION_CACHE_TIMEOUT, а не пять минут по
+  умолчанию: устаревшие переводы parler удаляет сам при сохранении;
+* служебные поля перевода (UNCACHED_FIELDS, например tsvector поиска) в
+  записи не попадают: шаблоны и views их не читают;
+* счётчики попаданий по уровням копятся в процессе и периодически
+  суммируются в L2 — их показывает ``warm_translations --stats``.
+
+Кэш подключается в BlogConfig.ready() подменой ``parler.cache.cache``.
+Команда ``warm_translations`` заполняет L2 при деплое.
+"""
+import threading
+import time
+from collections import Counter, OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from parler import cache as parler_cache
+from parler.cache import get_translation_cache_key
+
+from core.cache import bump_generation, get_generations
+
+SCOPE_TRANSLATIONS = 'translations'
+STATS_KEY = 'translations:stats:{}'
+STATS_TIERS = ('l1', 'l2', 'miss')
+STATS_FLUSH_EVERY = 1000
+FALLBACK_VALUES = {'__FALLBACK__': True}
+# search_vector пересчитывает blog.signals при каждом сохранении перевода
+UNCACHED_FIELDS = frozenset({'search_vector'})
+
+
+def _cacheable(value):
+    if isinstance(value, dict) and not UNCACHED_FIELDS.isdisjoint(value):
+        return {name: field for name, field in value.items() if name not in UNCACHED_FIELDS}
+    return value
+
+
+class TieredTranslationCache:
+    """L1 (LRU в памяти процесса) перед L2 (кэш Django) с интерфейсом кэша Django"""
+
+    def __init__(self, backend, max_size, timeout, check_interval):
+        self.backend = backend
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.generation = None
+        self.checked_at = 0
+        self.stats = Counter()
+
+    @property
+    def default_timeout(self):
+        return self.timeout
+
+    def sync_generation(self, force=False):
+        """Сверяет поколение с L2; при смене поколения L1 очищается"""
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.check_interval:
+            return
+        generation = get_generations([SCOPE_TRANSLATIONS])[SCOPE_TRANSLATIONS]
+        with self.lock:
+            self.checked_at = now
+            if generation != self.generation:
+                self.generation = generation
+                self.local.clear()
+
+    def _remember(self, key, value):
+        with self.lock:
+            self.local[key] = value
+            self.local.move_to_end(key)
+            while len(self.local) > self.max_size:
+                self.local.popitem(last=False)
+
+    def _count(self, tier, count=1):
+        with self.lock:
+            self.stats[tier] += count
+            flush = sum(self.stats.values()) >= STATS_FLUSH_EVERY
+        if flush:
+            self.flush_stats()
+
+    def flush_stats(self):
+        with self.lock:
+            stats, self.stats = self.stats, Counter()
+        for tier, count in stats.items():
+            key = STATS_KEY.format(tier)
+            if cache.add(key, count, timeout=None):
+                continue
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, timeout=None)
+
+    def get(self, key, default=None):
+        self.sync_generation()
+        with self.lock:
+            value = self.local.get(key)
+            if value is not None:
+                self.local.move_to_end(key)
+        if value is not None:
+            self._count('l1')
+            # parler дописывает в словарь master — отдаём копию
+            return dict(value)
+        value = self.backend.get(key)
+        if value is None:
+            self._count('miss')
+            return default
+        self._count('l2')
+        self._remember(key, value)
+        return dict(value)
+
+    def get_many(self, keys):
+        self.sync_generation()
+        found, missing = {}, []
+        with self.lock:
+            for key in keys:
+                value = self.local.get(key)
+                if value is None:
+                    missing.append(key)
+                else:
+                    self.local.move_to_end(key)
+                    found[key] = dict(value)
+        self._count('l1', len(found))
+        if missing:
+            from_backend = self.backend.get_many(missing)
+            self._count('l2', len(from_backend))
+            self._count('miss', len(missing) - len(from_backend))
+            for key, value in from_backend.items():
+                self._remember(key, value)
+                found[key] = dict(value)
+        return found
+
+    def set(self, key, value, timeout=None):
+        value = _cacheable(value)
+        self.backend.set(key, value, self.timeout)
+        self._remember(key, value)
+
+    def set_many(self, data, timeout=None):
+        data = {key: _cacheable(value) for key, value in data.items()}
+        self.backend.set_many(data, self.timeout)
+        for key, value in data.items():
+            self._remember(key, value)
+
+    def delete(self, key):
+        with self.lock:
+            self.local.pop(key, None)
+        self.backend.delete(key)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.local.pop(key, None)
+        self.backend.delete_many(keys)
+
+
+translation_cache = TieredTranslationCache(
+    cache,
+    max_size=settings.TRANSLATION_CACHE_L1_SIZE,
+    timeout=settings.TRANSLATION_CACHE_TIMEOUT,
+    check_interval=settings.TRANSLATION_CACHE_GENERATION_CHECK,
+)
+
+
+def install():
+    """Подключает двухуровневый кэш к parler"""
+    parler_cache.cache = translation_cache
+
+
+def sync_on_request(**kwargs):
+    translation_cache.sync_generation(force=True)
+
+
+def invalidate_translations():
+    """Сбрасывает L1 во всех процессах (при их следующей сверке поколения)"""
+    bump_generation(SCOPE_TRANSLATIONS)
+    translation_cache.sync_generation(force=True)
+
+
+def cache_values(translation):
+    """Значения перевода в формате parler (parler.cache._cache_translation)"""
+    values = {'id': translation.id}
+    for name in translation.get_translated_fields(include_m2m=False):
+        if name not in UNCACHED_FIELDS:
+            values[name] = getattr(translation, name)
+    return values
+
+
+def warm_translations(queryset, languages, chunk_size=500):
+    """Записывает в L2 переводы объектов queryset на языки languages, возвращает число ключей"""
+    translation_model = queryset.model._parler_meta.root_model
+    pks = queryset.order_by().values_list('pk', flat=True).iterator(chunk_size=chunk_size)
+    written = 0
+    while chunk := list(islice(pks, chunk_size)):
+        found = {
+            (translation.master_id, translation.language_code): cache_values(translation)
+            for translation in translation_model.objects.filter(
+                master_id__in=chunk, language_code__in=languages
+            )
+        }
+        data = {
+            get_translation_cache_key(translation_model, pk, language_code):
+                found.get((pk, language_code), FALLBACK_VALUES)
+            for pk in chunk for language_code in languages
+        }
+        translation_cache.backend.set_many(data, translation_cache.timeout)
+        written += len(data)
+    return written
+
+
+def get_hit_ratios():
+    """Доли попаданий по уровням по всем процессам: {'l1': ..., 'l2': ..., 'miss': ...}"""
+    translation_cache.flush_stats()
+    counts = cache.get_many([STATS_KEY.format(tier) for tier in STATS_TIERS])
+    counts = {tier: counts.get(STATS_KEY.format(tier), 0) for tier in STATS_TIERS}
+    total = sum(counts.values())
+    return counts, {tier: (count / total if total else 0.0) for tier, count in counts.items()}
+
+
+def reset_hit_ratios():
+    cache.delete_many([STATS_KEY.format(tier) for tier in STATS_TIERS])
@@ -0,0 +1,121 @@
+"""Загрузка переводов parler для списков объектов.
+
+``prefetch_related('translations')`` тянет переводы на все языки, а parler
+при чтении из prefetch пишет каждый перевод в общий кэш. Здесь переводы
+активного языка и его запасных языков загружаются одним запросом на модель
+и кладутся прямо в локальный кэш объекта (``_translations_cache``).
+Отсутствующие языки помечаются MISSING, поэтому шаблон не делает запросов
+ни за переводом, ни за запасным языком.
+
+Сначала переводы ищутся одним get_many в кэше переводов
+(blog.translation_cache), из БД читается только недостающее.
+"""
+from collections import defaultdict
+
+from django.db.models.query import ModelIterable
+from django.utils.translation import get_language
+from parler import appsettings
+from parler.cache import MISSING, get_translation_cache_key
+from parler.managers import TranslatableQuerySet
+from parler.utils import get_active_language_choices
+
+from .translation_cache import FALLBACK_VALUES, cache_values, translation_cache
+
+
+def translation_languages(language=None):
+    """Активный язык и его запасные языки по PARLER_LANGUAGES"""
+    return get_active_language_choices(language or get_language())
+
+
+def _load_translations(translation_model, objects, languages):
+    """{(pk, язык): перевод или MISSING}: из кэша переводов, недостающее — одним запросом"""
+    pairs = [(pk, language_code) for pk in objects for language_code in languages]
+    keys = {}
+    if appsettings.PARLER_ENABLE_CACHING:
+        keys = {
+            get_translation_cache_key(translation_model, pk, language_code): (pk, language_code)
+            for pk, language_code in pairs
+        }
+    found = {}
+    for key, values in (translation_cache.get_many(list(keys)) if keys else {}).items():
+        pk, language_code = keys[key]
+        if values.get('__FALLBACK__'):
+            found[pk, language_code] = MISSING
+            continue
+        translation = translation_model(master=objects[pk][0], language_code=language_code, **values)
+        translation._state.adding = False
+        found[pk, language_code] = translation
+
+    missing = [pair for pair in pairs if pair not in found]
+    if not missing:
+        return found
+    translations = translation_model.objects.filter(
+        master_id__in={pk for pk, _ in missing}, language_code__in=languages
+    )
+    for translation in translations:
+        pair = (translation.master_id, translation.language_code)
+        if pair not in found:
+            # Обращение к master из перевода не должно делать запрос
+            translation.master = objects[translation.master_id][0]
+            found[pair] = translation
+    if keys:
+        translation_cache.set_many({
+            get_translation_cache_key(translation_model, *pair): (
+                cache_values(found[pair]) if pair in found else FALLBACK_VALUES
+            )
+            for pair in missing
+        })
+    return found
+
+
+def populate_translations(instances, languages):
+    """Заполняет кэш переводов объектов; не больше одного запроса на модель переводов"""
+    # Модель переводов -> pk -> объекты (select_related даёт копию рубрики на каждую статью)
+    by_model = defaultdict(lambda: defaultdict(list))
+    for instance in instances:
+        if instance is not None and instance.pk is not None:
+            by_model[instance._parler_meta.root_model][instance.pk].append(instance)
+
+    for translation_model, objects in by_model.items():
+        found = _load_translations(translation_model, objects, languages)
+        for pk, copies in objects.items():
+            for instance in copies:
+                local_cache = instance._translations_cache[translation_model]
+                for language_code in languages:
+                    local_cache.setdefault(language_code, found.get((pk, language_code), MISSING))
+
+
+class TranslationPrefetchQuerySet(TranslatableQuerySet):
+    """QuerySet с загрузкой переводов объектов и связанных моделей (with_translations)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._translation_languages = None
+        self._translation_related = ()
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._translation_languages = self._translation_languages
+        clone._translation_related = self._translation_related
+        return clone
+
+    def prefetch_translations(self, language=None, related=()):
+        """Переводы языка ``language`` с запасными и переводы полей ``related``"""
+        clone = self.select_related(*related) if related else self._chain()
+        clone._translation_languages = translation_languages(language)
+        clone._translation_related = tuple(related)
+        return clone
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super()._fetch_all()
+        if fetched or not self._translation_languages or not self._result_cache:
+            return
+        if not issubclass(self._iterable_class, ModelIterable):
+            return
+        populate_translations(self._result_cache, self._translation_languages)
+        for name in self._translation_related:
+            populate_translations(
+                [getattr(instance, name) for instance in self._result_cache],
+                self._translation_languages,
+            )
@@ -1,7 +1,25 @@
-from django.urls import path
+from django.urls import path, re_path
+
+from . import views
 
 app_name = 'blog'
 
 urlpatterns = [
-    # TODO: добавить views позже
-]
\ No newline at end of file
+    path('', views.post_list, name='post_list'),
+    path('search/', views.search, name='search'),
+    re_path(r'^feed/(?P<feed_format>rss|atom)/$', views.feed, name='latest_feed'),
+    re_path(
+        r'^category/(?P<slug>[-\w]+)/feed/(?P<feed_format>rss|atom)/$',
+        views.feed, {'kind': 'category'}, name='category_feed',
+    ),
+    re_path(
+        r'^tag/(?P<slug>[-\w]+)/feed/(?P<feed_format>rss|atom)/$',
+        views.feed, {'kind': 'tag'}, name='tag_feed',
+    ),
+    path('category/<slug:slug>/', views.category, name='category'),
+    # Слаги тегов taggit — юникодные (кириллица), конвертер slug их не пропускает
+    re_path(r'^tag/(?P<slug>[-\w]+)/$', views.tag, name='tag'),
+    path('author/<int:pk>/', views.author, name='author'),
+    path('<slug:slug>/comments/', views.comments, name='comments'),
+    path('<slug:slug>/', views.post_detail, name='post_detail'),
+]
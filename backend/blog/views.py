@@ -1,3 +1,168 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+from django.views.decorators.http import require_GET
+from taggit.models import Tag
 
-# Create your views here.
+from accounts.paywall import metered_paywall
+from core.edge import add_surrogate_keys
+from core.pagecache import on_cache_hit
+
+from .author_stats import get_author_categories, get_author_stats
+from .comments import get_comments_page, serialize_comment
+from .counters import record_view
+from .feeds import FeedSource, get_feed_body, get_feed_state
+from .models import Category, Post
+from .pagination import KeysetPaginator
+from .related import get_related_posts
+from .search import search_posts
+from .sidebar import get_sidebar_context
+
+
+def _listing():
+    return (
+        Post.objects.published()
+        .select_related('author')
+        .with_translations()
+    )
+
+
+def _paginate(request, queryset):
+    return KeysetPaginator(queryset, settings.PAGINATE_BY).page(request.GET.get('cursor'))
+
+
+def post_list(request):
+    page = _paginate(request, _listing())
+    response = render(request, 'blog/post_list.html', {
+        'posts': page,
+        'page_obj': page,
+        **get_sidebar_context(),
+    })
+    return add_surrogate_keys(response, 'posts', 'sidebar')
+
+
+def category(request, slug):
+    category = get_object_or_404(Category, slug=slug, is_active=True)
+    page = _paginate(request, _listing().filter(category=category))
+    response = render(request, 'blog/category.html', {
+        'category': category,
+        'posts': page,
+        **get_sidebar_context(),
+    })
+    return add_surrogate_keys(response, f'category-{category.pk}', 'sidebar')
+
+
+def tag(request, slug):
+    tag = get_object_or_404(Tag, slug=slug)
+    page = _paginate(request, _listing().filter(tags=tag))
+    response = render(request, 'blog/post_list.html', {
+        'tag': tag,
+        'posts': page,
+        'page_obj': page,
+        **get_sidebar_context(),
+    })
+    return add_surrogate_keys(response, f'tag-{tag.pk}', 'sidebar')
+
+
+def author(request, pk):
+    author = get_object_or_404(get_user_model().objects.select_related('author_stats'), pk=pk)
+    stats = get_author_stats(author)
+    # Страница есть только у авторов опубликованных статей, а не у любого пользователя
+    if stats is None:
+        raise Http404
+    page = _paginate(request, _listing().filter(author=author))
+    response = render(request, 'blog/author.html', {
+        'author': author,
+        'stats': stats,
+        'author_categories': get_author_categories(stats),
+        'posts': page,
+        **get_sidebar_context(),
+    })
+    return add_surrogate_keys(response, f'author-{author.pk}', 'sidebar')
+
+
+@metered_paywall
+def post_detail(request, slug):
+    post = get_object_or_404(
+        Post.objects.published().select_related('author').with_translations(),
+        slug=slug,
+    )
+    record_view(post.pk)
+    response = render(request, 'blog/post_detail.html', {
+        'post': post,
+        'paywall': request.paywall.check(post),
+        # Вычисляется только при промахе кэша фрагмента post_related
+        'related_posts': SimpleLazyObject(lambda: get_related_posts(post)),
+        'comments': get_comments_page(post.pk),
+        **get_sidebar_context(),
+    })
+    if post.is_premium:
+        # Решение paywall своё у каждого посетителя — в общий кэш страниц нельзя
+        patch_cache_control(response, private=True)
+    add_surrogate_keys(
+        response, f'post-{post.pk}', 'sidebar',
+        post.category_id and f'category-{post.category_id}',
+        post.author_id and f'author-{post.author_id}',
+    )
+    return on_cache_hit(response, record_view, post.pk)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    posts = None
+    if query:
+        posts = search_posts(query, get_language(), cursor=request.GET.get('cursor'))
+    response = render(request, 'blog/search.html', {
+        'query': query,
+        'posts': posts,
+        **get_sidebar_context(),
+    })
+    return add_surrogate_keys(response, 'posts', 'sidebar')
+
+
+@require_GET
+def comments(request, slug):
+    """Одобренные комментарии статьи постранично: ?cursor= из next_cursor"""
+    post_id = (
+        Post.objects.published().filter(slug=slug).values_list('pk', flat=True).first()
+    )
+    if post_id is None:
+        raise Http404
+    page = get_comments_page(post_id, request.GET.get('cursor'))
+    response = JsonResponse({
+        'comments': [serialize_comment(comment) for comment in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    })
+    return add_surrogate_keys(response, f'post-{post_id}')
+
+
+@require_GET
+def feed(request, feed_format, kind='latest', slug=None):
+    """RSS/Atom; при совпадении ETag или Last-Modified — 304 без обращения к БД"""
+    source = FeedSource(kind, slug)
+    state = get_feed_state(source)
+    if state is None:
+        raise Http404
+    etag, stamp = state
+    last_modified = int(stamp.timestamp()) if stamp else None
+    response = get_conditional_response(
+        request, etag=quote_etag(etag), last_modified=last_modified
+    )
+    if response is None:
+        body, content_type = get_feed_body(source, feed_format, etag)
+        response = HttpResponse(body, content_type=content_type)
+    response['ETag'] = quote_etag(etag)
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ['Accept-Language'])
+    return add_surrogate_keys(response, 'feeds')
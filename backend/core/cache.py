@@ -0,0 +1,156 @@
+"""Версионированный кэш фрагментов.
+
+Каждый фрагмент зависит от набора «областей» (scope): ``post:<id>``,
+``category:<id>``, ``posts`` (списки опубликованных статей) и
+``categories`` (список рубрик). У каждой области есть счётчик поколений;
+ключ фрагмента строится из текущих поколений его областей. Сохранение
+статьи увеличивает только счётчики затронутых областей — старые фрагменты
+просто перестают читаться и вытесняются по TTL, весь кэш не сбрасывается.
+
+Здесь же — общие примитивы очередей (множества), которые используют
+нативные структуры Redis, если кэш очередей работает на django_redis. Очереди
+и буферы живут в отдельном кэше ``queues`` (QUEUE_CACHE): его Redis не
+вытесняет ключи, в отличие от кэша фрагментов и страниц.
+
+Всё работает одинаково на django_redis и на LocMemCache.
+"""
+import hashlib
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.utils.translation import get_language
+
+SCOPE_POSTS = 'posts'
+SCOPE_CATEGORIES = 'categories'
+
+GENERATION_KEY_PREFIX = 'gen'
+FRAGMENT_KEY_PREFIX = 'fragment'
+QUEUE_CACHE = 'queues'
+
+
+def get_queue_cache():
+    """Кэш очередей и буферов: ключи из него не вытесняются"""
+    return caches[QUEUE_CACHE]
+
+
+def get_redis():
+    """Клиент Redis очередей, если они работают на django_redis, иначе None"""
+    if not type(get_queue_cache()).__module__.startswith('django_redis'):
+        return None
+    from django_redis import get_redis_connection
+
+    return get_redis_connection(QUEUE_CACHE)
+
+
+_set_lock = threading.Lock()
+
+
+def add_to_set(key, *members):
+    """Добавляет элементы в множество (SADD в Redis, множество в LocMemCache)"""
+    members = [str(member) for member in members]
+    client = get_redis()
+    if client is not None:
+        client.sadd(key, *members)
+        return
+    with _set_lock:
+        queue_cache = get_queue_cache()
+        current = queue_cache.get(key) or set()
+        current.update(members)
+        queue_cache.set(key, current, timeout=None)
+
+
+def set_members(key):
+    """Элементы множества без изменения, set строк"""
+    client = get_redis()
+    if client is not None:
+        return {member.decode() for member in client.smembers(key)}
+    return set(get_queue_cache().get(key) or ())
+
+
+def remove_from_set(key, *members):
+    """Удаляет элементы из множества (SREM в Redis)"""
+    members = [str(member) for member in members]
+    if not members:
+        return
+    client = get_redis()
+    if client is not None:
+        client.srem(key, *members)
+        return
+    with _set_lock:
+        queue_cache = get_queue_cache()
+        current = queue_cache.get(key) or set()
+        current.difference_update(members)
+        queue_cache.set(key, current, timeout=None)
+
+
+def pop_set(key):
+    """Атомарно забирает все элементы множества, возвращает set строк"""
+    client = get_redis()
+    if client is not None:
+        pipe = client.pipeline()
+        pipe.smembers(key)
+        pipe.delete(key)
+        members, _ = pipe.execute()
+        return {member.decode() for member in members}
+    with _set_lock:
+        queue_cache = get_queue_cache()
+        members = queue_cache.get(key) or set()
+        queue_cache.delete(key)
+        return members
+
+
+def scope_for(obj):
+    """Область для экземпляра модели: ``post:42``, ``category:3``"""
+    return f'{obj._meta.model_name}:{obj.pk}'
+
+
+def generation_key(scope):
+    return f'{GENERATION_KEY_PREFIX}:{scope}'
+
+
+def _initial_generation():
+    # Начальное значение от времени, а не 1: если счётчик вытеснили из кэша,
+    # ключи фрагментов не совпадут со старыми.
+    return int(time.time() * 1000)
+
+
+def get_generations(scopes):
+    """Текущие поколения областей за один запрос к кэшу"""
+    keys = {generation_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    generations = {}
+    for key, scope in keys.items():
+        if key in found:
+            generations[scope] = found[key]
+        else:
+            value = _initial_generation()
+            cache.add(key, value, timeout=None)
+            generations[scope] = cache.get(key, value)
+    return generations
+
+
+def bump_generation(*scopes):
+    """Инвалидирует все фрагменты, зависящие от указанных областей"""
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), timeout=None)
+
+
+def fragment_cache_key(name, scopes, language=None):
+    generations = get_generations(scopes)
+    version = ':'.join(f'{scope}={generations[scope]}' for scope in sorted(generations))
+    digest = hashlib.md5(version.encode()).hexdigest()
+    return f'{FRAGMENT_KEY_PREFIX}:{name}:{language or get_language()}:{digest}'
+
+
+def get_or_render_fragment(name, scopes, render, timeout):
+    key = fragment_cache_key(name, scopes)
+    value = cache.get(key)
+    if value is None:
+        value = render()
+        cache.set(key, value, timeout)
+    return value
@@ -0,0 +1,293 @@
+"""Рассылка дайджеста новых статей.
+
+Получатели — активные NewsletterSubscriber и пользователи с
+``newsletter_subscribed``. Обе таблицы читаются курсором
+(``iterator(chunk_size=...)``) в порядке адреса в нижнем регистре и
+сливаются heapq.merge, поэтому дубликаты идут подряд и отбрасываются без
+хранения списка адресов в памяти.
+
+Письмо рендерится один раз на язык рассылки (NewsletterDispatch.language),
+получатель подставляется только в заголовок To.
+
+Адреса отправляются окнами по ``concurrency × batch_size``: пачки окна
+уходят параллельно, после окна в NewsletterDispatch сохраняются счётчики и
+последний обработанный адрес. Прерванная рассылка продолжается с этого
+адреса (``send_digest --resume``).
+"""
+import asyncio
+import base64
+import heapq
+import logging
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate, Lower
+from django.template.loader import render_to_string
+from django.utils import timezone, translation
+
+from .models import NewsletterDispatch, NewsletterSubscriber
+from .sendpulse import SendPulseError, get_sendpulse_client
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Digest:
+    subject: str
+    text: str
+    html: str
+
+
+def _email_key():
+    key = Lower('email')
+    if connection.vendor == 'postgresql':
+        # Побайтовый порядок, как у строк Python, — иначе heapq.merge не сольёт потоки
+        key = Collate(key, 'C')
+    return key
+
+
+def _stream(queryset, after, chunk_size):
+    queryset = queryset.annotate(email_key=_email_key())
+    if after:
+        queryset = queryset.filter(email_key__gt=after)
+    return queryset.order_by('email_key').values_list('email_key', flat=True).iterator(chunk_size=chunk_size)
+
+
+def iter_recipients(after='', chunk_size=2000):
+    """Адреса получателей по алфавиту без повторов, начиная после ``after``"""
+    streams = [
+        _stream(NewsletterSubscriber.objects.filter(is_active=True), after, chunk_size),
+        _stream(
+            get_user_model().objects.filter(is_active=True, newsletter_subscribed=True),
+            after, chunk_size,
+        ),
+    ]
+    previous = None
+    for email in heapq.merge(*streams):
+        if email != previous:
+            yield email
+            previous = email
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def digest_posts(since):
+    from blog.models import Post
+
+    return list(
+        Post.objects.published().filter(published_at__gte=since)
+        .with_translations()
+        .order_by('-published_at', '-id')[:settings.NEWSLETTER_DIGEST_MAX_POSTS]
+    )
+
+
+def render_digest(dispatch, posts=None):
+    """Тема и тело письма рассылки на её языке"""
+    site = Site.objects.get_current()
+    with translation.override(dispatch.language):
+        if posts is None:
+            posts = digest_posts(dispatch.since)
+        context = {
+            'subject': dispatch.subject,
+            'posts': posts,
+            'language': dispatch.language,
+            'site_domain': site.domain,
+            'site_url': f'{settings.ACCOUNT_DEFAULT_HTTP_PROTOCOL}://{site.domain}',
+        }
+        return Digest(
+            subject=dispatch.subject,
+            text=render_to_string('emails/digest.txt', context),
+            html=render_to_string('emails/digest.html', context),
+        )
+
+
+def default_since(days=None):
+    return timezone.now() - timedelta(days=days or settings.NEWSLETTER_DIGEST_DAYS)
+
+
+class SMTPSender:
+    """Пачки уходят из пула потоков, у каждого потока своё постоянное SMTP-соединение"""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.executor = ThreadPoolExecutor(self.concurrency, thread_name_prefix='digest')
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown()
+        for smtp_connection in self.connections:
+            smtp_connection.close()
+
+    def _connection(self):
+        smtp_connection = getattr(self.local, 'connection', None)
+        if smtp_connection is None:
+            smtp_connection = self.local.connection = get_connection()
+            with self.lock:
+                self.connections.append(smtp_connection)
+        # Открытое заранее соединение send_messages() не закрывает
+        smtp_connection.open()
+        return smtp_connection
+
+    def _send_batch(self, emails, digest):
+        sent = failed = 0
+        for email in emails:
+            message = EmailMultiAlternatives(
+                digest.subject, digest.text, settings.DEFAULT_FROM_EMAIL, [email],
+                connection=self._connection(),
+            )
+            message.attach_alternative(digest.html, 'text/html')
+            try:
+                sent += message.send()
+            except (smtplib.SMTPException, OSError):
+                logger.warning('Не удалось отправить дайджест на %s', email, exc_info=True)
+                failed += 1
+                # Соединение могло оборваться — следующее письмо откроет новое
+                self.local.connection.close()
+        return sent, failed
+
+    def send_window(self, batches, digest):
+        results = self.executor.map(lambda batch: self._send_batch(batch, digest), batches)
+        sent, failed = zip(*results)
+        return sum(sent), sum(failed)
+
+
+class SendPulseSender:
+    """Отправка через SMTP API SendPulse, не больше ``concurrency`` запросов сразу"""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+
+    def __enter__(self):
+        # Один цикл событий на всю рассылку: пул соединений клиента переиспользуется.
+        # asyncio.Runner появился только в Python 3.11, образ работает на 3.9.
+        self.loop = asyncio.new_event_loop()
+        self.client = get_sendpulse_client(max_connections=self.concurrency)
+        try:
+            self.loop.run_until_complete(self.client.__aenter__())
+        except BaseException:
+            self.loop.close()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            self.loop.run_until_complete(self.client.__aexit__(*exc_info))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        finally:
+            self.loop.close()
+
+    async def _send(self, batches, digest):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        html = base64.b64encode(digest.html.encode()).decode()
+
+        async def send(email):
+            async with semaphore:
+                try:
+                    await self.client.request('POST', '/smtp/emails', json={'email': {
+                        'subject': digest.subject,
+                        'html': html,
+                        'text': digest.text,
+                        'from': {
+                            'name': settings.SENDPULSE_FROM_NAME,
+                            'email': settings.SENDPULSE_FROM_EMAIL,
+                        },
+                        'to': [{'email': email}],
+                    }})
+                except SendPulseError:
+                    logger.warning('Не удалось отправить дайджест на %s', email, exc_info=True)
+                    return False
+                return True
+
+        results = await asyncio.gather(*(send(email) for batch in batches for email in batch))
+        sent = sum(results)
+        return sent, len(results) - sent
+
+    def send_window(self, batches, digest):
+        return self.loop.run_until_complete(self._send(batches, digest))
+
+
+class DryRunSender:
+    """Ничего не отправляет — для проверки списка получателей и скорости выборки"""
+
+    def __init__(self, concurrency):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def send_window(self, batches, digest):
+        return sum(len(batch) for batch in batches), 0
+
+
+SENDERS = {
+    'smtp': SMTPSender,
+    'sendpulse': SendPulseSender,
+    'dry-run': DryRunSender,
+}
+
+
+def run_dispatch(dispatch, backend=None, concurrency=None, batch_size=None, progress=None):
+    """Отправляет рассылку с места последней контрольной точки.
+
+    ``progress(dispatch, rate)`` вызывается после каждого окна; rate — писем
+    в секунду в этом запуске.
+    """
+    backend = backend or settings.NEWSLETTER_DISPATCH_BACKEND
+    concurrency = concurrency or settings.NEWSLETTER_DISPATCH_CONCURRENCY
+    batch_size = batch_size or settings.NEWSLETTER_DISPATCH_BATCH_SIZE
+    window_size = concurrency * batch_size
+
+    digest = render_digest(dispatch)
+    recipients = iter_recipients(after=dispatch.last_email, chunk_size=window_size)
+    processed = 0
+    started = time.monotonic()
+
+    with SENDERS[backend](concurrency) as sender:
+        for window in _chunks(recipients, window_size):
+            sent, failed = sender.send_window(list(_chunks(window, batch_size)), digest)
+            NewsletterDispatch.objects.filter(pk=dispatch.pk).update(
+                last_email=window[-1],
+                sent_count=F('sent_count') + sent,
+                failed_count=F('failed_count') + failed,
+            )
+            dispatch.last_email = window[-1]
+            dispatch.sent_count += sent
+            dispatch.failed_count += failed
+            processed += len(window)
+            rate = processed / max(time.monotonic() - started, 1e-6)
+            logger.info(
+                'Рассылка %s: отправлено %s, ошибок %s, %.1f писем/с',
+                dispatch.pk, dispatch.sent_count, dispatch.failed_count, rate,
+            )
+            if progress is not None:
+                progress(dispatch, rate)
+
+    dispatch.status = NewsletterDispatch.STATUS_DONE
+    dispatch.finished_at = timezone.now()
+    NewsletterDispatch.objects.filter(pk=dispatch.pk).update(
+        status=dispatch.status, finished_at=dispatch.finished_at
+    )
+    return processed, time.monotonic() - started
@@ -0,0 +1,125 @@
+"""Кэш на reverse proxy (Varnish, Fastly, nginx) с очисткой по ключам.
+
+Представления помечают ответ ключами (surrogate keys): ``post-<id>``,
+``category-<id>``, ``author-<id>``, ``tag-<id>``, ``home``, ``posts``
+(списки статей и поиск), ``sidebar`` (страницы с сайдбаром), ``pages``,
+``feeds`` (RSS и Atom), ``sitemaps``, ``csrf``.
+Ключи уходят прокси в заголовке EDGE_SURROGATE_KEY_HEADER, а общедоступные
+ответы получают ``Surrogate-Control: max-age=EDGE_CACHE_TIMEOUT`` — прокси
+может держать их часами.
+
+Сохранение модели после коммита ставит ключи в очередь purge_keys():
+множество в кэше и фоновая задача. Задача забирает всё накопленное разом
+и отправляет пачками POST-запросом на EDGE_PURGE_URL, поэтому серия правок
+в админке даёт один-два запроса к прокси. Ключи, которые не удалось
+отправить, возвращаются в очередь; команда ``purge_edge`` отправляет
+очередь вручную или по cron.
+
+Без EDGE_PURGE_URL очередь не ведётся. Для разработки есть команда
+``edge_purge_stub`` — локальный сервер, который печатает полученные ключи.
+"""
+import logging
+import time
+
+import httpx
+from django.conf import settings
+
+from .cache import add_to_set, pop_set
+from .pagecache import is_personalized
+from .tasks import enqueue
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'edge:purge:pending'
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 0.5
+
+
+class EdgePurgeError(Exception):
+    pass
+
+
+def add_surrogate_keys(response, *keys):
+    """Добавляет ключи к заголовку ответа, возвращает ответ"""
+    header = settings.EDGE_SURROGATE_KEY_HEADER
+    current = response[header].split() if response.has_header(header) else []
+    for key in keys:
+        if key and key not in current:
+            current.append(key)
+    if current:
+        response[header] = ' '.join(current)
+    return response
+
+
+def purge_keys(*keys):
+    """Ставит ключи в очередь очистки прокси (вызывать после коммита)"""
+    keys = {key for key in keys if key}
+    if keys and settings.EDGE_PURGE_URL:
+        add_to_set(PENDING_KEY, *keys)
+        enqueue(flush_purge_queue)
+
+
+def send_purge(keys):
+    """Один запрос очистки; временные ошибки повторяются"""
+    headers = {}
+    if settings.EDGE_PURGE_TOKEN:
+        headers['Authorization'] = f'Bearer {settings.EDGE_PURGE_TOKEN}'
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            response = httpx.post(
+                settings.EDGE_PURGE_URL, json={'surrogate_keys': keys},
+                headers=headers, timeout=httpx.Timeout(10.0, connect=3.0),
+            )
+        except httpx.TransportError as error:
+            reason = repr(error)
+        else:
+            if response.status_code < 500:
+                if response.is_error:
+                    raise EdgePurgeError(f'{response.status_code}: {response.text[:200]}')
+                return
+            reason = f'HTTP {response.status_code}'
+        if attempt == MAX_ATTEMPTS:
+            raise EdgePurgeError(reason)
+        time.sleep(BACKOFF_BASE * 2 ** (attempt - 1))
+
+
+def flush_purge_queue():
+    """Фоновая задача: отправляет накопленные ключи, возвращает их число"""
+    keys = sorted(pop_set(PENDING_KEY))
+    batch_size = settings.EDGE_PURGE_BATCH_SIZE
+    for start in range(0, len(keys), batch_size):
+        try:
+            send_purge(keys[start:start + batch_size])
+        except EdgePurgeError as error:
+            add_to_set(PENDING_KEY, *keys[start:])
+            logger.error('Очистка кэша прокси не удалась, ключи возвращены в очередь: %s', error)
+            raise
+    return len(keys)
+
+
+class SurrogateControlMiddleware:
+    """
+    Разрешает прокси кэшировать помеченные ключами ответы для анонимов.
+
+    Ставится сразу после SecurityMiddleware: ему нужны итоговые cookie
+    ответа (в том числе csrftoken от CsrfViewMiddleware).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not response.has_header(settings.EDGE_SURROGATE_KEY_HEADER):
+            return response
+        cache_control = response.get('Cache-Control', '')
+        if (
+            request.method in ('GET', 'HEAD')
+            and response.status_code == 200
+            and not response.cookies
+            and not is_personalized(request)
+            and 'private' not in cache_control
+            and 'no-store' not in cache_control
+        ):
+            response['Surrogate-Control'] = f'max-age={settings.EDGE_CACHE_TIMEOUT}'
+        return response
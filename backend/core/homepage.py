@@ -0,0 +1,91 @@
+"""Данные главной страницы.
+
+Все четыре секции собираются фиксированным числом SQL-запросов, которое
+не зависит от количества статей и рубрик:
+
+1. избранные статьи (главная + сайдбар);
+2. последние публикации;
+3. превью по рубрикам — один запрос с оконной функцией ROW_NUMBER();
+4. переводы статей на активный и запасные языки одним пакетом;
+5. переводы рубрик одним пакетом (blog.translations).
+
+Автор и рубрика подтягиваются через select_related в тех же запросах.
+"""
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils.functional import SimpleLazyObject
+
+from blog.models import Post
+from blog.translations import populate_translations, translation_languages
+
+SIDEBAR_POSTS_COUNT = 4
+LATEST_POSTS_COUNT = 6
+CATEGORY_POSTS_COUNT = 4
+
+
+def _base_queryset():
+    return Post.objects.published().select_related('category', 'author')
+
+
+def _category_previews():
+    """Первые CATEGORY_POSTS_COUNT статей каждой активной рубрики одним запросом"""
+    posts = (
+        _base_queryset()
+        .filter(category__is_active=True)
+        .annotate(
+            category_row=Window(
+                expression=RowNumber(),
+                partition_by=[F('category_id')],
+                order_by=[F('published_at').desc(), F('id').desc()],
+            )
+        )
+        .filter(category_row__lte=CATEGORY_POSTS_COUNT)
+        .order_by('category__order', 'category_id', 'category_row')
+    )
+
+    categories = {}
+    for post in posts:
+        category = categories.get(post.category_id)
+        if category is None:
+            category = post.category
+            category.posts_preview = []
+            categories[post.category_id] = category
+        # Один экземпляр рубрики на все её статьи
+        post.category = category
+        category.posts_preview.append(post)
+    return list(categories.values())
+
+
+def get_homepage_context():
+    """Контекст шаблона pages/index.html"""
+    featured = list(_base_queryset().filter(is_featured=True)[:SIDEBAR_POSTS_COUNT + 1])
+    featured_post = featured[0] if featured else None
+    sidebar_posts = featured[1:]
+
+    latest_posts = list(
+        _base_queryset().exclude(pk__in=[post.pk for post in featured])[:LATEST_POSTS_COUNT]
+    )
+    categories_with_posts = _category_previews()
+
+    posts = featured + latest_posts
+    for category in categories_with_posts:
+        posts.extend(category.posts_preview)
+    languages = translation_languages()
+    populate_translations(posts, languages)
+    populate_translations([post.category for post in posts], languages)
+
+    return {
+        'featured_post': featured_post,
+        'sidebar_posts': sidebar_posts,
+        'latest_posts': latest_posts,
+        'categories_with_posts': categories_with_posts,
+    }
+
+
+def get_lazy_homepage_context():
+    """Тот же контекст, но запросы выполняются только при промахе кэша фрагментов"""
+    context = SimpleLazyObject(get_homepage_context)
+    return {
+        key: SimpleLazyObject(lambda key=key: context[key])
+        for key in ('featured_post', 'sidebar_posts', 'latest_posts', 'categories_with_posts')
+    }
@@ -0,0 +1,193 @@
+"""Адаптивные варианты изображений (srcset).
+
+Для исходного изображения создаются уменьшенные копии шириной из
+IMAGE_VARIANT_WIDTHS (не больше MAX_IMAGE_WIDTH и ширины оригинала) в
+форматах IMAGE_VARIANT_FORMATS. Список файлов сохраняется в манифест —
+JSON-поле модели::
+
+    {
+        "source": "posts/photo.jpg",
+        "width": 1600, "height": 900,
+        "formats": {"avif": [[320, "posts/variants/photo/320.avif"], ...], ...}
+    }
+
+Шаблонный тег ``responsive_image`` (core.templatetags.responsive_images) строит
+srcset только из манифеста, не обращаясь к файловой системе.
+
+Исходники лежат в хранилище с адресацией по содержимому (core.storage):
+одинаковый файл у разных объектов — одно имя, а значит, и общие варианты.
+Поэтому готовые варианты не перезаписываются, а при смене изображения
+удаляются, только если исходник больше никем не используется; остальное
+убирает ``sweep_media`` вместе с исходником-сиротой.
+"""
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from PIL import Image, ImageOps, features
+
+from .cache import bump_generation, scope_for
+from .tasks import enqueue
+from .thumbnails import THUMBNAIL_QUEUE
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+}
+
+
+def supported_formats():
+    """Форматы из настроек, которые умеет кодировать установленный Pillow"""
+    return [
+        image_format for image_format in settings.IMAGE_VARIANT_FORMATS
+        if image_format == 'jpeg' or features.check(image_format)
+    ]
+
+
+def variant_widths(source_width):
+    limit = min(source_width, settings.MAX_IMAGE_WIDTH)
+    widths = {width for width in settings.IMAGE_VARIANT_WIDTHS if width < limit}
+    widths.add(limit)
+    return sorted(widths)
+
+
+def manifest_is_current(manifest, fieldfile):
+    return bool(manifest) and bool(fieldfile) and manifest.get('source') == fieldfile.name
+
+
+def variant_directory(source_name):
+    directory, filename = os.path.split(source_name)
+    return f'{directory}/variants/{os.path.splitext(filename)[0]}'
+
+
+def _variant_name(source_name, width, image_format):
+    extension = 'jpg' if image_format == 'jpeg' else image_format
+    return f'{variant_directory(source_name)}/{width}.{extension}'
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    options = {'quality': settings.IMAGE_QUALITY}
+    if image_format == 'webp':
+        options['method'] = 4
+    elif image_format == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    image.save(buffer, format=image_format.upper(), **options)
+    return buffer.getvalue()
+
+
+def build_variants(fieldfile):
+    """Создаёт все варианты изображения и возвращает манифест"""
+    # Варианты — производные файлы: обычное хранилище, имена по манифесту
+    storage = default_storage
+    formats = supported_formats()
+    with fieldfile.open('rb') as source:
+        image = Image.open(source)
+        # JPEG декодируется сразу в уменьшенном масштабе (DCT scaling);
+        # квадратная рамка — потому что EXIF может повернуть изображение
+        largest = min(max(image.size), settings.MAX_IMAGE_WIDTH)
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    width, height = image.size
+    widths = variant_widths(width)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    manifest = {'source': fieldfile.name, 'width': width, 'height': height, 'formats': {}}
+    # От большего к меньшему: каждый размер получается из предыдущего
+    resized = image
+    for variant_width in reversed(widths):
+        variant_height = max(1, round(height * variant_width / width))
+        if resized.width != variant_width:
+            resized = resized.resize(
+                (variant_width, variant_height), Image.Resampling.LANCZOS, reducing_gap=3.0
+            )
+        for image_format in formats:
+            frame = resized.convert('RGB') if image_format == 'jpeg' else resized
+            name = _variant_name(fieldfile.name, variant_width, image_format)
+            # Имя исходника задаёт его содержимое: готовый вариант мог создать
+            # объект с тем же файлом, и его манифест на этот вариант ссылается
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(_encode(frame, image_format)))
+            manifest['formats'].setdefault(image_format, []).insert(0, [variant_width, name])
+    return manifest
+
+
+def delete_variants(manifest, storage=default_storage):
+    for variants in (manifest or {}).get('formats', {}).values():
+        for _, name in variants:
+            storage.delete(name)
+
+
+def delete_source_variants(source_name, storage=default_storage):
+    """Удаляет все варианты исходника, в том числе не попавшие в манифест"""
+    directory = variant_directory(source_name)
+    try:
+        _, filenames = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in filenames:
+        storage.delete(f'{directory}/{filename}')
+
+
+def source_in_use(model, field_name, manifest_field, source_name):
+    """Ссылается ли на исходник (или на его варианты) хоть одна строка модели"""
+    return model._default_manager.filter(
+        Q(**{field_name: source_name}) | Q(**{f'{manifest_field}__source': source_name})
+    ).exists()
+
+
+def generate_image_variants(model_label, pk, field_name, manifest_field, scopes=()):
+    """Фоновая задача: варианты изображения объекта и его манифест"""
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return
+    fieldfile = getattr(instance, field_name)
+    old_manifest = getattr(instance, manifest_field)
+    if manifest_is_current(old_manifest, fieldfile):
+        return
+
+    manifest = {}
+    if fieldfile:
+        # Тот же файл у другого объекта: варианты уже есть, манифест общий
+        manifest = model._default_manager.filter(
+            **{f'{manifest_field}__source': fieldfile.name}
+        ).exclude(pk=pk).values_list(manifest_field, flat=True).first() or {}
+    if fieldfile and not manifest:
+        try:
+            manifest = build_variants(fieldfile)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.warning('Не удалось создать варианты %s:%s', model_label, pk, exc_info=True)
+            return
+    # update() без сигналов: сохранение не должно снова ставить задачу
+    model._default_manager.filter(pk=pk).update(**{manifest_field: manifest})
+    old_source = (old_manifest or {}).get('source')
+    if old_source and old_source != manifest.get('source'):
+        # Общие с другими объектами варианты остаются до sweep_media
+        if not source_in_use(model, field_name, manifest_field, old_source):
+            delete_variants(old_manifest)
+    bump_generation(scope_for(instance), *scopes)
+
+
+def queue_image_variants(instance, field_name, manifest_field, scopes=()):
+    """Ставит создание вариантов в очередь, если манифест устарел"""
+    manifest, fieldfile = getattr(instance, manifest_field), getattr(instance, field_name)
+    if manifest_is_current(manifest, fieldfile) or not (manifest or fieldfile):
+        return
+    label = instance._meta.label
+    scopes = list(scopes)
+    transaction.on_commit(lambda: enqueue(
+        generate_image_variants, label, instance.pk, field_name, manifest_field, scopes,
+        queue=THUMBNAIL_QUEUE,
+    ))
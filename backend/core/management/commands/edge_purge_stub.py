@@ -0,0 +1,53 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+def make_stub_server(host, port, status, stdout):
+    """Сервер заглушки: печатает путь и ключи каждого запроса очистки в stdout"""
+
+    class PurgeHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                keys = json.loads(body)['surrogate_keys']
+            except (ValueError, KeyError, TypeError):
+                self.send_response(400)
+                self.end_headers()
+                return
+            stdout.write(f'{self.path}: {len(keys)} — {" ".join(keys)}')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'status': 'ok', 'purged': len(keys)}).encode())
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), PurgeHandler)
+
+
+class Command(BaseCommand):
+    help = (
+        'Локальная заглушка прокси для разработки и тестов: принимает очистку '
+        'по ключам и печатает их. EDGE_PURGE_URL=http://127.0.0.1:8089/purge'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument(
+            '--status', type=int, default=200,
+            help='Код ответа — чтобы проверить повторы и возврат ключей в очередь',
+        )
+
+    def handle(self, *args, **options):
+        server = make_stub_server(options['host'], options['port'], options['status'], self.stdout)
+        self.stdout.write(f'Заглушка очистки слушает http://{options["host"]}:{options["port"]}/')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
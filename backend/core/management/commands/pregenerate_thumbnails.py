@@ -0,0 +1,91 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.models import Checkpoint
+from core.thumbnails import THUMBNAIL_FIELDS, generate_thumbnails_for
+
+CHECKPOINT_KEY = 'thumbnails:backfill:{}'
+
+
+def _init_worker():
+    django.setup()
+
+
+def _generate_batch(model_label, field_name, pks):
+    generated = sum(generate_thumbnails_for(model_label, pk, field_name) for pk in pks)
+    return pks[-1], generated
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры всех алиасов для уже загруженных изображений. '
+        'Продолжает с места остановки; готовые миниатюры пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', choices=sorted(THUMBNAIL_FIELDS), action='append',
+            help='Модель (по умолчанию все из THUMBNAIL_FIELDS)',
+        )
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument(
+            '--restart', action='store_true', help='Начать заново, забыв сохранённую позицию',
+        )
+
+    def handle(self, *args, **options):
+        for model_label in options['model'] or sorted(THUMBNAIL_FIELDS):
+            self.backfill(model_label, THUMBNAIL_FIELDS[model_label], options)
+
+    def backfill(self, model_label, field_name, options):
+        # Позиция хранится в БД: кэш без Redis живёт в памяти процесса,
+        # а с Redis может быть вытеснен — и обход начался бы заново
+        checkpoint_key = CHECKPOINT_KEY.format(model_label)
+        if options['restart']:
+            Checkpoint.objects.filter(name=checkpoint_key).delete()
+        after = (
+            Checkpoint.objects.filter(name=checkpoint_key)
+            .values_list('position', flat=True).first() or 0
+        )
+
+        model = apps.get_model(model_label)
+        pks = list(
+            model._default_manager.filter(pk__gt=after)
+            .exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        size = options['batch_size']
+        batches = [pks[start:start + size] for start in range(0, len(pks), size)]
+        self.stdout.write(f'{model_label}: {len(pks)} объектов после pk={after}')
+
+        started = time.perf_counter()
+        total = 0
+        if options['workers'] > 1 and len(batches) > 1:
+            # Соединения с БД не должны наследоваться дочерними процессами
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'], initializer=_init_worker) as pool:
+                results = pool.map(_generate_batch, repeat(model_label), repeat(field_name), batches)
+                total = self.collect(results, checkpoint_key)
+        else:
+            results = (_generate_batch(model_label, field_name, batch) for batch in batches)
+            total = self.collect(results, checkpoint_key)
+
+        self.stdout.write(
+            f'{model_label}: создано миниатюр {total} за {time.perf_counter() - started:.1f} с'
+        )
+
+    def collect(self, results, checkpoint_key):
+        # map отдаёт результаты по порядку пачек — позиция сохраняется
+        # только когда готовы все предыдущие пачки
+        total = 0
+        for last_pk, generated in results:
+            total += generated
+            Checkpoint.objects.update_or_create(name=checkpoint_key, defaults={'position': last_pk})
+        return total
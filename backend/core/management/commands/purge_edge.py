@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.cache import add_to_set
+from core.edge import PENDING_KEY, EdgePurgeError, flush_purge_queue
+
+
+class Command(BaseCommand):
+    help = 'Отправляет очередь очистки кэша прокси; с ключами — сначала ставит их в очередь'
+
+    def add_arguments(self, parser):
+        parser.add_argument('keys', nargs='*', help='Ключи, например: home post-42')
+
+    def handle(self, *args, **options):
+        if not settings.EDGE_PURGE_URL:
+            raise CommandError('EDGE_PURGE_URL не задан')
+        if options['keys']:
+            add_to_set(PENDING_KEY, *options['keys'])
+        try:
+            sent = flush_purge_queue()
+        except EdgePurgeError as error:
+            raise CommandError(f'Прокси не принял очистку: {error}')
+        self.stdout.write(f'Отправлено ключей: {sent}')
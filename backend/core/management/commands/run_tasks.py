@@ -0,0 +1,44 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.cache import get_redis
+from core.tasks import DEFAULT_QUEUE, pop_task, run_task
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди Redis (core.tasks)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queue', action='append', dest='queues',
+            help=f'Очередь (можно несколько, порядок — приоритет); по умолчанию {DEFAULT_QUEUE}',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно; без флага выполнить накопленное и выйти',
+        )
+        parser.add_argument('--timeout', type=int, default=5, help='Ожидание задачи, секунд')
+
+    def handle(self, *args, **options):
+        if get_redis() is None:
+            raise CommandError('Очередь задач требует Redis (REDIS_URL)')
+        queues = options['queues'] or [DEFAULT_QUEUE]
+        done = failed = 0
+        while True:
+            message = pop_task(queues, timeout=options['timeout'])
+            if message is None:
+                if options['loop']:
+                    continue
+                break
+            close_old_connections()
+            try:
+                run_task(message)
+                done += 1
+            except Exception:
+                failed += 1
+                logger.exception('Фоновая задача завершилась с ошибкой: %s', message)
+        self.stdout.write(f'Выполнено задач: {done}, с ошибкой: {failed}')
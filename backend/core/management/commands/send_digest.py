@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.digest import SENDERS, default_since, digest_posts, run_dispatch
+from core.models import NewsletterDispatch
+
+
+class Command(BaseCommand):
+    help = 'Рассылает дайджест новых статей подписчикам и пользователям с подпиской'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subject', default='Новые статьи MilanWeek')
+        parser.add_argument(
+            '--days', type=int, default=settings.NEWSLETTER_DIGEST_DAYS,
+            help='Статьи, опубликованные за последние N дней',
+        )
+        parser.add_argument(
+            '--language', default=settings.LANGUAGE_CODE,
+            choices=[code for code, _ in settings.LANGUAGES],
+        )
+        parser.add_argument(
+            '--backend', default=settings.NEWSLETTER_DISPATCH_BACKEND,
+            choices=[name for name in SENDERS if name != 'dry-run'],
+        )
+        parser.add_argument('--concurrency', type=int, default=settings.NEWSLETTER_DISPATCH_CONCURRENCY)
+        parser.add_argument('--batch-size', type=int, default=settings.NEWSLETTER_DISPATCH_BATCH_SIZE)
+        parser.add_argument(
+            '--resume', type=int, metavar='ID',
+            help='Продолжить прерванную рассылку с последней контрольной точки',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только пройти по получателям, ничего не отправляя и не сохраняя',
+        )
+
+    def handle(self, *args, **options):
+        backend = 'dry-run' if options['dry_run'] else options['backend']
+        if options['resume']:
+            dispatch = NewsletterDispatch.objects.filter(
+                pk=options['resume'], status=NewsletterDispatch.STATUS_RUNNING
+            ).first()
+            if dispatch is None:
+                raise CommandError(f'Нет незавершённой рассылки {options["resume"]}')
+        else:
+            running = NewsletterDispatch.objects.filter(status=NewsletterDispatch.STATUS_RUNNING).first()
+            if running is not None and not options['dry_run']:
+                raise CommandError(
+                    f'Рассылка {running.pk} не завершена: продолжите её с --resume {running.pk}'
+                )
+            dispatch = NewsletterDispatch(
+                subject=options['subject'],
+                language=options['language'],
+                since=default_since(options['days']),
+            )
+            if not digest_posts(dispatch.since):
+                self.stdout.write('Новых статей нет, рассылка не нужна')
+                return
+            if not options['dry_run']:
+                dispatch.save()
+
+        def progress(dispatch, rate):
+            self.stdout.write(
+                f'До {dispatch.last_email}: отправлено {dispatch.sent_count}, '
+                f'ошибок {dispatch.failed_count}, {rate:.1f} писем/с'
+            )
+
+        processed, elapsed = run_dispatch(
+            dispatch, backend=backend, concurrency=options['concurrency'],
+            batch_size=options['batch_size'], progress=progress,
+        )
+        self.stdout.write(
+            f'Рассылка {dispatch.pk or "(пробная)"}: получателей {processed} за {elapsed:.1f} с '
+            f'({processed / max(elapsed, 1e-6):.1f} писем/с), '
+            f'отправлено всего {dispatch.sent_count}, ошибок {dispatch.failed_count}'
+        )
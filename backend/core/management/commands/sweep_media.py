@@ -0,0 +1,105 @@
+import os
+import re
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.utils import timezone
+
+from blog.models import Post
+from core.images import delete_source_variants
+from core.models import MediaFile
+from core.storage import TEMP_DIRECTORY, ContentAddressedStorage, media_storage
+
+# Только что загруженный файл может ещё не быть привязан к объекту
+GRACE_PERIOD = timedelta(days=1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает ссылки на файлы хранилища с адресацией по содержимому '
+        'и удаляет файлы, на которые никто не ссылается'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что будет удалено')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        self.dry_run = options['dry_run']
+        self.file_fields = [
+            (model, field.name)
+            for model in apps.get_models()
+            for field in model._meta.concrete_fields
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+        ]
+        self.content_references = self.collect_content_references()
+        cutoff = timezone.now() - GRACE_PERIOD
+
+        checked = removed = freed = 0
+        last_pk = 0
+        while True:
+            batch = list(MediaFile.objects.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            references = self.count_references([media_file.name for media_file in batch])
+
+            changed, orphans = [], []
+            for media_file in batch:
+                count = references[media_file.name]
+                if count == 0 and media_file.created_at < cutoff:
+                    orphans.append(media_file)
+                elif count != media_file.refcount:
+                    media_file.refcount = count
+                    changed.append(media_file)
+            checked += len(batch)
+            removed += len(orphans)
+            freed += sum(media_file.size for media_file in orphans)
+            if self.dry_run:
+                for media_file in orphans:
+                    self.stdout.write(f'  сирота: {media_file.name}')
+                continue
+            MediaFile.objects.bulk_update(changed, ['refcount'])
+            for media_file in orphans:
+                media_storage.purge(media_file.name)
+                # Варианты общие для всех объектов с этим исходником (core.images)
+                delete_source_variants(media_file.name)
+
+        self.remove_stale_temp_files(cutoff)
+        self.stdout.write(
+            f'Проверено файлов: {checked}, удалено: {removed} ({freed / 1024 / 1024:.1f} МБ) '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
+
+    def collect_content_references(self):
+        """Файлы, на которые ссылается HTML статей (изображения TinyMCE)"""
+        pattern = re.compile(re.escape(media_storage.base_url) + r'([^"\'\s<>)?#]+)')
+        references = Counter()
+        PostTranslation = Post._parler_meta.root_model
+        contents = PostTranslation.objects.filter(content__contains=media_storage.base_url)
+        for content in contents.values_list('content', flat=True).iterator(chunk_size=500):
+            references.update(pattern.findall(content))
+        return references
+
+    def count_references(self, names):
+        references = Counter({name: self.content_references[name] for name in names})
+        for model, field_name in self.file_fields:
+            references.update(
+                model._default_manager.filter(**{f'{field_name}__in': names})
+                .values_list(field_name, flat=True)
+            )
+        return references
+
+    def remove_stale_temp_files(self, cutoff):
+        temp_directory = media_storage.path(TEMP_DIRECTORY)
+        if self.dry_run or not os.path.isdir(temp_directory):
+            return
+        for entry in os.scandir(temp_directory):
+            if entry.stat().st_mtime < cutoff.timestamp():
+                os.remove(entry.path)
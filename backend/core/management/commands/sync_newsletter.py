@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.newsletter import sync_pending_subscribers
+
+
+class Command(BaseCommand):
+    help = 'Передаёт новых подписчиков рассылки в адресную книгу SendPulse'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Работать постоянно, синхронизируя раз в --interval секунд',
+        )
+        parser.add_argument('--interval', type=int, default=settings.NEWSLETTER_SYNC_INTERVAL)
+
+    def handle(self, *args, **options):
+        while True:
+            synced, failed = sync_pending_subscribers()
+            self.stdout.write(f'Передано подписчиков: {synced}, с ошибкой: {failed}')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.middleware.locale import LocaleMiddleware as DjangoLocaleMiddleware
+from django.utils import translation
+
+LANGUAGE_QUERY_PARAMETER = 'lang'
+
+
+def language_url(url, language_code):
+    """Адрес страницы на языке language_code (язык по умолчанию — без параметра)"""
+    if language_code == settings.LANGUAGE_CODE:
+        return url
+    separator = '&' if '?' in url else '?'
+    return f'{url}{separator}{LANGUAGE_QUERY_PARAMETER}={language_code}'
+
+
+class LocaleMiddleware(DjangoLocaleMiddleware):
+    """LocaleMiddleware, который понимает ``?lang=<код>`` — отдельные адреса языков для hreflang"""
+
+    def process_request(self, request):
+        language = request.GET.get(LANGUAGE_QUERY_PARAMETER)
+        if language in dict(settings.LANGUAGES):
+            translation.activate(language)
+            request.LANGUAGE_CODE = translation.get_language()
+            return
+        super().process_request(request)
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_mediafile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="newslettersubscriber",
+            name="synced_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Передан в SendPulse"
+            ),
+        ),
+    ]
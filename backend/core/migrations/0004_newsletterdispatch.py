@@ -0,0 +1,76 @@
+# Generated by Django 4.2.30 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_newslettersubscriber_synced_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NewsletterDispatch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("subject", models.CharField(max_length=255, verbose_name="Тема")),
+                (
+                    "language",
+                    models.CharField(
+                        choices=[("ru", "Russian"), ("en", "English")],
+                        default="ru",
+                        max_length=10,
+                        verbose_name="Язык",
+                    ),
+                ),
+                ("since", models.DateTimeField(verbose_name="Статьи с")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("running", "Отправляется"), ("done", "Завершена")],
+                        default="running",
+                        max_length=10,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "last_email",
+                    models.EmailField(
+                        blank=True, max_length=254, verbose_name="Последний адрес"
+                    ),
+                ),
+                (
+                    "sent_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Отправлено"),
+                ),
+                (
+                    "failed_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Ошибок"),
+                ),
+                (
+                    "started_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Начата"),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Завершена"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Рассылка",
+                "verbose_name_plural": "Рассылки",
+                "ordering": ["-started_at"],
+            },
+        ),
+    ]
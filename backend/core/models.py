@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 
@@ -7,10 +8,73 @@ class NewsletterSubscriber(models.Model):
     email = models.EmailField('Email', unique=True)
     is_active = models.BooleanField('Активен', default=True)
     created_at = models.DateTimeField('Подписан', auto_now_add=True)
+    synced_at = models.DateTimeField('Передан в SendPulse', blank=True, null=True)
     
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
     
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+
+class MediaFile(models.Model):
+    """Файл в хранилище с адресацией по содержимому (core.storage)"""
+    
+    name = models.CharField('Путь', max_length=255, unique=True)
+    sha256 = models.CharField('SHA-256', max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField('Размер', default=0)
+    refcount = models.PositiveIntegerField('Ссылок', default=1)
+    created_at = models.DateTimeField('Создан', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+    
+    def __str__(self):
+        return self.name
+
+
+class NewsletterDispatch(models.Model):
+    """Рассылка дайджеста и её прогресс (core.digest)"""
+    
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_CHOICES = [
+        (STATUS_RUNNING, 'Отправляется'),
+        (STATUS_DONE, 'Завершена'),
+    ]
+    
+    subject = models.CharField('Тема', max_length=255)
+    language = models.CharField('Язык', max_length=10, choices=settings.LANGUAGES, default=settings.LANGUAGE_CODE)
+    since = models.DateTimeField('Статьи с')
+    status = models.CharField('Статус', max_length=10, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    # Адреса идут по алфавиту: всё до last_email включительно уже обработано
+    last_email = models.EmailField('Последний адрес', blank=True)
+    sent_count = models.PositiveIntegerField('Отправлено', default=0)
+    failed_count = models.PositiveIntegerField('Ошибок', default=0)
+    started_at = models.DateTimeField('Начата', auto_now_add=True)
+    finished_at = models.DateTimeField('Завершена', blank=True, null=True)
+    
+    class Meta:
+        verbose_name = 'Рассылка'
+        verbose_name_plural = 'Рассылки'
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f'{self.subject} ({self.get_status_display()})'
+
+
+class Checkpoint(models.Model):
+    """Позиция долгой команды, с которой она продолжит после остановки"""
+    
+    name = models.CharField('Команда', max_length=100, unique=True)
+    position = models.BigIntegerField('Позиция', default=0)
+    updated_at = models.DateTimeField('Обновлена', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Позиция команды'
+        verbose_name_plural = 'Позиции команд'
+    
+    def __str__(self):
+        return f'{self.name}: {self.position}'
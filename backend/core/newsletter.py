@@ -0,0 +1,80 @@
+"""Подписка на рассылку.
+
+Запрос подписки только пишет адрес в NewsletterSubscriber (без ошибки на
+повтор — INSERT ... ON CONFLICT DO NOTHING) и кладёт его в множество
+ожидающих синхронизации. Во внешний API запрос не ходит.
+
+Команда ``sync_newsletter`` пачками добавляет ожидающие адреса в адресную
+книгу SendPulse; неудачные пачки возвращаются в очередь.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import add_to_set, pop_set
+from .models import NewsletterSubscriber
+from .sendpulse import SendPulseError, get_sendpulse_client
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = 'newsletter:pending'
+SYNC_BATCH_SIZE = 100
+SYNC_CONCURRENCY = 4
+
+
+async def asubscribe(email):
+    """Сохраняет подписчика и ставит адрес в очередь синхронизации"""
+    await NewsletterSubscriber.objects.abulk_create(
+        [NewsletterSubscriber(email=email)], ignore_conflicts=True
+    )
+    await sync_to_async(add_to_set)(PENDING_KEY, email)
+
+
+async def push_emails(emails, batch_size=SYNC_BATCH_SIZE, concurrency=SYNC_CONCURRENCY):
+    """Отправляет адреса в SendPulse пачками, возвращает (успешные, неудачные)"""
+    batches = [emails[start:start + batch_size] for start in range(0, len(emails), batch_size)]
+    semaphore = asyncio.Semaphore(concurrency)
+    synced, failed = [], []
+
+    async with get_sendpulse_client(max_connections=concurrency) as client:
+        async def push(batch):
+            async with semaphore:
+                try:
+                    await client.add_emails(settings.SENDPULSE_ADDRESS_BOOK_ID, batch)
+                except SendPulseError:
+                    logger.exception('Не удалось передать %s адресов в SendPulse', len(batch))
+                    failed.extend(batch)
+                else:
+                    synced.extend(batch)
+
+        await asyncio.gather(*(push(batch) for batch in batches))
+    return synced, failed
+
+
+def sync_pending_subscribers():
+    """Синхронизирует очередь с SendPulse, возвращает (успешно, с ошибкой)"""
+    emails = set(pop_set(PENDING_KEY))
+    try:
+        # Подстраховка на случай потери очереди: активные, ещё не переданные
+        emails.update(
+            NewsletterSubscriber.objects.filter(is_active=True, synced_at__isnull=True)
+            .values_list('email', flat=True)[:SYNC_BATCH_SIZE * SYNC_CONCURRENCY]
+        )
+        if not emails:
+            return 0, 0
+
+        synced, failed = asyncio.run(push_emails(sorted(emails)))
+        if synced:
+            NewsletterSubscriber.objects.filter(email__in=synced).update(synced_at=timezone.now())
+    except BaseException:
+        # Очередь уже очищена: без возврата адреса пропали бы до следующей
+        # подстраховочной выборки. Повторная передача в SendPulse безвредна.
+        if emails:
+            add_to_set(PENDING_KEY, *emails)
+        raise
+    if failed:
+        add_to_set(PENDING_KEY, *failed)
+    return len(synced), len(failed)
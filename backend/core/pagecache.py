@@ -0,0 +1,130 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+Кэшируются GET-ответы представлений из PAGE_CACHE_VIEWS. Ключ — язык
+(LocaleMiddleware, в том числе ``?lang=``), путь и строка запроса.
+
+* Запросы с cookie сессии или сообщений идут мимо кэша: такие страницы
+  зависят от пользователя.
+* Не сохраняются ответы с Set-Cookie, с ``Cache-Control: private`` или
+  ``no-store`` (например, премиум-статьи под счётчиком paywall) и любые
+  ответы, кроме 200.
+* Значения CSRF-токенов в сохранённой копии стираются. Скрипт в base.html
+  подставляет токен из cookie ``csrftoken``, а если cookie нет — получает
+  его с ``/csrf/``. Поэтому одна и та же страница безопасна для всех.
+* Побочные эффекты представления, которые нужны и при попадании (счётчик
+  просмотров статьи), регистрируются через on_cache_hit() и сохраняются
+  вместе со страницей.
+* У каждого пути своё поколение (core.cache). purge_paths() увеличивает
+  его, и все варианты пути (языки, курсоры пагинации) перестают читаться.
+  Поколение и страница читаются одним get_many.
+
+Блоки, общие для многих страниц (сайдбар, меню), при точечной очистке не
+обновляются сразу — их ограничивает PAGE_CACHE_TIMEOUT.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+from django.utils.translation import get_language
+
+from .cache import bump_generation, generation_key, get_generations
+
+PAGE_KEY = 'page:{}:{}:{}'
+CACHEABLE_METHODS = ('GET', 'HEAD')
+CSRF_INPUT_RE = re.compile(
+    rb'(<input type="hidden" name="csrfmiddlewaretoken" value=")[^"]*(")'
+)
+
+
+def _page_scope(path):
+    return 'page:' + hashlib.md5(path.encode()).hexdigest()
+
+
+def purge_paths(*paths):
+    """Сбрасывает кэш страниц по путям (все языки и строки запроса)"""
+    bump_generation(*{_page_scope(path) for path in paths if path})
+
+
+def on_cache_hit(response, func, *args):
+    """Повторять func(*args) при каждой отдаче этой страницы из кэша"""
+    hooks = getattr(response, 'page_cache_hooks', [])
+    response.page_cache_hooks = [*hooks, (f'{func.__module__}.{func.__qualname__}', args)]
+    return response
+
+
+def is_personalized(request):
+    """Ответ может зависеть от посетителя: есть сессия или flash-сообщения"""
+    return any(name in request.COOKIES for name in (settings.SESSION_COOKIE_NAME, 'messages'))
+
+
+def _stored_headers():
+    # Ключи прокси (core.edge) должны уходить и с копии из кэша
+    return (settings.EDGE_SURROGATE_KEY_HEADER,)
+
+
+def _response_is_cacheable(response):
+    if response.status_code != 200 or response.streaming or response.cookies:
+        return False
+    cache_control = response.get('Cache-Control', '')
+    return 'private' not in cache_control and 'no-store' not in cache_control
+
+
+class AnonymousPageCacheMiddleware:
+    """
+    Ставится после LocaleMiddleware, CsrfViewMiddleware и MessageMiddleware.
+
+    Cookie csrftoken выставляет CsrfViewMiddleware уже снаружи, поэтому
+    в сохраняемый ответ она не попадает.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        entry = getattr(request, '_page_cache_entry', None)
+        if entry is not None and _response_is_cacheable(response):
+            key, generation = entry
+            content = CSRF_INPUT_RE.sub(rb'\1\2', response.content)
+            hooks = getattr(response, 'page_cache_hooks', [])
+            headers = {name: response[name] for name in _stored_headers() if response.has_header(name)}
+            cache.set(
+                key, (generation, content, response['Content-Type'], headers, hooks),
+                settings.PAGE_CACHE_TIMEOUT,
+            )
+            response['X-Page-Cache'] = 'miss'
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in CACHEABLE_METHODS:
+            return None
+        if request.resolver_match.view_name not in settings.PAGE_CACHE_VIEWS:
+            return None
+        if is_personalized(request):
+            return None
+
+        scope = _page_scope(request.path)
+        query = hashlib.md5(request.META.get('QUERY_STRING', '').encode()).hexdigest()
+        key = PAGE_KEY.format(get_language(), scope, query)
+        gen_key = generation_key(scope)
+        found = cache.get_many([key, gen_key])
+
+        generation = found.get(gen_key)
+        if generation is None:
+            generation = get_generations([scope])[scope]
+        cached = found.get(key)
+        if cached is not None and cached[0] == generation:
+            _, content, content_type, headers, hooks = cached
+            for path, args in hooks:
+                import_string(path)(*args)
+            response = HttpResponse(content, content_type=content_type, headers=headers)
+            response['X-Page-Cache'] = 'hit'
+            patch_vary_headers(response, ['Cookie'])
+            return response
+
+        request._page_cache_entry = (key, generation)
+        return None
@@ -0,0 +1,139 @@
+"""Асинхронный клиент SendPulse REST API.
+
+Один ``httpx.AsyncClient`` с пулом соединений на всё время работы
+воркера. Токен OAuth хранится в кэше и обновляется по истечении или
+ответу 401. Временные ошибки (сеть, 429, 5xx, сбой получения токена)
+повторяются с экспоненциальной задержкой и случайным разбросом.
+
+При SENDPULSE_FAKE используется FakeSendPulseClient: он ничего не
+отправляет и запоминает вызовы — для разработки и тестов. Без заглушки и
+без SENDPULSE_API_USER_ID клиент не создаётся: иначе рассылка молча
+отмечала бы адреса переданными.
+"""
+import asyncio
+import logging
+import random
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://api.sendpulse.com'
+TOKEN_CACHE_KEY = 'sendpulse:token'
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SendPulseError(Exception):
+    pass
+
+
+class SendPulseClient:
+    def __init__(self, user_id, secret, max_connections=10):
+        self.user_id = user_id
+        self.secret = secret
+        self.http = httpx.AsyncClient(
+            base_url=API_URL,
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.http.aclose()
+
+    async def _token(self, refresh=False):
+        token = None if refresh else await cache.aget(TOKEN_CACHE_KEY)
+        if token is None:
+            response = await self.http.post('/oauth/access_token', data={
+                'grant_type': 'client_credentials',
+                'client_id': self.user_id,
+                'client_secret': self.secret,
+            })
+            try:
+                response.raise_for_status()
+                payload = response.json()
+                token = payload['access_token']
+            except (httpx.HTTPStatusError, ValueError, KeyError) as error:
+                raise SendPulseError(f'Не удалось получить токен: {error!r}') from error
+            # С запасом, чтобы не отправить запрос с истекающим токеном
+            await cache.aset(TOKEN_CACHE_KEY, token, max(payload.get('expires_in', 3600) - 60, 60))
+        return token
+
+    async def request(self, method, path, **kwargs):
+        refresh = False
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                token = await self._token(refresh=refresh)
+                response = await self.http.request(
+                    method, path, headers={'Authorization': f'Bearer {token}'}, **kwargs
+                )
+            except httpx.TransportError as error:
+                reason = repr(error)
+            except SendPulseError as error:
+                # Ошибка получения токена повторяется как и остальные временные
+                reason = str(error)
+            else:
+                if response.status_code == 401 and not refresh:
+                    refresh = True
+                    continue
+                if response.status_code not in RETRY_STATUSES:
+                    if response.is_error:
+                        raise SendPulseError(f'{response.status_code}: {response.text[:200]}')
+                    return response.json()
+                reason = f'HTTP {response.status_code}'
+            if attempt == MAX_ATTEMPTS:
+                raise SendPulseError(f'{method} {path}: {reason}')
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.5)
+            logger.info('SendPulse %s %s: %s, повтор через %.1f с', method, path, reason, delay)
+            await asyncio.sleep(delay)
+
+    async def add_emails(self, address_book_id, emails):
+        return await self.request(
+            'POST', f'/addressbooks/{address_book_id}/emails',
+            json={'emails': [{'email': email} for email in emails]},
+        )
+
+
+class FakeSendPulseClient:
+    """Ничего не отправляет, сохраняет вызовы в ``calls``"""
+
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def request(self, method, path, **kwargs):
+        self.calls.append((method, path, kwargs))
+        return {'result': True}
+
+    async def add_emails(self, address_book_id, emails):
+        return await self.request(
+            'POST', f'/addressbooks/{address_book_id}/emails',
+            json={'emails': [{'email': email} for email in emails]},
+        )
+
+
+def get_sendpulse_client(**kwargs):
+    if settings.SENDPULSE_FAKE:
+        return FakeSendPulseClient()
+    if not settings.SENDPULSE_API_USER_ID or not settings.SENDPULSE_API_SECRET:
+        raise ImproperlyConfigured(
+            'Не заданы SENDPULSE_API_USER_ID/SENDPULSE_API_SECRET '
+            '(для разработки включите SENDPULSE_FAKE=1)'
+        )
+    return SendPulseClient(settings.SENDPULSE_API_USER_ID, settings.SENDPULSE_API_SECRET, **kwargs)
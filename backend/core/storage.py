@@ -0,0 +1,125 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файл сохраняется как ``<каталог upload_to>/<ab>/<sha256><.ext>``:
+
+* повторная загрузка того же файла в тот же каталог возвращает уже
+  существующий путь — копии на диске нет, миниатюры easy-thumbnails
+  (они привязаны к имени исходника) не создаются заново;
+* тот же файл в другом каталоге (например, фото статьи, загруженное как
+  аватар) создаётся жёсткой ссылкой на уже лежащий файл;
+* учёт ведётся в core.MediaFile: число ссылок увеличивается при каждом
+  сохранении, уменьшается при delete(). Поля моделей Django файлы не
+  удаляют, поэтому реальное число ссылок пересчитывает и удаляет сироты
+  команда ``sweep_media``.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import MediaFile
+
+TEMP_DIRECTORY = '.cas-tmp'
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, digest):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save(), совпадение — это дубликат
+        return name
+
+    def _spool(self, content):
+        """Пишет содержимое во временный файл рядом с хранилищем, считая SHA-256"""
+        digest = hashlib.sha256()
+        if hasattr(content, 'temporary_file_path'):
+            with open(content.temporary_file_path(), 'rb') as source:
+                for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            return content.temporary_file_path(), digest.hexdigest(), False
+
+        temp_directory = self.path(TEMP_DIRECTORY)
+        os.makedirs(temp_directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=temp_directory, delete=False) as temp_file:
+            content.seek(0)
+            for chunk in content.chunks(HASH_CHUNK_SIZE):
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                temp_file.write(chunk)
+        return temp_file.name, digest.hexdigest(), True
+
+    def _link_existing(self, digest, full_path):
+        """Жёсткая ссылка на уже сохранённый файл с тем же содержимым"""
+        for existing in MediaFile.objects.filter(sha256=digest).values_list('name', flat=True)[:3]:
+            try:
+                os.link(self.path(existing), full_path)
+                return True
+            except FileExistsError:
+                return True
+            except OSError:
+                # Нет файла или ФС не поддерживает ссылки — пробуем следующий
+                continue
+        return False
+
+    def _add_reference(self, name, digest, size):
+        try:
+            with transaction.atomic():
+                MediaFile.objects.create(name=name, sha256=digest, size=size)
+        except IntegrityError:
+            MediaFile.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+    def _save(self, name, content):
+        temp_path, digest, is_own_temp = self._spool(content)
+        size = os.path.getsize(temp_path)
+        name = self.content_name(name, digest)
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(full_path) or self._link_existing(digest, full_path):
+            if is_own_temp:
+                os.remove(temp_path)
+        else:
+            file_move_safe(temp_path, full_path, allow_overwrite=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+        self._add_reference(name, digest, size)
+        return name
+
+    def delete(self, name):
+        """Уменьшает число ссылок; файл удаляется, когда ссылок не осталось"""
+        with transaction.atomic():
+            media_file = MediaFile.objects.select_for_update().filter(name=name).first()
+            if media_file is not None and media_file.refcount > 1:
+                MediaFile.objects.filter(pk=media_file.pk).update(refcount=F('refcount') - 1)
+                return
+            if media_file is not None:
+                media_file.delete()
+        super().delete(name)
+
+    def purge(self, name):
+        """Удаляет файл и запись о нём независимо от числа ссылок"""
+        MediaFile.objects.filter(name=name).delete()
+        super().delete(name)
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    """Хранилище для FileField(storage=...) — вызываемый объект для миграций"""
+    return media_storage
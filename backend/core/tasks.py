@@ -0,0 +1,82 @@
+"""Простая очередь фоновых задач.
+
+Задача — функция уровня модуля с JSON-сериализуемыми аргументами:
+``enqueue(generate_thumbnails_for, 'blog.Post', 5, 'image')``.
+
+* Redis (django_redis): задача кладётся в список ``tasks:<queue>``,
+  выполняет её команда ``run_tasks`` в отдельном процессе. Один воркер
+  может разбирать несколько очередей: ``run_tasks --queue default
+  --queue thumbnails`` — порядок задаёт приоритет.
+* LocMemCache: общего хранилища между процессами нет, задача выполняется
+  в пуле потоков текущего процесса.
+"""
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+
+from .cache import get_redis
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = 'default'
+QUEUE_KEY = 'tasks:{}'
+LOCAL_WORKERS = 2
+
+_local_executor = None
+_local_executor_lock = threading.Lock()
+
+
+def _task_path(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def run_task(message):
+    """Выполняет задачу из сообщения очереди"""
+    task = json.loads(message)
+    func = import_string(task['task'])
+    return func(*task['args'])
+
+
+def _run_local(message):
+    try:
+        run_task(message)
+    except Exception:
+        logger.exception('Фоновая задача завершилась с ошибкой: %s', message)
+    finally:
+        close_old_connections()
+
+
+def enqueue(func, *args, queue=DEFAULT_QUEUE):
+    message = json.dumps({'task': _task_path(func), 'args': args})
+    client = get_redis()
+    if client is not None:
+        client.rpush(QUEUE_KEY.format(queue), message)
+        return
+
+    global _local_executor
+    with _local_executor_lock:
+        if _local_executor is None:
+            _local_executor = ThreadPoolExecutor(LOCAL_WORKERS, thread_name_prefix='tasks')
+    _local_executor.submit(_run_local, message)
+
+
+def pop_task(queues=(DEFAULT_QUEUE,), timeout=5):
+    """Следующее сообщение из очередей Redis или None по таймауту.
+
+    BLPOP проверяет очереди по порядку: первая непустая и отдаёт задачу.
+    """
+    if isinstance(queues, str):
+        queues = [queues]
+    item = get_redis().blpop([QUEUE_KEY.format(queue) for queue in queues], timeout=timeout)
+    if item is None:
+        return None
+    return item[1].decode() if isinstance(item[1], bytes) else item[1]
+
+
+def queue_length(queue=DEFAULT_QUEUE):
+    client = get_redis()
+    return client.llen(QUEUE_KEY.format(queue)) if client is not None else 0
@@ -0,0 +1,59 @@
+from django import template
+from django.db.models import Model
+
+from core.cache import get_or_render_fragment, scope_for
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, scopes):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.scopes = scopes
+
+    def _resolve_scopes(self, context):
+        scopes = []
+        for var in self.scopes:
+            value = var.resolve(context)
+            if value is None or value == '':
+                continue
+            scopes.append(scope_for(value) if isinstance(value, Model) else str(value))
+        return scopes
+
+    def render(self, context):
+        timeout = self.timeout.resolve(context)
+        return get_or_render_fragment(
+            self.name,
+            self._resolve_scopes(context),
+            lambda: self.nodelist.render(context),
+            int(timeout) if timeout is not None else None,
+        )
+
+
+@register.tag('fragment_cache')
+def do_fragment_cache(parser, token):
+    """
+    Кэширует фрагмент с версией по областям-зависимостям.
+
+    Использование::
+
+        {% load fragment_cache %}
+        {% fragment_cache 3600 home_latest 'posts' %}...{% endfragment_cache %}
+        {% fragment_cache 3600 post_related post post.category %}...{% endfragment_cache %}
+
+    Экземпляр модели превращается в область ``<model_name>:<pk>``, строка
+    используется как есть. Язык учитывается автоматически.
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f'{bits[0]!r} tag requires at least 2 arguments.')
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2].strip('\'"'),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,21 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def query_replace(context, **params):
+    """
+    Строка запроса текущей страницы с заменёнными параметрами.
+
+    ``{% query_replace cursor=page.next_cursor %}`` — остальные параметры
+    (``q``, ``lang`` и т. п.) сохраняются; пустое значение убирает параметр.
+    """
+    query = context['request'].GET.copy()
+    for name, value in params.items():
+        if value in (None, ''):
+            query.pop(name, None)
+        else:
+            query[name] = value
+    encoded = query.urlencode()
+    return f'?{encoded}' if encoded else '?'
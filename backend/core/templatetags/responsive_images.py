@@ -0,0 +1,38 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+
+from core.images import MIME_TYPES, manifest_is_current
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/responsive_image.html')
+def responsive_image(image, manifest=None, alt='', css_class='', sizes='100vw', lazy=True, placeholder=None):
+    """
+    <picture> с srcset из манифеста вариантов (core.images).
+
+    URL строятся через storage.url() — файловая система не читается.
+    Пока варианты не готовы, выводится оригинал.
+    """
+    sources = []
+    if manifest_is_current(manifest, image):
+        # Браузер берёт первый подходящий <source>, а jsonb не хранит порядок
+        # ключей: форматы идут в порядке предпочтения из настроек
+        preference = {image_format: index for index, image_format in enumerate(settings.IMAGE_VARIANT_FORMATS)}
+        formats = sorted(manifest['formats'].items(), key=lambda item: preference.get(item[0], len(preference)))
+        for image_format, variants in formats:
+            sources.append({
+                'type': MIME_TYPES.get(image_format, f'image/{image_format}'),
+                'srcset': ', '.join(f'{default_storage.url(name)} {width}w' for width, name in variants),
+            })
+    return {
+        'src': image.url if image else '',
+        'sources': sources,
+        'sizes': sizes,
+        'alt': alt,
+        'css_class': css_class,
+        'lazy': lazy,
+        'placeholder': placeholder or static('images/img-fallback.png'),
+    }
@@ -0,0 +1,722 @@
+import asyncio
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+import httpx
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import OutputWrapper
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from PIL import Image
+
+from accounts.models import User
+from blog.models import Category, Post
+from blog.sitemaps import build_all
+
+from . import digest, edge, images, newsletter, sendpulse, tasks
+from .cache import add_to_set, pop_set, set_members
+from .management.commands.edge_purge_stub import make_stub_server
+from .models import Checkpoint, MediaFile, NewsletterDispatch, NewsletterSubscriber
+from .pagecache import AnonymousPageCacheMiddleware
+from .sendpulse import (
+    FakeSendPulseClient,
+    SendPulseClient,
+    SendPulseError,
+    get_sendpulse_client,
+)
+from .storage import media_storage
+
+
+def create_archive(categories_count, posts_per_category, author=None):
+    """Рубрики с опубликованными статьями, переводы на ru и en"""
+    now = timezone.now()
+    for index in range(categories_count):
+        category = Category(slug=f'category-{index}', order=index)
+        category.set_current_language('ru')
+        category.name = f'Рубрика {index}'
+        category.set_current_language('en')
+        category.name = f'Category {index}'
+        category.save()
+        for number in range(posts_per_category):
+            post = Post(
+                slug=f'post-{index}-{number}',
+                author=author,
+                category=category,
+                status=Post.STATUS_PUBLISHED,
+                published_at=now - timedelta(hours=index * posts_per_category + number),
+                is_featured=number == 0,
+            )
+            post.set_current_language('ru')
+            post.title = f'Статья {index}-{number}'
+            post.content = 'Текст'
+            post.set_current_language('en')
+            post.title = f'Post {index}-{number}'
+            post.content = 'Text'
+            post.save()
+
+
+class TaskRecorder:
+    """Замена пула потоков core.tasks: задачи не выполняются, а записываются.
+
+    Пул выполнил бы их в другом потоке и другом соединении с тестовой БД.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def submit(self, func, message):
+        self.messages.append(message)
+
+    def calls(self, func):
+        path = tasks._task_path(func)
+        return [
+            tuple(task['args']) for task in map(json.loads, self.messages)
+            if task['task'] == path
+        ]
+
+    def run(self, func):
+        """Выполняет записанные задачи func в потоке теста"""
+        path = tasks._task_path(func)
+        pending, self.messages = self.messages, []
+        for message in pending:
+            if json.loads(message)['task'] == path:
+                tasks.run_task(message)
+            else:
+                self.messages.append(message)
+
+
+def record_tasks():
+    """``with record_tasks() as recorder:`` — фоновые задачи записываются, а не выполняются"""
+    return mock.patch.object(tasks, '_local_executor', TaskRecorder())
+
+
+# Подстраховка отложенной публикации раз в интервал добавляет запрос — здесь она не нужна
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'], SCHEDULED_PUBLISH_FALLBACK_DELAY=None,
+)
+class HomepageQueryCountTests(TestCase):
+    """Главная читает БД фиксированным числом запросов при любом размере архива"""
+
+    HOMEPAGE_QUERIES = 5
+
+    def setUp(self):
+        self.author = User.objects.create_user('author@example.com', first_name='Автор')
+
+    def get_home(self):
+        # Кэш страниц и фрагментов пуст — считаются запросы полной сборки
+        cache.clear()
+        with self.assertNumQueries(self.HOMEPAGE_QUERIES):
+            response = self.client.get(reverse('core:home'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_small_archive(self):
+        create_archive(2, 3, self.author)
+        response = self.get_home()
+        self.assertContains(response, 'Статья 0-0')
+
+    def test_large_archive(self):
+        create_archive(12, 15, self.author)
+        response = self.get_home()
+        self.assertContains(response, 'Статья 11-0')
+
+
+class PregenerateThumbnailsTests(TestCase):
+    """Обход продолжается с сохранённой в БД позиции"""
+
+    def setUp(self):
+        create_archive(1, 3)
+        Post.objects.update(image='posts/photo.jpg')
+        self.pks = sorted(Post.objects.values_list('pk', flat=True))
+
+    def run_command(self, *args):
+        with mock.patch(
+            'core.management.commands.pregenerate_thumbnails.generate_thumbnails_for', return_value=1,
+        ) as generate:
+            call_command(
+                'pregenerate_thumbnails', '--model', 'blog.Post', '--workers', '1', *args, stdout=StringIO(),
+            )
+        return [call.args[1] for call in generate.call_args_list]
+
+    def test_resume_and_restart(self):
+        self.assertEqual(self.run_command(), self.pks)
+        self.assertEqual(Checkpoint.objects.get(name='thumbnails:backfill:blog.Post').position, self.pks[-1])
+        # Кэш не участвует: позиция переживает его очистку
+        cache.clear()
+        self.assertEqual(self.run_command(), [])
+        self.assertEqual(self.run_command('--restart'), self.pks)
+
+
+class GetSendPulseClientTests(TestCase):
+    """Заглушка включается только явно, без ключей API — ошибка"""
+
+    @override_settings(SENDPULSE_FAKE=False, SENDPULSE_API_USER_ID='', SENDPULSE_API_SECRET='')
+    def test_missing_credentials(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_sendpulse_client()
+
+    @override_settings(SENDPULSE_FAKE=True, SENDPULSE_API_USER_ID='', SENDPULSE_API_SECRET='')
+    def test_fake_opt_in(self):
+        self.assertIsInstance(get_sendpulse_client(), FakeSendPulseClient)
+
+    @override_settings(SENDPULSE_FAKE=False, SENDPULSE_API_USER_ID='user', SENDPULSE_API_SECRET='secret')
+    def test_real_client(self):
+        client = get_sendpulse_client(max_connections=2)
+        self.assertIsInstance(client, SendPulseClient)
+        asyncio.run(client.http.aclose())
+
+
+class SendPulseClientRetryTests(TestCase):
+    """Временные ошибки повторяются с экспоненциальной задержкой, остальные — нет"""
+
+    def setUp(self):
+        cache.delete(sendpulse.TOKEN_CACHE_KEY)
+        self.statuses = []
+        self.requests = []
+
+    def handler(self, request):
+        if request.url.path == '/oauth/access_token':
+            return httpx.Response(200, json={'access_token': 'token', 'expires_in': 3600})
+        self.requests.append(request)
+        status = self.statuses.pop(0) if self.statuses else 200
+        return httpx.Response(status, json={'result': status == 200})
+
+    def add_emails(self, *statuses):
+        self.statuses = list(statuses)
+
+        async def run():
+            async with SendPulseClient('user', 'secret') as client:
+                client.http = httpx.AsyncClient(
+                    base_url=sendpulse.API_URL, transport=httpx.MockTransport(self.handler),
+                )
+                return await client.add_emails('book', ['a@example.com'])
+
+        with mock.patch.object(sendpulse.random, 'uniform', return_value=1), \
+                mock.patch.object(sendpulse.asyncio, 'sleep', new=mock.AsyncMock()) as sleep:
+            try:
+                return asyncio.run(run())
+            finally:
+                self.delays = [call.args[0] for call in sleep.await_args_list]
+
+    def test_retries_with_backoff(self):
+        self.assertEqual(self.add_emails(503, 429, 200), {'result': True})
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.delays, [sendpulse.BACKOFF_BASE, sendpulse.BACKOFF_BASE * 2])
+        self.assertEqual(self.requests[0].headers['Authorization'], 'Bearer token')
+
+    def test_gives_up_after_max_attempts(self):
+        with self.assertRaises(SendPulseError):
+            self.add_emails(*[500] * sendpulse.MAX_ATTEMPTS)
+        self.assertEqual(len(self.requests), sendpulse.MAX_ATTEMPTS)
+        self.assertEqual(len(self.delays), sendpulse.MAX_ATTEMPTS - 1)
+
+    def test_client_error_is_not_retried(self):
+        with self.assertRaises(SendPulseError):
+            self.add_emails(400)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.delays, [])
+
+
+class FailingSendPulseClient(FakeSendPulseClient):
+    """Заглушка, которая бросает ``error`` на каждый запрос"""
+
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    async def request(self, method, path, **kwargs):
+        await super().request(method, path, **kwargs)
+        raise self.error
+
+
+@override_settings(SENDPULSE_FAKE=True, SENDPULSE_ADDRESS_BOOK_ID='book')
+class NewsletterSyncTests(TestCase):
+    """Пачки, возврат неудачных адресов в очередь и восстановление очереди при сбое"""
+
+    def setUp(self):
+        pop_set(newsletter.PENDING_KEY)
+        self.emails = [f'reader{index}@example.com' for index in range(5)]
+        for email in self.emails:
+            NewsletterSubscriber.objects.create(email=email)
+        add_to_set(newsletter.PENDING_KEY, *self.emails)
+
+    def sync(self, client):
+        with mock.patch.object(newsletter, 'get_sendpulse_client', return_value=client):
+            return newsletter.sync_pending_subscribers()
+
+    def synced_emails(self):
+        return set(
+            NewsletterSubscriber.objects.filter(synced_at__isnull=False).values_list('email', flat=True)
+        )
+
+    def test_batches(self):
+        client = FakeSendPulseClient()
+        emails = [f'batch{index}@example.com' for index in range(5)]
+        with mock.patch.object(newsletter, 'get_sendpulse_client', return_value=client):
+            synced, failed = asyncio.run(newsletter.push_emails(emails, batch_size=2, concurrency=2))
+        self.assertEqual(sorted(synced), emails)
+        self.assertEqual(failed, [])
+        batches = [[item['email'] for item in kwargs['json']['emails']] for _, _, kwargs in client.calls]
+        self.assertEqual(sorted(map(len, batches)), [1, 2, 2])
+        self.assertEqual(sorted(sum(batches, [])), emails)
+        self.assertTrue(all(path == '/addressbooks/book/emails' for _, path, _ in client.calls))
+
+    def test_sync_marks_subscribers(self):
+        client = FakeSendPulseClient()
+        self.assertEqual(self.sync(client), (5, 0))
+        self.assertEqual(self.synced_emails(), set(self.emails))
+        self.assertEqual(set_members(newsletter.PENDING_KEY), set())
+        # Уже переданные адреса подстраховочная выборка не подхватывает
+        self.assertEqual(self.sync(FakeSendPulseClient()), (0, 0))
+
+    def test_failed_batch_is_requeued(self):
+        client = FailingSendPulseClient(SendPulseError('HTTP 503'))
+        with self.assertLogs('core.newsletter', 'ERROR'):
+            self.assertEqual(self.sync(client), (0, 5))
+        self.assertEqual(self.synced_emails(), set())
+        self.assertEqual(set_members(newsletter.PENDING_KEY), set(self.emails))
+
+        self.assertEqual(self.sync(FakeSendPulseClient()), (5, 0))
+        self.assertEqual(self.synced_emails(), set(self.emails))
+
+    def test_abort_restores_queue(self):
+        # Сбой не из SendPulse прерывает синхронизацию целиком
+        NewsletterSubscriber.objects.filter(email=self.emails[0]).update(is_active=False)
+        with self.assertRaises(RuntimeError):
+            self.sync(FailingSendPulseClient(RuntimeError('boom')))
+        self.assertEqual(self.synced_emails(), set())
+        self.assertEqual(set_members(newsletter.PENDING_KEY), set(self.emails))
+
+    @override_settings(SENDPULSE_FAKE=False, SENDPULSE_API_USER_ID='', SENDPULSE_API_SECRET='')
+    def test_misconfigured_client_fails_loudly(self):
+        with self.assertRaises(ImproperlyConfigured):
+            newsletter.sync_pending_subscribers()
+        self.assertEqual(self.synced_emails(), set())
+        self.assertEqual(set_members(newsletter.PENDING_KEY), set(self.emails))
+
+
+@override_settings(ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'])
+class AnonymousPageCacheTests(TestCase):
+    """Кэш страниц для анонимов: попадание без запросов, обход, CSRF, что не сохраняется"""
+
+    FORM = b'<form><input type="hidden" name="csrfmiddlewaretoken" value="secret-token"></form>'
+
+    def setUp(self):
+        cache.clear()
+
+    def serve(self, view, **cookies):
+        """Проход через middleware так, как его вызывает Django, для view под именем blog:post_list"""
+        request = RequestFactory().get('/page/')
+        request.COOKIES.update(cookies)
+        request.resolver_match = ResolverMatch(view, (), {}, url_name='post_list', namespaces=['blog'])
+        middleware = AnonymousPageCacheMiddleware(
+            lambda request: middleware.process_view(request, view, (), {}) or view(request)
+        )
+        return middleware(request)
+
+    def test_hit_without_queries(self):
+        create_archive(1, 2)
+        url = reverse('blog:post_list')
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Статья 0-0')
+
+    def test_personalized_requests_bypass(self):
+        view = mock.Mock(side_effect=lambda request: HttpResponse(self.FORM))
+        self.assertEqual(self.serve(view)['X-Page-Cache'], 'miss')
+        for cookie in (settings.SESSION_COOKIE_NAME, 'messages'):
+            response = self.serve(view, **{cookie: 'x'})
+            self.assertNotIn('X-Page-Cache', response)
+        self.assertEqual(view.call_count, 3)
+        self.assertEqual(self.serve(view)['X-Page-Cache'], 'hit')
+
+    def test_csrf_token_is_blanked(self):
+        response = self.serve(lambda request: HttpResponse(self.FORM))
+        # Посетителю, на чьём запросе страница сохранена, токен отдаётся
+        self.assertIn(b'secret-token', response.content)
+        response = self.serve(lambda request: HttpResponse())
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertEqual(
+            response.content, b'<form><input type="hidden" name="csrfmiddlewaretoken" value=""></form>',
+        )
+
+    def test_private_responses_are_not_stored(self):
+        def with_cookie(request):
+            response = HttpResponse(self.FORM)
+            response.set_cookie('choice', '1')
+            return response
+
+        def private(request):
+            response = HttpResponse(self.FORM)
+            patch_cache_control(response, private=True)
+            return response
+
+        for view in (with_cookie, private):
+            self.serve(view)
+            response = self.serve(view)
+            self.assertNotIn('X-Page-Cache', response)
+            self.assertEqual(response.cookies.keys(), {'choice'} if view is with_cookie else set())
+
+
+@override_settings(ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'])
+class SurrogateKeyTests(TestCase):
+    """Ленты, поиск, sitemap, JSON комментариев и /csrf/ помечены ключами прокси"""
+
+    def setUp(self):
+        create_archive(1, 2)
+        self.post = Post.objects.get(slug='post-0-0')
+
+    def assertKeys(self, response, *keys):
+        self.assertEqual(response['Surrogate-Key'].split(), list(keys))
+
+    def test_feed(self):
+        response = self.client.get(reverse('blog:latest_feed', kwargs={'feed_format': 'rss'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertKeys(response, 'feeds')
+        self.assertIn('Surrogate-Control', response)
+        not_modified = self.client.get(
+            reverse('blog:latest_feed', kwargs={'feed_format': 'rss'}), HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertKeys(not_modified, 'feeds')
+
+    def test_search(self):
+        response = self.client.get(reverse('blog:search'))
+        self.assertKeys(response, 'posts', 'sidebar')
+
+    def test_comments(self):
+        response = self.client.get(reverse('blog:comments', kwargs={'slug': self.post.slug}))
+        self.assertKeys(response, f'post-{self.post.pk}')
+
+    def test_csrf(self):
+        response = self.client.get(reverse('core:csrf_token'))
+        self.assertKeys(response, 'csrf')
+        # Ответ с cookie и no-store прокси не кэширует
+        self.assertNotIn('Surrogate-Control', response)
+
+    def test_sitemap(self):
+        with tempfile.TemporaryDirectory() as root, \
+                override_settings(SITEMAP_ROOT=root, EDGE_PURGE_URL='http://edge.invalid/purge'), \
+                record_tasks() as recorder:
+            pop_set(edge.PENDING_KEY)
+            build_all()
+            # Пересборка файлов сбрасывает их на прокси
+            self.assertEqual(set_members(edge.PENDING_KEY), {'sitemaps'})
+            self.assertEqual(recorder.calls(edge.flush_purge_queue), [()])
+            response = self.client.get(reverse('core:sitemap_index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertKeys(response, 'sitemaps')
+
+
+@override_settings(EDGE_PURGE_BATCH_SIZE=2, EDGE_PURGE_TOKEN='')
+class EdgePurgeTests(TestCase):
+    """Ключи копятся в очереди и уходят заглушке прокси пачками"""
+
+    def start_stub(self, status=200):
+        self.stub_output = StringIO()
+        server = make_stub_server('127.0.0.1', 0, status, OutputWrapper(self.stub_output))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f'http://127.0.0.1:{server.server_address[1]}/purge'
+        settings_override = override_settings(EDGE_PURGE_URL=url)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        pop_set(edge.PENDING_KEY)
+
+    def received(self):
+        return self.stub_output.getvalue().splitlines()
+
+    def test_batched_purge(self):
+        self.start_stub()
+        with record_tasks() as recorder:
+            edge.purge_keys('post-1', 'home', 'sidebar')
+            edge.purge_keys('post-2', 'home', 'posts', '')
+            self.assertEqual(set_members(edge.PENDING_KEY), {'post-1', 'post-2', 'home', 'posts', 'sidebar'})
+            # Первая задача забирает всю очередь, вторая находит её пустой
+            recorder.run(edge.flush_purge_queue)
+        self.assertEqual(self.received(), [
+            '/purge: 2 — home post-1',
+            '/purge: 2 — post-2 posts',
+            '/purge: 1 — sidebar',
+        ])
+        self.assertEqual(set_members(edge.PENDING_KEY), set())
+
+    def test_failed_purge_is_requeued(self):
+        self.start_stub(status=503)
+        edge.add_to_set(edge.PENDING_KEY, 'post-1', 'home', 'sidebar')
+        with mock.patch.object(edge.time, 'sleep'), self.assertLogs('core.edge', 'ERROR'):
+            with self.assertRaises(edge.EdgePurgeError):
+                edge.flush_purge_queue()
+        # Первая пачка повторена MAX_ATTEMPTS раз, все ключи вернулись в очередь
+        self.assertEqual(self.received(), ['/purge: 2 — home post-1'] * edge.MAX_ATTEMPTS)
+        self.assertEqual(set_members(edge.PENDING_KEY), {'post-1', 'home', 'sidebar'})
+
+    def test_disabled_without_url(self):
+        pop_set(edge.PENDING_KEY)
+        with override_settings(EDGE_PURGE_URL=''), record_tasks() as recorder:
+            edge.purge_keys('post-1')
+        self.assertEqual(set_members(edge.PENDING_KEY), set())
+        self.assertEqual(recorder.calls(edge.flush_purge_queue), [])
+
+
+def make_image(width, height, image_format='JPEG', color=(200, 80, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class MediaRootMixin:
+    """MEDIA_ROOT во временном каталоге на время теста"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root.name
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=[320, 640, 1200], IMAGE_VARIANT_FORMATS=['webp', 'jpeg'], MAX_IMAGE_WIDTH=1200)
+class ImageVariantsTests(MediaRootMixin, TestCase):
+    """Варианты для srcset: ширины не больше оригинала, общий исходник — общие варианты"""
+
+    def setUp(self):
+        super().setUp()
+        create_archive(1, 2)
+        self.posts = list(Post.objects.order_by('pk'))
+        self.source = media_storage.save('posts/photo.jpg', ContentFile(make_image(1000, 500)))
+
+    def generate(self, post):
+        images.generate_image_variants('blog.Post', post.pk, 'image', 'image_variants')
+        post.refresh_from_db()
+        return post.image_variants
+
+    def test_build_variants(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(image=self.source)
+        manifest = self.generate(self.posts[0])
+        self.assertEqual(manifest['source'], self.source)
+        self.assertEqual((manifest['width'], manifest['height']), (1000, 500))
+        self.assertEqual(set(manifest['formats']), {'webp', 'jpeg'})
+        for variants in manifest['formats'].values():
+            # 1200 шире оригинала — вместо неё ширина самого оригинала
+            self.assertEqual([width for width, _ in variants], [320, 640, 1000])
+            for width, name in variants:
+                with default_storage.open(name) as variant, Image.open(variant) as image:
+                    self.assertEqual(image.size, (width, width // 2))
+
+    def test_shared_source(self):
+        Post.objects.update(image=self.source)
+        manifest = self.generate(self.posts[0])
+        with mock.patch.object(images, 'build_variants') as build:
+            self.assertEqual(self.generate(self.posts[1]), manifest)
+        build.assert_not_called()
+
+    def test_replaced_source(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(image=self.source)
+        old_manifest = self.generate(self.posts[0])
+        other = media_storage.save('posts/other.jpg', ContentFile(make_image(400, 400, color=(0, 0, 0))))
+        Post.objects.filter(pk=self.posts[0].pk).update(image=other)
+        manifest = self.generate(self.posts[0])
+        self.assertEqual(manifest['source'], other)
+        # Старый исходник больше никому не нужен — его варианты удалены
+        for _, name in old_manifest['formats']['webp']:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_template_tag(self):
+        Post.objects.filter(pk=self.posts[0].pk).update(image=self.source)
+        post = self.posts[0]
+        self.generate(post)
+        template = Template(
+            '{% load responsive_images %}'
+            '{% responsive_image post.image post.image_variants lazy=False sizes="50vw" %}'
+        )
+        with mock.patch.object(default_storage, 'exists', side_effect=AssertionError('ФС не читается')):
+            html = template.render(Context({'post': post}))
+        webp = ', '.join(
+            f'{default_storage.url(name)} {width}w' for width, name in post.image_variants['formats']['webp']
+        )
+        self.assertIn(f'<source type="image/webp" srcset="{webp}" sizes="50vw">', html)
+        # Порядок <source> — из IMAGE_VARIANT_FORMATS, а не из JSON манифеста
+        self.assertLess(html.index('image/webp'), html.index('image/jpeg'))
+        self.assertIn(f'src="{post.image.url}"', html)
+
+
+@override_settings(
+    ROOT_URLCONF='milanweek.test_urls', ALLOWED_HOSTS=['testserver'],
+    MAX_IMAGE_SIZE=64 * 1024, MAX_IMAGE_WIDTH=600, MAX_IMAGE_HEIGHT=600,
+)
+class TinyMCEUploadTests(MediaRootMixin, TestCase):
+    """Загрузка из редактора: предел размера, формат по содержимому, повтор по SHA-256"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client.force_login(User.objects.create_user('editor@example.com', is_staff=True))
+
+    def upload(self, data, name='photo.jpg'):
+        return self.client.post(reverse('core:tinymce_upload'), {'file': SimpleUploadedFile(name, data)})
+
+    def stored_image(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        location = response.json()['location']
+        self.assertTrue(location.startswith(settings.MEDIA_URL))
+        return Image.open(media_storage.path(location[len(settings.MEDIA_URL):]))
+
+    def test_downscale(self):
+        with self.stored_image(self.upload(make_image(1200, 300))) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (600, 150)))
+
+    def test_size_limit(self):
+        noise = Image.frombytes('RGB', (200, 200), os.urandom(200 * 200 * 3))
+        buffer = io.BytesIO()
+        noise.save(buffer, format='PNG')
+        self.assertGreater(len(buffer.getvalue()), settings.MAX_IMAGE_SIZE)
+        response = self.upload(buffer.getvalue(), 'noise.png')
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_format_sniffing(self):
+        # Расширение берётся из содержимого, а не из имени
+        response = self.upload(make_image(100, 100, 'PNG'), 'photo.jpg')
+        with self.stored_image(response) as image:
+            self.assertEqual(image.format, 'PNG')
+        self.assertTrue(response.json()['location'].endswith('.png'))
+
+        response = self.upload(b'<?php echo 1; ?>', 'shell.jpg')
+        self.assertEqual(response.status_code, 400)
+        response = self.upload(make_image(10, 10, 'BMP'), 'image.png')
+        self.assertEqual(response.status_code, 400)
+
+    def test_repeat_upload(self):
+        data = make_image(800, 800)
+        first = self.upload(data, 'first.jpg')
+        with mock.patch('core.uploads.downscale_image') as downscale:
+            second = self.upload(data, 'second.jpg')
+        downscale.assert_not_called()
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(MediaFile.objects.count(), 1)
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    """Имя по SHA-256: повтор — та же запись, другой каталог — жёсткая ссылка, удаление по счётчику"""
+
+    def save(self, name, data):
+        return media_storage.save(name, ContentFile(data))
+
+    def test_duplicate_in_same_directory(self):
+        data = make_image(50, 50)
+        digest = hashlib.sha256(data).hexdigest()
+        name = self.save('posts/a.jpg', data)
+        self.assertEqual(name, f'posts/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(self.save('posts/b.JPG', data), name)
+        self.assertEqual(MediaFile.objects.get().refcount, 2)
+        self.assertNotEqual(self.save('posts/c.jpg', make_image(50, 50, color=(0, 0, 0))), name)
+
+    def test_hardlink_across_directories(self):
+        data = make_image(50, 50)
+        post_image = self.save('posts/photo.jpg', data)
+        avatar = self.save('avatars/photo.jpg', data)
+        self.assertNotEqual(avatar, post_image)
+        self.assertEqual(os.stat(media_storage.path(avatar)).st_ino, os.stat(media_storage.path(post_image)).st_ino)
+        self.assertEqual(MediaFile.objects.filter(sha256=hashlib.sha256(data).hexdigest()).count(), 2)
+
+    def test_delete_by_refcount(self):
+        name = self.save('posts/a.jpg', make_image(50, 50))
+        self.save('posts/a.jpg', make_image(50, 50))
+        media_storage.delete(name)
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(MediaFile.objects.get().refcount, 1)
+        media_storage.delete(name)
+        self.assertFalse(media_storage.exists(name))
+        self.assertFalse(MediaFile.objects.exists())
+
+    def test_sweep_orphans(self):
+        create_archive(1, 1)
+        used = self.save('posts/used.jpg', make_image(50, 50))
+        orphan = self.save('posts/orphan.jpg', make_image(50, 50, color=(0, 0, 0)))
+        # Лишняя ссылка, которую не снял delete(): поле модели файлы не удаляет
+        self.save('posts/used.jpg', make_image(50, 50))
+        Post.objects.update(image=used)
+        MediaFile.objects.update(created_at=timezone.now() - timedelta(days=2))
+        call_command('sweep_media', stdout=StringIO())
+        self.assertFalse(media_storage.exists(orphan))
+        self.assertEqual(list(MediaFile.objects.values_list('name', 'refcount')), [(used, 1)])
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class DigestDispatchTests(TestCase):
+    """Дайджест: получатели без повторов, одно письмо на адрес, продолжение с контрольной точки"""
+
+    def setUp(self):
+        create_archive(1, 2)
+        for email in ('b@example.com', 'D@example.com', 'off@example.com'):
+            NewsletterSubscriber.objects.create(email=email, is_active=email != 'off@example.com')
+        User.objects.create_user('a@example.com')
+        User.objects.create_user('B@Example.com')
+        User.objects.create_user('c@example.com', newsletter_subscribed=False)
+        self.recipients = ['a@example.com', 'b@example.com', 'd@example.com']
+        self.dispatch = NewsletterDispatch.objects.create(
+            subject='Новые статьи', language='ru', since=digest.default_since(),
+        )
+
+    def run_dispatch(self, **kwargs):
+        # Прогресс каждого окна пишется в лог
+        with self.assertLogs('core.digest', 'INFO'):
+            return digest.run_dispatch(self.dispatch, **kwargs)
+
+    def test_recipients(self):
+        self.assertEqual(list(digest.iter_recipients(chunk_size=1)), self.recipients)
+        self.assertEqual(list(digest.iter_recipients(after='a@example.com')), self.recipients[1:])
+
+    def test_smtp(self):
+        processed, _ = self.run_dispatch(backend='smtp', concurrency=2, batch_size=1)
+        self.assertEqual(processed, 3)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), self.recipients)
+        self.assertTrue(all(len(message.to) == 1 for message in mail.outbox))
+        self.assertIn('Статья 0-0', mail.outbox[0].body)
+        self.dispatch.refresh_from_db()
+        self.assertEqual(
+            (self.dispatch.status, self.dispatch.sent_count, self.dispatch.last_email),
+            (NewsletterDispatch.STATUS_DONE, 3, 'd@example.com'),
+        )
+
+    def test_resume(self):
+        NewsletterDispatch.objects.filter(pk=self.dispatch.pk).update(last_email='a@example.com', sent_count=1)
+        self.dispatch.refresh_from_db()
+        self.run_dispatch(backend='smtp', concurrency=1, batch_size=2)
+        self.assertEqual([message.to[0] for message in mail.outbox], self.recipients[1:])
+        self.dispatch.refresh_from_db()
+        self.assertEqual(self.dispatch.sent_count, 3)
+
+    def test_sendpulse(self):
+        client = FakeSendPulseClient()
+        with mock.patch.object(digest, 'get_sendpulse_client', return_value=client):
+            self.run_dispatch(backend='sendpulse', concurrency=2, batch_size=2)
+        self.assertEqual(
+            sorted(kwargs['json']['email']['to'][0]['email'] for _, _, kwargs in client.calls), self.recipients,
+        )
+        self.assertTrue(all(path == '/smtp/emails' for _, path, _ in client.calls))
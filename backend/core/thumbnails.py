@@ -0,0 +1,63 @@
+"""Заблаговременная генерация миниатюр easy-thumbnails.
+
+Для полей из THUMBNAIL_ALIASES миниатюры всех алиасов создаются после
+загрузки файла фоновой задачей (core.tasks), а не первым посетителем
+страницы. Для старых файлов — команда ``pregenerate_thumbnails``.
+"""
+import logging
+
+from django.apps import apps
+from django.db import transaction
+from easy_thumbnails.alias import aliases
+from easy_thumbnails.files import get_thumbnailer
+
+from .tasks import enqueue
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_QUEUE = 'thumbnails'
+
+# Поля с изображениями, для которых миниатюры готовятся заранее
+THUMBNAIL_FIELDS = {
+    'blog.Post': 'image',
+    'accounts.User': 'avatar',
+}
+
+
+def generate_aliases(fieldfile):
+    """Создаёт недостающие миниатюры всех алиасов поля, возвращает их число"""
+    if not fieldfile:
+        return 0
+    thumbnailer = get_thumbnailer(fieldfile)
+    generated = 0
+    for options in aliases.all(target=fieldfile).values():
+        options = thumbnailer.get_options(options)
+        if thumbnailer.get_existing_thumbnail(options):
+            continue
+        thumbnailer.save_thumbnail(thumbnailer.generate_thumbnail(options))
+        generated += 1
+    return generated
+
+
+def generate_thumbnails_for(model_label, pk, field_name):
+    """Фоновая задача: миниатюры поля одного объекта"""
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).first()
+    if instance is None:
+        return 0
+    try:
+        return generate_aliases(getattr(instance, field_name))
+    except (OSError, ValueError):
+        # Битый или удалённый исходник — не повод останавливать очередь
+        logger.warning('Не удалось создать миниатюры %s:%s', model_label, pk, exc_info=True)
+        return 0
+
+
+def queue_thumbnails(instance, field_name):
+    """Ставит генерацию миниатюр в очередь после коммита транзакции"""
+    if not getattr(instance, field_name):
+        return
+    label = instance._meta.label
+    transaction.on_commit(
+        lambda: enqueue(generate_thumbnails_for, label, instance.pk, field_name, queue=THUMBNAIL_QUEUE)
+    )
@@ -0,0 +1,134 @@
+"""Загрузка изображений из редактора TinyMCE.
+
+Тело запроса пишется во временный файл (без буферизации в памяти) и
+обрывается, как только превышает MAX_IMAGE_SIZE. Формат определяется по
+заголовку файла, а не по имени. Изображение уменьшается до
+MAX_IMAGE_WIDTH × MAX_IMAGE_HEIGHT: JPEG сразу декодируется в уменьшенном
+масштабе (draft), остальное — через reduce() внутри thumbnail().
+
+Файл сохраняется в хранилище с адресацией по содержимому (core.storage),
+а SHA-256 исходника запоминается в кэше, поэтому повторная загрузка той
+же картинки не обрабатывается заново.
+"""
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from PIL import Image, ImageOps
+
+from .storage import media_storage
+
+# Формат Pillow -> расширение файла
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+}
+HASH_CHUNK_SIZE = 64 * 1024
+# Хэш исходной загрузки -> имя уже обработанного файла
+UPLOAD_CACHE_KEY = 'tinymce:upload:{}'
+UPLOAD_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл на диск и прерывает загрузку сверх max_size байт"""
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size
+        self.received = 0
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.max_size is not None and self.received > self.max_size:
+            self.exceeded = True
+            raise StopUpload(connection_reset=True)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def file_sha256(uploaded_file):
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def _allowed_formats():
+    allowed = set(settings.ALLOWED_IMAGE_EXTENSIONS)
+    return {
+        image_format for image_format, extension in FORMAT_EXTENSIONS.items()
+        if extension in allowed or (image_format == 'JPEG' and '.jpeg' in allowed)
+    }
+
+
+def sniff_image_format(uploaded_file):
+    """Формат по заголовку файла; UploadError, если это не разрешённое изображение"""
+    try:
+        with Image.open(uploaded_file) as image:
+            image_format = image.format
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise UploadError('Файл не является изображением')
+    finally:
+        uploaded_file.seek(0)
+    if image_format not in _allowed_formats():
+        raise UploadError(f'Формат {image_format} не поддерживается')
+    return image_format
+
+
+def downscale_image(uploaded_file, image_format):
+    """Уменьшенная копия изображения в исходном формате (байты)"""
+    max_size = (settings.MAX_IMAGE_WIDTH, settings.MAX_IMAGE_HEIGHT)
+    try:
+        image = Image.open(uploaded_file)
+        if getattr(image, 'n_frames', 1) > 1:
+            # Анимацию не пережимаем, чтобы не потерять кадры
+            uploaded_file.seek(0)
+            return uploaded_file.read()
+        image.draft('RGB', max_size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(max_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        raise UploadError('Не удалось обработать изображение')
+
+    options = {}
+    if image_format == 'JPEG':
+        image = image.convert('RGB')
+        options = {'quality': settings.IMAGE_QUALITY, 'optimize': True, 'progressive': True}
+    elif image_format == 'WEBP':
+        options = {'quality': settings.IMAGE_QUALITY, 'method': 4}
+    elif image_format == 'PNG':
+        options = {'optimize': True}
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def save_editor_image(uploaded_file):
+    """Проверяет, уменьшает и сохраняет изображение, возвращает URL"""
+    if uploaded_file.size > settings.MAX_IMAGE_SIZE:
+        raise UploadError('Файл слишком большой', status=413)
+    image_format = sniff_image_format(uploaded_file)
+    cache_key = UPLOAD_CACHE_KEY.format(file_sha256(uploaded_file))
+    name = cache.get(cache_key)
+    if name is None or not media_storage.exists(name):
+        # Имя в хранилище — хэш уже уменьшенного файла (core.storage)
+        name = media_storage.save(
+            os.path.join(settings.TINYMCE_UPLOAD_PATH, 'upload' + FORMAT_EXTENSIONS[image_format]),
+            ContentFile(downscale_image(uploaded_file, image_format)),
+        )
+        cache.set(cache_key, name, UPLOAD_CACHE_TIMEOUT)
+    return media_storage.url(name)
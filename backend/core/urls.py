@@ -1,4 +1,4 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 app_name = 'core'
@@ -8,5 +8,9 @@ urlpatterns = [
     path('faq/', views.faq, name='faq'),
     path('privacy/', views.privacy, name='privacy'),
     path('terms/', views.terms, name='terms'),
+    path('csrf/', views.csrf_token, name='csrf_token'),
     path('newsletter/', views.newsletter_subscribe, name='newsletter_subscribe'),
+    path('tinymce/upload/', views.tinymce_upload, name='tinymce_upload'),
+    path('sitemap.xml', views.sitemap_index, name='sitemap_index'),
+    re_path(r'^sitemaps/(?P<name>[a-z]+-\d+)\.xml$', views.sitemap_section, name='sitemap_section'),
 ]
\ No newline at end of file
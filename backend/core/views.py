@@ -1,28 +1,122 @@
+import gzip
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import render
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt, csrf_protect, ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
+
+from .edge import add_surrogate_keys
+from .homepage import get_lazy_homepage_context
+from .newsletter import asubscribe
+from .uploads import LimitedTemporaryFileUploadHandler, UploadError, save_editor_image
 
 
 def home(request):
-    return render(request, 'pages/index.html', {
-        'featured_post': None,
-        'sidebar_posts': [],
-        'latest_posts': [],
-        'categories_with_posts': [],
-    })
+    return add_surrogate_keys(render(request, 'pages/index.html', get_lazy_homepage_context()), 'home')
 
 
 def faq(request):
-    return render(request, 'pages/faq.html')
+    return add_surrogate_keys(render(request, 'pages/faq.html'), 'pages')
 
 
 def privacy(request):
-    return render(request, 'pages/privacy.html')
+    return add_surrogate_keys(render(request, 'pages/privacy.html'), 'pages')
 
 
 def terms(request):
-    return render(request, 'pages/terms.html')
+    return add_surrogate_keys(render(request, 'pages/terms.html'), 'pages')
+
+
+@require_GET
+@ensure_csrf_cookie
+def csrf_token(request):
+    """CSRF-токен для форм на страницах из кэша (core.pagecache)"""
+    response = JsonResponse({'token': get_token(request)})
+    patch_cache_control(response, no_store=True)
+    # no-store и cookie не дают SurrogateControlMiddleware разрешить кэш прокси,
+    # ключ нужен только для явной очистки, если прокси всё же его сохранит
+    return add_surrogate_keys(response, 'csrf')
+
+
+def _upload_error(message, status=400):
+    return JsonResponse({'error': {'message': message}}, status=status)
+
+
+# Обработчики загрузки подменяются до того, как CSRF-middleware прочитает
+# тело запроса, поэтому проверка токена перенесена внутрь view (так советует
+# документация Django). TinyMCE передаёт токен в заголовке X-CSRFToken
+# (static/js/tinymce-upload.js).
+@csrf_exempt
+@require_POST
+@staff_member_required
+def tinymce_upload(request):
+    handler = LimitedTemporaryFileUploadHandler(request, max_size=settings.MAX_IMAGE_SIZE)
+    request.upload_handlers = [handler]
+    return _tinymce_upload(request, handler)
+
+
+@csrf_protect
+def _tinymce_upload(request, handler):
+    uploaded_file = request.FILES.get('file')
+    if handler.exceeded:
+        return _upload_error('Файл слишком большой', status=413)
+    if uploaded_file is None:
+        return _upload_error('Файл не передан')
+    try:
+        location = save_editor_image(uploaded_file)
+    except UploadError as error:
+        return _upload_error(error.message, status=error.status)
+    finally:
+        uploaded_file.close()
+    return JsonResponse({'location': location})
+
+
+async def newsletter_subscribe(request):
+    # require_POST в Django 4.2 не поддерживает async-view
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    email = request.POST.get('email', '').strip().lower()
+    try:
+        validate_email(email)
+    except ValidationError:
+        return JsonResponse({'status': 'error', 'message': 'Некорректный email'}, status=400)
+    await asubscribe(email)
+    return JsonResponse({'status': 'ok'})
+
+
+def _serve_sitemap(request, filename):
+    """Отдаёт заранее собранный gzip-файл (blog.sitemaps) без обращения к БД"""
+    path = os.path.join(settings.SITEMAP_ROOT, filename)
+    try:
+        with open(path, 'rb') as sitemap_file:
+            data = sitemap_file.read()
+            modified = os.fstat(sitemap_file.fileno()).st_mtime
+    except FileNotFoundError:
+        raise Http404('Sitemap ещё не собран')
+
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(data, content_type='application/xml')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(data), content_type='application/xml')
+    response['Vary'] = 'Accept-Encoding'
+    response['Last-Modified'] = http_date(modified)
+    return add_surrogate_keys(response, 'sitemaps')
+
+
+@require_GET
+def sitemap_index(request):
+    return _serve_sitemap(request, 'sitemap.xml.gz')
 
 
-def newsletter_subscribe(request):
-    # TODO: реализовать подписку
-    from django.http import JsonResponse
-    return JsonResponse({'status': 'ok'})
\ No newline at end of file
+@require_GET
+def sitemap_section(request, name):
+    return _serve_sitemap(request, f'{name}.xml.gz')
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "django.contrib.sites",
     "django.contrib.sitemaps",
+    "django.contrib.postgres",
     # 3rd party - Auth
     "allauth",
     "allauth.account",
@@ -80,14 +81,17 @@ if DEBUG:
 # ===========================================
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.edge.SurrogateControlMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
-    "django.middleware.locale.LocaleMiddleware",
+    "core.middleware.LocaleMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "allauth.account.middleware.AccountMiddleware",
     "accounts.middleware.OnboardingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
+    "blog.scheduler.ScheduledPublishMiddleware",
+    "core.pagecache.AnonymousPageCacheMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
@@ -115,6 +119,7 @@ TEMPLATES = [
                 "django.template.context_processors.media",
                 "django.template.context_processors.static",
                 "django.template.context_processors.tz",
+                "accounts.bookmarks.bookmarks",
             ],
         },
     },
@@ -157,13 +162,27 @@ if os.environ.get('REDIS_URL'):
             'OPTIONS': {
                 'CLIENT_CLASS': 'django_redis.client.DefaultClient',
             }
-        }
+        },
+        # Очереди и буферы (фоновые задачи, просмотры, уведомления, рассылка,
+        # sitemap): кэш работает с allkeys-lru и может вытеснить их ключи,
+        # поэтому в production это отдельный Redis с noeviction
+        'queues': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ.get('QUEUE_REDIS_URL', os.environ['REDIS_URL']),
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        },
     }
 else:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        }
+        },
+        'queues': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'queues',
+        },
     }
 
 # ===========================================
@@ -214,6 +233,17 @@ SENDPULSE_API_USER_ID = os.getenv("SENDPULSE_API_USER_ID", "")
 SENDPULSE_API_SECRET = os.getenv("SENDPULSE_API_SECRET", "")
 SENDPULSE_FROM_EMAIL = os.getenv("SENDPULSE_FROM_EMAIL", "noreply@milanweek.ru")
 SENDPULSE_FROM_NAME = os.getenv("SENDPULSE_FROM_NAME", "milanweekPerPost")
+# Заглушка вместо API (core.sendpulse.FakeSendPulseClient) — только явно, для разработки
+SENDPULSE_FAKE = os.getenv("SENDPULSE_FAKE", "") == "1"
+# Адресная книга подписчиков рассылки (core.newsletter)
+SENDPULSE_ADDRESS_BOOK_ID = os.getenv("SENDPULSE_ADDRESS_BOOK_ID", "")
+NEWSLETTER_SYNC_INTERVAL = int(os.getenv("NEWSLETTER_SYNC_INTERVAL", 60))  # секунд
+# Рассылка дайджеста (core.digest)
+NEWSLETTER_DIGEST_DAYS = int(os.getenv("NEWSLETTER_DIGEST_DAYS", 7))
+NEWSLETTER_DIGEST_MAX_POSTS = 10
+NEWSLETTER_DISPATCH_BACKEND = os.getenv("NEWSLETTER_DISPATCH_BACKEND", "smtp")  # smtp | sendpulse
+NEWSLETTER_DISPATCH_CONCURRENCY = int(os.getenv("NEWSLETTER_DISPATCH_CONCURRENCY", 8))
+NEWSLETTER_DISPATCH_BATCH_SIZE = int(os.getenv("NEWSLETTER_DISPATCH_BATCH_SIZE", 100))
 
 
 # Allauth Social
@@ -259,6 +289,11 @@ PARLER_LANGUAGES = {
     },
 }
 
+# Двухуровневый кэш переводов parler (blog.translation_cache)
+TRANSLATION_CACHE_L1_SIZE = int(os.getenv("TRANSLATION_CACHE_L1_SIZE", 10000))  # записей на процесс
+TRANSLATION_CACHE_TIMEOUT = 60 * 60 * 24
+TRANSLATION_CACHE_GENERATION_CHECK = 5  # секунд вне запросов
+
 
 # ===========================================
 # STATIC & MEDIA
@@ -280,6 +315,37 @@ FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755  # rwxr-xr-x
 # Создаем медиа-директорию
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 
+# Кэш страниц для анонимов (core.pagecache)
+PAGE_CACHE_TIMEOUT = 60 * 10  # общие блоки (сайдбар, меню) обновляются не позже
+PAGE_CACHE_VIEWS = [
+    "core:home",
+    "core:faq",
+    "core:privacy",
+    "core:terms",
+    "blog:post_list",
+    "blog:category",
+    "blog:tag",
+    "blog:author",
+    "blog:post_detail",
+]
+
+# Кэш на reverse proxy и очистка по ключам (core.edge)
+EDGE_SURROGATE_KEY_HEADER = os.getenv("EDGE_SURROGATE_KEY_HEADER", "Surrogate-Key")  # xkey для Varnish
+EDGE_CACHE_TIMEOUT = int(os.getenv("EDGE_CACHE_TIMEOUT", 60 * 60 * 6))
+EDGE_PURGE_URL = os.getenv("EDGE_PURGE_URL", "")  # пусто — очистка выключена
+EDGE_PURGE_TOKEN = os.getenv("EDGE_PURGE_TOKEN", "")
+EDGE_PURGE_BATCH_SIZE = 256  # ключей в запросе
+
+# Отложенная публикация (blog.scheduler, команда publish_scheduled_posts --loop)
+SCHEDULED_PUBLISH_INTERVAL = 30  # секунд между проверками, если ближе публикаций нет
+SCHEDULED_PUBLISH_BATCH_SIZE = 100  # статей в транзакции
+# Опоздание, после которого статьи публикует запрос (воркер не работает); None — отключить
+SCHEDULED_PUBLISH_FALLBACK_DELAY = 120  # секунд
+
+# Заранее собранные sitemap (blog.sitemaps)
+SITEMAP_ROOT = MEDIA_ROOT / "sitemaps"
+SITEMAP_SHARD_SIZE = 50000  # адресов в файле — лимит протокола
+
 # Filer / thumbnails
 THUMBNAIL_HIGH_RESOLUTION = True
 THUMBNAIL_QUALITY = 90
@@ -303,6 +369,12 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
 
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "milanweekPerPost <service@milanweek.ru>")
 
+# Уведомления о комментариях (blog.notifications)
+COMMENT_NOTIFY_WINDOW = int(os.getenv("COMMENT_NOTIFY_WINDOW", 60 * 15))  # секунд на одно письмо
+COMMENT_NOTIFY_INTERVAL = 60  # секунд между проходами send_comment_notifications --loop
+# locmem для тестов: django.core.mail.backends.locmem.EmailBackend
+COMMENT_NOTIFY_EMAIL_BACKEND = os.getenv("COMMENT_NOTIFY_EMAIL_BACKEND", EMAIL_BACKEND)
+
 # ===========================================
 # THUMBNAILS (Filer)
 # ===========================================
@@ -377,6 +449,8 @@ BLEACH_STRIP = False
 TINYMCE_JS_URL = "/static/tinymce/tinymce.min.js"
 TINYMCE_COMPRESSOR = False
 TINYMCE_SPELLCHECKER = False
+# Обработчик загрузки изображений с CSRF-токеном (core.views.tinymce_upload)
+TINYMCE_EXTRA_MEDIA = {"js": ["js/tinymce-upload.js"]}
 
 # Основная конфигурация (аналог CKEditor 5 'default')
 TINYMCE_DEFAULT_CONFIG = {
@@ -461,6 +535,7 @@ TINYMCE_DEFAULT_CONFIG = {
     "automatic_uploads": True,
     "file_picker_types": "image",
     "images_upload_url": "/tinymce/upload/",
+    "images_upload_handler": "tinymceUploadImage",
     "images_reuse_filename": False,
     # Таблицы (аналог table в CKEditor)
     "table_toolbar": "tableprops tabledelete | tableinsertrowbefore tableinsertrowafter tabledeleterow | tableinsertcolbefore tableinsertcolafter tabledeletecol",
@@ -532,9 +607,35 @@ TAGGIT_CASE_INSENSITIVE = True
 THUMBNAIL_FORMAT = "WEBP"
 THUMBNAIL_QUALITY = 85
 THUMBNAIL_PRESERVE_FORMAT = False
+# Алиасы генерируются заранее после загрузки (core.thumbnails)
+THUMBNAIL_ALIASES = {
+    "blog.Post.image": {
+        "card": {"size": (400, 300), "crop": True},
+        "wide": {"size": (800, 450), "crop": True},
+    },
+    "accounts.User.avatar": {
+        "small": {"size": (40, 40), "crop": True},
+        "medium": {"size": (80, 80), "crop": True},
+        "large": {"size": (120, 120), "crop": True},
+    },
+}
 
 PAGINATE_BY = 10
 
+# Полнотекстовый поиск (blog.search): конфигурация PostgreSQL для языка
+SEARCH_CONFIGS = {
+    "ru": "russian",
+    "en": "english",
+}
+
+# Paywall: бесплатных премиум-статей в месяц (accounts.paywall)
+PAYWALL_FREE_ARTICLES = int(os.getenv("PAYWALL_FREE_ARTICLES", 3))
+PAYWALL_COOKIE_NAME = "mw_meter"
+PAYWALL_SYNC_INTERVAL = 300  # секунд
+
+# Отложенный счётчик просмотров (blog.counters)
+VIEW_COUNT_FLUSH_INTERVAL = int(os.getenv("VIEW_COUNT_FLUSH_INTERVAL", 60))  # секунд
+
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 15 * 1024 * 1024  # 15MB
 
@@ -544,3 +645,7 @@ MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
 IMAGE_QUALITY = 85
 MAX_IMAGE_WIDTH = 1200
 MAX_IMAGE_HEIGHT = 1200
+
+# Адаптивные варианты Post.image для srcset (core.images)
+IMAGE_VARIANT_WIDTHS = [320, 480, 640, 800, 1200]
+IMAGE_VARIANT_FORMATS = ["avif", "webp"]
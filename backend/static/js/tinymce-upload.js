@@ -0,0 +1,44 @@
+'use strict';
+
+// Загрузка изображений TinyMCE с CSRF-токеном в заголовке X-CSRFToken
+// (core.views.tinymce_upload). Подключается через TINYMCE_EXTRA_MEDIA,
+// в конфиге указывается по имени: "images_upload_handler": "tinymceUploadImage".
+(function () {
+  function csrfToken() {
+    const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+    if (input) {
+      return input.value;
+    }
+    const cookie = document.cookie.split('; ').find((item) => item.startsWith('csrftoken='));
+    return cookie ? decodeURIComponent(cookie.split('=')[1]) : '';
+  }
+
+  window.tinymceUploadImage = function (blobInfo, progress) {
+    return new Promise((resolve, reject) => {
+      const xhr = new XMLHttpRequest();
+      xhr.open('POST', tinymce.activeEditor.options.get('images_upload_url'));
+      xhr.withCredentials = true;
+      xhr.setRequestHeader('X-CSRFToken', csrfToken());
+      xhr.upload.onprogress = (event) => progress(event.loaded / event.total * 100);
+      xhr.onload = () => {
+        let json = null;
+        try {
+          json = JSON.parse(xhr.responseText);
+        } catch (error) {
+          // Ответ не JSON — ошибка сервера или прокси
+        }
+        if (xhr.status >= 200 && xhr.status < 300 && json && json.location) {
+          resolve(json.location);
+        } else {
+          const message = json && json.error ? json.error.message : 'HTTP ' + xhr.status;
+          reject({ message: message, remove: true });
+        }
+      };
+      xhr.onerror = () => reject({ message: 'Не удалось загрузить изображение', remove: true });
+
+      const data = new FormData();
+      data.append('file', blobInfo.blob(), blobInfo.filename());
+      xhr.send(data);
+    });
+  };
+})();